@@ -17,6 +17,15 @@ CREATE TABLE Room (
     CONSTRAINT chk_price CHECK (Price > 0)
 );
 
+-- Nightly rate per room type; nights without an entry fall back to Room.Price
+CREATE TABLE Rate_Calendar (
+    Room_Type ENUM('Standard', 'Deluxe', 'Suite') NOT NULL,
+    Rate_Date DATE NOT NULL,
+    Rate DECIMAL(10,2) NOT NULL,
+    PRIMARY KEY (Room_Type, Rate_Date),
+    CONSTRAINT chk_rate CHECK (Rate > 0)
+);
+
 -- Create Staff Table
 CREATE TABLE Staff (
     Staff_ID INT AUTO_INCREMENT PRIMARY KEY,
@@ -34,6 +43,7 @@ CREATE TABLE Booking (
     Check_In_Date DATE NOT NULL,
     Check_Out_Date DATE NOT NULL,
     Total_Amount DECIMAL(10,2) NOT NULL,
+    Loyalty_Discount DECIMAL(10,2) NOT NULL DEFAULT 0, -- Points redeemed at booking; kept when the stay is modified
     Payment_Method ENUM('Credit Card', 'Cash', 'UPI', 'Pending') DEFAULT 'Pending',
     CONSTRAINT fk_guest FOREIGN KEY (Guest_ID) REFERENCES Guest(Guest_ID),
     CONSTRAINT fk_room FOREIGN KEY (Room_ID) REFERENCES Room(Room_ID),
@@ -41,6 +51,34 @@ CREATE TABLE Booking (
     CONSTRAINT chk_amount CHECK (Total_Amount >= 0)
 );
 
+-- Cold storage for completed stays (moved out of Booking by archive_completed_bookings).
+-- Booking_ID keeps its original value; MySQL 8 persists AUTO_INCREMENT so ids are never reused.
+CREATE TABLE Booking_Archive (
+    Booking_ID INT PRIMARY KEY,
+    Guest_ID INT NOT NULL,
+    Room_ID INT NOT NULL,
+    Check_In_Date DATE NOT NULL,
+    Check_Out_Date DATE NOT NULL,
+    Total_Amount DECIMAL(10,2) NOT NULL,
+    Loyalty_Discount DECIMAL(10,2) NOT NULL DEFAULT 0,
+    Payment_Method ENUM('Credit Card', 'Cash', 'UPI', 'Pending') DEFAULT 'Pending',
+    Archived_At DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_archive_guest (Guest_ID, Payment_Method),
+    INDEX idx_archive_checkout (Check_Out_Date),
+    CONSTRAINT fk_archive_guest FOREIGN KEY (Guest_ID) REFERENCES Guest(Guest_ID),
+    CONSTRAINT fk_archive_room FOREIGN KEY (Room_ID) REFERENCES Room(Room_ID)
+);
+
+-- Full booking history (hot + archived) for analytics and receipt re-issue
+CREATE VIEW Booking_History AS
+    SELECT Booking_ID, Guest_ID, Room_ID, Check_In_Date, Check_Out_Date,
+           Total_Amount, Loyalty_Discount, Payment_Method
+    FROM Booking
+    UNION ALL
+    SELECT Booking_ID, Guest_ID, Room_ID, Check_In_Date, Check_Out_Date,
+           Total_Amount, Loyalty_Discount, Payment_Method
+    FROM Booking_Archive;
+
 -- Create CRM Table (Simplified without feedback columns)
 CREATE TABLE CRM (
     CRM_ID INT AUTO_INCREMENT PRIMARY KEY,
@@ -60,7 +98,7 @@ BEGIN
     
     -- Count completed stays (where Payment_Method is not 'Pending')
     SELECT COUNT(*) INTO paid_stays 
-    FROM Booking 
+    FROM Booking_History 
     WHERE Guest_ID = NEW.Guest_ID 
     AND Payment_Method IN ('Credit Card', 'Cash', 'UPI');
     
@@ -73,24 +111,43 @@ BEGIN
 END //
 DELIMITER ;
 
+DELIMITER //
+CREATE FUNCTION stay_amount(stay_room_id INT, stay_check_in DATE, stay_check_out DATE)
+RETURNS DECIMAL(10,2)
+READS SQL DATA
+BEGIN
+    DECLARE room_price DECIMAL(10,2);
+    DECLARE stay_room_type VARCHAR(20);
+    DECLARE calendar_total DECIMAL(10,2);
+    DECLARE calendar_nights INT;
+
+    SELECT Price, Room_Type INTO room_price, stay_room_type FROM Room WHERE Room_ID = stay_room_id;
+
+    -- Calendar rates for the nights that have one, Room.Price for the rest
+    SELECT COALESCE(SUM(Rate), 0), COUNT(*) INTO calendar_total, calendar_nights
+    FROM Rate_Calendar
+    WHERE Room_Type = stay_room_type
+    AND Rate_Date >= stay_check_in
+    AND Rate_Date < stay_check_out;
+
+    RETURN calendar_total + room_price * (DATEDIFF(stay_check_out, stay_check_in) - calendar_nights);
+END //
+DELIMITER ;
+
 DELIMITER //
 CREATE TRIGGER booking_calculation_and_discount
 BEFORE INSERT ON Booking
 FOR EACH ROW
 BEGIN
-    DECLARE room_price DECIMAL(10,2);
-    DECLARE stay_duration INT;
     DECLARE paid_stays INT;
     DECLARE current_points INT;
     
     -- 1. FIRST: Calculate base amount (replaces calculate_booking_total)
-    SELECT Price INTO room_price FROM Room WHERE Room_ID = NEW.Room_ID;
-    SET stay_duration = DATEDIFF(NEW.Check_Out_Date, NEW.Check_In_Date);
-    SET NEW.Total_Amount = room_price * stay_duration;
+    SET NEW.Total_Amount = stay_amount(NEW.Room_ID, NEW.Check_In_Date, NEW.Check_Out_Date);
     
     -- 2. THEN: Apply loyalty discount if eligible
     SELECT COUNT(*) INTO paid_stays 
-    FROM Booking 
+    FROM Booking_History 
     WHERE Guest_ID = NEW.Guest_ID 
     AND Payment_Method IN ('Credit Card', 'Cash', 'UPI');
     
@@ -98,6 +155,7 @@ BEGIN
     FROM CRM WHERE Guest_ID = NEW.Guest_ID;
     
     IF (paid_stays + 1) % 2 = 1 AND current_points = 100 THEN
+        SET NEW.Loyalty_Discount = 100;
         SET NEW.Total_Amount = NEW.Total_Amount - 100;
         UPDATE CRM SET Loyalty_Points = 0 WHERE Guest_ID = NEW.Guest_ID;
     END IF;
@@ -130,12 +188,169 @@ BEGIN
 END //
 DELIMITER ;
 
+-- Ordered checkout index driving the incremental sweeper
+CREATE INDEX idx_booking_checkout ON Booking (Check_Out_Date, Booking_ID);
+
+-- Sweeper watermarks: last (Check_Out_Date, Booking_ID) already processed, and the
+-- last Change_Log entry read (bookings inserted or moved behind the checkout watermark)
+CREATE TABLE Room_Sweeper_State (
+    Sweeper_ID TINYINT PRIMARY KEY,
+    Last_Check_Out_Date DATE NOT NULL,
+    Last_Booking_ID INT NOT NULL,
+    Last_Seq BIGINT NOT NULL DEFAULT 0,
+    Last_Run_At DATETIME NULL,
+    Last_Bookings_Scanned INT DEFAULT 0,
+    Last_Rooms_Freed INT DEFAULT 0,
+    Total_Rooms_Freed BIGINT DEFAULT 0
+);
+
+INSERT INTO Room_Sweeper_State (Sweeper_ID, Last_Check_Out_Date, Last_Booking_ID)
+VALUES (1, '1000-01-01', 0);
+
 DELIMITER //
-CREATE EVENT daily_room_cleanup
-ON SCHEDULE EVERY 1 DAY
+CREATE PROCEDURE sweep_expired_rooms(IN batch_size INT)
+BEGIN
+    DECLARE wm_date DATE;
+    DECLARE wm_id INT;
+    DECLARE wm_seq BIGINT;
+    DECLARE new_date DATE DEFAULT NULL;
+    DECLARE new_id INT DEFAULT NULL;
+    DECLARE new_seq BIGINT DEFAULT NULL;
+    DECLARE scanned INT DEFAULT 0;
+    DECLARE changes INT DEFAULT 0;
+    DECLARE change_limit INT DEFAULT batch_size + 200;
+    DECLARE freed INT DEFAULT 0;
+
+    START TRANSACTION;
+
+    SELECT Last_Check_Out_Date, Last_Booking_ID, Last_Seq INTO wm_date, wm_id, wm_seq
+    FROM Room_Sweeper_State WHERE Sweeper_ID = 1 FOR UPDATE;
+
+    -- Only bookings whose checkout passed since the last watermark (index range scan)
+    DROP TEMPORARY TABLE IF EXISTS sweep_batch;
+    CREATE TEMPORARY TABLE sweep_batch AS
+        SELECT Booking_ID, Room_ID, Check_Out_Date
+        FROM Booking
+        WHERE (Check_Out_Date > wm_date
+               OR (Check_Out_Date = wm_date AND Booking_ID > wm_id))
+        AND Check_Out_Date <= CURDATE()
+        ORDER BY Check_Out_Date, Booking_ID
+        LIMIT batch_size;
+
+    SELECT COUNT(*) INTO scanned FROM sweep_batch;
+
+    -- A booking inserted or modified later can already sit behind the checkout
+    -- watermark; its rooms come from the Booking entries of Change_Log instead.
+    -- The last 200 entries are read again in case a lower Seq_ID committed late.
+    DROP TEMPORARY TABLE IF EXISTS sweep_changes;
+    CREATE TEMPORARY TABLE sweep_changes AS
+        SELECT Seq_ID, Before_Image, After_Image
+        FROM Change_Log
+        WHERE Table_Name = 'Booking' AND Seq_ID > GREATEST(wm_seq - 200, 0)
+        ORDER BY Seq_ID
+        LIMIT change_limit;
+
+    SELECT COUNT(*), MAX(Seq_ID) INTO changes, new_seq
+    FROM sweep_changes WHERE Seq_ID > wm_seq;
+
+    -- Rooms to check: those of the expired bookings and of every changed booking
+    -- (old and new room of a move). Freeing is idempotent, so re-reads are harmless.
+    DROP TEMPORARY TABLE IF EXISTS sweep_rooms;
+    CREATE TEMPORARY TABLE sweep_rooms (Room_ID INT PRIMARY KEY);
+    INSERT IGNORE INTO sweep_rooms SELECT Room_ID FROM sweep_batch;
+    INSERT IGNORE INTO sweep_rooms
+        SELECT CAST(JSON_EXTRACT(Before_Image, '$.Room_ID') AS UNSIGNED) FROM sweep_changes WHERE Before_Image IS NOT NULL;
+    INSERT IGNORE INTO sweep_rooms
+        SELECT CAST(JSON_EXTRACT(After_Image, '$.Room_ID') AS UNSIGNED) FROM sweep_changes WHERE After_Image IS NOT NULL;
+
+    IF scanned > 0 OR changes > 0 THEN
+        -- Free the touched rooms unless they still hold a current/future booking
+        UPDATE Room r
+        JOIN sweep_rooms s ON r.Room_ID = s.Room_ID
+        SET r.Status = 'Available'
+        WHERE r.Status = 'Booked'
+        AND NOT EXISTS (
+            SELECT 1 FROM Booking b
+            WHERE b.Room_ID = r.Room_ID
+            AND b.Check_Out_Date > CURDATE()
+        );
+        SET freed = ROW_COUNT();
+    END IF;
+
+    IF scanned > 0 THEN
+        SELECT Check_Out_Date, Booking_ID INTO new_date, new_id
+        FROM sweep_batch
+        ORDER BY Check_Out_Date DESC, Booking_ID DESC
+        LIMIT 1;
+    END IF;
+
+    UPDATE Room_Sweeper_State
+    SET Last_Check_Out_Date = COALESCE(new_date, Last_Check_Out_Date),
+        Last_Booking_ID = COALESCE(new_id, Last_Booking_ID),
+        Last_Seq = COALESCE(new_seq, Last_Seq),
+        Last_Run_At = NOW(),
+        Last_Bookings_Scanned = scanned,
+        Last_Rooms_Freed = freed,
+        Total_Rooms_Freed = Total_Rooms_Freed + freed
+    WHERE Sweeper_ID = 1;
+
+    COMMIT;
+    DROP TEMPORARY TABLE IF EXISTS sweep_batch;
+    DROP TEMPORARY TABLE IF EXISTS sweep_changes;
+    DROP TEMPORARY TABLE IF EXISTS sweep_rooms;
+
+    SELECT scanned AS Bookings_Scanned, changes AS Changes_Scanned, freed AS Rooms_Freed;
+END //
+DELIMITER ;
+
+-- Replaces the old daily full-join cleanup; free_expired_rooms() stays for manual reconciliation
+DELIMITER //
+CREATE EVENT room_expiry_sweeper
+ON SCHEDULE EVERY 1 MINUTE
 STARTS CURRENT_TIMESTAMP
 DO BEGIN
-    CALL free_expired_rooms(); -- Frees all rooms with expired bookings
+    CALL sweep_expired_rooms(500); -- Frees rooms whose bookings expired since the last run
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE archive_completed_bookings(IN batch_size INT, IN keep_days INT)
+BEGIN
+    -- Move one batch of stays that ended more than keep_days ago into Booking_Archive.
+    -- keep_days must stay >= 1 so the room sweeper sees every checkout first.
+    DECLARE moved INT DEFAULT 0;
+    DECLARE caller_actor VARCHAR(100) DEFAULT @audit_actor;
+
+    -- Change_Log records these deletes as Changed_By 'archiver', so audit queries
+    -- can tell a stay moved to Booking_Archive from a cancelled booking
+    SET @audit_actor = 'archiver';
+    START TRANSACTION;
+
+    DROP TEMPORARY TABLE IF EXISTS archive_batch;
+    CREATE TEMPORARY TABLE archive_batch AS
+        SELECT Booking_ID
+        FROM Booking
+        WHERE Check_Out_Date < CURDATE() - INTERVAL GREATEST(keep_days, 1) DAY
+        ORDER BY Check_Out_Date, Booking_ID
+        LIMIT batch_size;
+
+    INSERT INTO Booking_Archive
+        (Booking_ID, Guest_ID, Room_ID, Check_In_Date, Check_Out_Date,
+         Total_Amount, Loyalty_Discount, Payment_Method)
+    SELECT b.Booking_ID, b.Guest_ID, b.Room_ID, b.Check_In_Date, b.Check_Out_Date,
+           b.Total_Amount, b.Loyalty_Discount, b.Payment_Method
+    FROM Booking b
+    JOIN archive_batch a ON b.Booking_ID = a.Booking_ID;
+
+    DELETE b FROM Booking b
+    JOIN archive_batch a ON b.Booking_ID = a.Booking_ID;
+    SET moved = ROW_COUNT();
+
+    COMMIT;
+    DROP TEMPORARY TABLE IF EXISTS archive_batch;
+    SET @audit_actor = caller_actor;
+
+    SELECT moved AS Bookings_Archived;
 END //
 DELIMITER ;
 
@@ -189,6 +404,83 @@ BEGIN
 END //booking
 DELIMITER ;
 
+DELIMITER //
+CREATE TRIGGER prevent_overlapping_booking_updates
+BEFORE UPDATE ON Booking
+FOR EACH ROW
+BEGIN
+    -- Same rule as prevent_overlapping_bookings, ignoring the booking being moved
+    IF (NEW.Room_ID <> OLD.Room_ID
+        OR NEW.Check_In_Date <> OLD.Check_In_Date
+        OR NEW.Check_Out_Date <> OLD.Check_Out_Date)
+    AND EXISTS (
+        SELECT 1 FROM Booking
+        WHERE Room_ID = NEW.Room_ID
+        AND Booking_ID <> NEW.Booking_ID
+        AND Check_Out_Date >= NEW.Check_In_Date
+        AND Check_In_Date <= NEW.Check_Out_Date
+    ) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Room already booked for these dates';
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER update_room_status_on_booking_move
+AFTER UPDATE ON Booking
+FOR EACH ROW
+BEGIN
+    -- A room move books the new room and frees the old one, as insert and delete do
+    IF NEW.Room_ID <> OLD.Room_ID THEN
+        UPDATE Room SET Status = 'Booked' WHERE Room_ID = NEW.Room_ID;
+        IF OLD.Check_Out_Date > CURDATE() THEN
+            UPDATE Room
+            SET Status = 'Available'
+            WHERE Room_ID = OLD.Room_ID
+            AND Status = 'Booked';
+        END IF;
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE modify_booking(IN target_booking_id INT, IN new_room_id INT, IN new_check_in DATE, IN new_check_out DATE)
+BEGIN
+    -- Change a booking's dates and/or room in place: one transaction, the booking row and
+    -- both rooms locked (rooms in Room_ID order, as create_booking locks them), the stay
+    -- repriced and the loyalty discount it already used kept. Returns the updated booking,
+    -- or no row if it does not exist; an overlap raises prevent_overlapping_booking_updates.
+    DECLARE old_room_id INT;
+    DECLARE old_total DECIMAL(10,2);
+    DECLARE locked_rooms INT;
+
+    START TRANSACTION;
+
+    SELECT Room_ID, Total_Amount INTO old_room_id, old_total
+    FROM Booking WHERE Booking_ID = target_booking_id
+    FOR UPDATE;
+
+    IF old_room_id IS NOT NULL THEN
+        SELECT COUNT(*) INTO locked_rooms
+        FROM Room WHERE Room_ID IN (old_room_id, new_room_id)
+        FOR UPDATE;
+
+        UPDATE Booking
+        SET Room_ID = new_room_id,
+            Check_In_Date = new_check_in,
+            Check_Out_Date = new_check_out,
+            Total_Amount = GREATEST(stay_amount(new_room_id, new_check_in, new_check_out) - Loyalty_Discount, 0)
+        WHERE Booking_ID = target_booking_id;
+    END IF;
+
+    COMMIT;
+
+    SELECT Booking_ID, Room_ID, Check_In_Date, Check_Out_Date, Total_Amount, old_total AS Previous_Amount
+    FROM Booking WHERE Booking_ID = target_booking_id;
+END //
+DELIMITER ;
+
 DELIMITER //
 CREATE TRIGGER add_crm_on_guest_insert
 AFTER INSERT ON Guest
@@ -209,3 +501,597 @@ BEGIN
     DELETE FROM CRM WHERE Guest_ID = OLD.Guest_ID;
 END //
 DELIMITER ;
+
+-- Change feed: one row per write, tailed by Seq_ID to invalidate cached reads in open sessions.
+-- Also stages before/after images for Audit_Log (see flush_audit_log).
+CREATE TABLE Change_Log (
+    Seq_ID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    Table_Name VARCHAR(30) NOT NULL,
+    Row_ID INT NOT NULL,
+    Parent_ID INT NULL, -- Owning row where useful (Guest_ID for Booking changes)
+    Operation ENUM('INSERT', 'UPDATE', 'DELETE') NOT NULL,
+    Before_Image JSON NULL, -- Row as it was (NULL for INSERT)
+    After_Image JSON NULL,  -- Row as written (NULL for DELETE)
+    Changed_By VARCHAR(100) NULL, -- @audit_actor if the session set one, else the MySQL account
+    Changed_At TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3),
+    INDEX idx_change_log_time (Changed_At)
+);
+
+DELIMITER //
+CREATE TRIGGER log_guest_insert
+AFTER INSERT ON Guest
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Guest', NEW.Guest_ID, 'INSERT',
+            NULL,
+            JSON_OBJECT('Guest_ID', NEW.Guest_ID, 'Name', NEW.Name, 'Email', NEW.Email, 'Phone', NEW.Phone, 'Address', NEW.Address),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_guest_update
+AFTER UPDATE ON Guest
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Guest', NEW.Guest_ID, 'UPDATE',
+            JSON_OBJECT('Guest_ID', OLD.Guest_ID, 'Name', OLD.Name, 'Email', OLD.Email, 'Phone', OLD.Phone, 'Address', OLD.Address),
+            JSON_OBJECT('Guest_ID', NEW.Guest_ID, 'Name', NEW.Name, 'Email', NEW.Email, 'Phone', NEW.Phone, 'Address', NEW.Address),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_guest_delete
+AFTER DELETE ON Guest
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Guest', OLD.Guest_ID, 'DELETE',
+            JSON_OBJECT('Guest_ID', OLD.Guest_ID, 'Name', OLD.Name, 'Email', OLD.Email, 'Phone', OLD.Phone, 'Address', OLD.Address),
+            NULL,
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_booking_insert
+AFTER INSERT ON Booking
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Parent_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Booking', NEW.Booking_ID, NEW.Guest_ID, 'INSERT',
+            NULL,
+            JSON_OBJECT('Booking_ID', NEW.Booking_ID, 'Guest_ID', NEW.Guest_ID, 'Room_ID', NEW.Room_ID, 'Check_In_Date', NEW.Check_In_Date, 'Check_Out_Date', NEW.Check_Out_Date, 'Total_Amount', NEW.Total_Amount, 'Payment_Method', NEW.Payment_Method),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_booking_update
+AFTER UPDATE ON Booking
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Parent_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Booking', NEW.Booking_ID, NEW.Guest_ID, 'UPDATE',
+            JSON_OBJECT('Booking_ID', OLD.Booking_ID, 'Guest_ID', OLD.Guest_ID, 'Room_ID', OLD.Room_ID, 'Check_In_Date', OLD.Check_In_Date, 'Check_Out_Date', OLD.Check_Out_Date, 'Total_Amount', OLD.Total_Amount, 'Payment_Method', OLD.Payment_Method),
+            JSON_OBJECT('Booking_ID', NEW.Booking_ID, 'Guest_ID', NEW.Guest_ID, 'Room_ID', NEW.Room_ID, 'Check_In_Date', NEW.Check_In_Date, 'Check_Out_Date', NEW.Check_Out_Date, 'Total_Amount', NEW.Total_Amount, 'Payment_Method', NEW.Payment_Method),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_booking_delete
+AFTER DELETE ON Booking
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Parent_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Booking', OLD.Booking_ID, OLD.Guest_ID, 'DELETE',
+            JSON_OBJECT('Booking_ID', OLD.Booking_ID, 'Guest_ID', OLD.Guest_ID, 'Room_ID', OLD.Room_ID, 'Check_In_Date', OLD.Check_In_Date, 'Check_Out_Date', OLD.Check_Out_Date, 'Total_Amount', OLD.Total_Amount, 'Payment_Method', OLD.Payment_Method),
+            NULL,
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_room_insert
+AFTER INSERT ON Room
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Room', NEW.Room_ID, 'INSERT',
+            NULL,
+            JSON_OBJECT('Room_ID', NEW.Room_ID, 'Room_Type', NEW.Room_Type, 'Price', NEW.Price, 'Status', NEW.Status),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_room_update
+AFTER UPDATE ON Room
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Room', NEW.Room_ID, 'UPDATE',
+            JSON_OBJECT('Room_ID', OLD.Room_ID, 'Room_Type', OLD.Room_Type, 'Price', OLD.Price, 'Status', OLD.Status),
+            JSON_OBJECT('Room_ID', NEW.Room_ID, 'Room_Type', NEW.Room_Type, 'Price', NEW.Price, 'Status', NEW.Status),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_room_delete
+AFTER DELETE ON Room
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Room', OLD.Room_ID, 'DELETE',
+            JSON_OBJECT('Room_ID', OLD.Room_ID, 'Room_Type', OLD.Room_Type, 'Price', OLD.Price, 'Status', OLD.Status),
+            NULL,
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_staff_insert
+AFTER INSERT ON Staff
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Staff', NEW.Staff_ID, 'INSERT',
+            NULL,
+            JSON_OBJECT('Staff_ID', NEW.Staff_ID, 'Name', NEW.Name, 'Role', NEW.Role, 'Contact', NEW.Contact),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_staff_update
+AFTER UPDATE ON Staff
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Staff', NEW.Staff_ID, 'UPDATE',
+            JSON_OBJECT('Staff_ID', OLD.Staff_ID, 'Name', OLD.Name, 'Role', OLD.Role, 'Contact', OLD.Contact),
+            JSON_OBJECT('Staff_ID', NEW.Staff_ID, 'Name', NEW.Name, 'Role', NEW.Role, 'Contact', NEW.Contact),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_staff_delete
+AFTER DELETE ON Staff
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Staff', OLD.Staff_ID, 'DELETE',
+            JSON_OBJECT('Staff_ID', OLD.Staff_ID, 'Name', OLD.Name, 'Role', OLD.Role, 'Contact', OLD.Contact),
+            NULL,
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_crm_insert
+AFTER INSERT ON CRM
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('CRM', NEW.CRM_ID, 'INSERT',
+            NULL,
+            JSON_OBJECT('CRM_ID', NEW.CRM_ID, 'Guest_ID', NEW.Guest_ID, 'Loyalty_Points', NEW.Loyalty_Points),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_crm_update
+AFTER UPDATE ON CRM
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('CRM', NEW.CRM_ID, 'UPDATE',
+            JSON_OBJECT('CRM_ID', OLD.CRM_ID, 'Guest_ID', OLD.Guest_ID, 'Loyalty_Points', OLD.Loyalty_Points),
+            JSON_OBJECT('CRM_ID', NEW.CRM_ID, 'Guest_ID', NEW.Guest_ID, 'Loyalty_Points', NEW.Loyalty_Points),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_crm_delete
+AFTER DELETE ON CRM
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('CRM', OLD.CRM_ID, 'DELETE',
+            JSON_OBJECT('CRM_ID', OLD.CRM_ID, 'Guest_ID', OLD.Guest_ID, 'Loyalty_Points', OLD.Loyalty_Points),
+            NULL,
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+-- Rate changes reach the change feed so cached rate calendars (pricing.py) are dropped.
+-- Rate_Calendar has no integer key: Row_ID is TO_DAYS(Rate_Date), the images carry the Room_Type
+DELIMITER //
+CREATE TRIGGER log_rate_insert
+AFTER INSERT ON Rate_Calendar
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Rate_Calendar', TO_DAYS(NEW.Rate_Date), 'INSERT',
+            NULL,
+            JSON_OBJECT('Room_Type', NEW.Room_Type, 'Rate_Date', NEW.Rate_Date, 'Rate', NEW.Rate),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_rate_update
+AFTER UPDATE ON Rate_Calendar
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Rate_Calendar', TO_DAYS(NEW.Rate_Date), 'UPDATE',
+            JSON_OBJECT('Room_Type', OLD.Room_Type, 'Rate_Date', OLD.Rate_Date, 'Rate', OLD.Rate),
+            JSON_OBJECT('Room_Type', NEW.Room_Type, 'Rate_Date', NEW.Rate_Date, 'Rate', NEW.Rate),
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER log_rate_delete
+AFTER DELETE ON Rate_Calendar
+FOR EACH ROW
+BEGIN
+    INSERT INTO Change_Log (Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By)
+    VALUES ('Rate_Calendar', TO_DAYS(OLD.Rate_Date), 'DELETE',
+            JSON_OBJECT('Room_Type', OLD.Room_Type, 'Rate_Date', OLD.Rate_Date, 'Rate', OLD.Rate),
+            NULL,
+            COALESCE(@audit_actor, USER()));
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE EVENT purge_change_log
+ON SCHEDULE EVERY 1 HOUR
+STARTS CURRENT_TIMESTAMP
+DO BEGIN
+    -- Watchers only need recent entries; keep a day for late joiners.
+    -- Never drop rows flush_audit_log or the room sweeper has not read yet, nor rows
+    -- the analytics extract has not read (less its SEQ_OVERLAP re-read window).
+    DELETE FROM Change_Log
+    WHERE Changed_At < NOW() - INTERVAL 1 DAY
+    AND Seq_ID <= (SELECT Last_Seq FROM Audit_State WHERE State_ID = 1)
+    AND Seq_ID <= (SELECT Last_Seq FROM Room_Sweeper_State WHERE Sweeper_ID = 1)
+    AND Seq_ID <= COALESCE((SELECT Last_Seq - 200 FROM Analytics_State WHERE State_ID = 1), Seq_ID);
+END //
+DELIMITER ;
+
+-- Append-only audit trail, copied from Change_Log in batches by flush_audit_log
+CREATE TABLE Audit_Log (
+    Audit_ID BIGINT PRIMARY KEY, -- Change_Log Seq_ID
+    Table_Name VARCHAR(30) NOT NULL,
+    Row_ID INT NOT NULL,
+    Operation ENUM('INSERT', 'UPDATE', 'DELETE') NOT NULL,
+    Before_Image JSON NULL,
+    After_Image JSON NULL,
+    Changed_By VARCHAR(100) NULL,
+    Changed_At TIMESTAMP(3) NOT NULL,
+    INDEX idx_audit_row_time (Table_Name, Row_ID, Changed_At), -- "row X as of T"
+    INDEX idx_audit_time (Changed_At),                         -- "what changed today"
+    INDEX idx_audit_actor_time (Changed_By, Changed_At)        -- "what did X change today"
+);
+
+CREATE TABLE Audit_State (
+    State_ID TINYINT PRIMARY KEY,
+    Last_Seq BIGINT NOT NULL DEFAULT 0,
+    Last_Run_At DATETIME NULL
+);
+
+INSERT INTO Audit_State (State_ID, Last_Seq) VALUES (1, 0);
+
+-- Change_Log watermark of the last analytics extract; NULL until the first one,
+-- so a property that never extracts holds back nothing
+CREATE TABLE Analytics_State (
+    State_ID TINYINT PRIMARY KEY,
+    Last_Seq BIGINT NULL,
+    Last_Run_At DATETIME NULL
+);
+
+INSERT INTO Analytics_State (State_ID) VALUES (1);
+
+DELIMITER //
+CREATE TRIGGER audit_log_no_update
+BEFORE UPDATE ON Audit_Log
+FOR EACH ROW
+BEGIN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Audit_Log is append-only';
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER audit_log_no_delete
+BEFORE DELETE ON Audit_Log
+FOR EACH ROW
+BEGIN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Audit_Log is append-only';
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE flush_audit_log(IN batch_size INT)
+BEGIN
+    DECLARE from_seq BIGINT;
+    DECLARE to_seq BIGINT;
+    DECLARE copied INT DEFAULT 0;
+
+    START TRANSACTION;
+
+    SELECT Last_Seq INTO from_seq FROM Audit_State WHERE State_ID = 1 FOR UPDATE;
+
+    SELECT COALESCE(MAX(Seq_ID), from_seq) INTO to_seq
+    FROM (
+        SELECT Seq_ID FROM Change_Log
+        WHERE Seq_ID > from_seq
+        ORDER BY Seq_ID
+        LIMIT batch_size
+    ) AS batch;
+
+    -- Re-scan a window behind the watermark: a lower Seq_ID can commit after a
+    -- higher one. IGNORE skips rows already copied (Audit_ID is the Seq_ID).
+    INSERT IGNORE INTO Audit_Log
+        (Audit_ID, Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By, Changed_At)
+    SELECT Seq_ID, Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By, Changed_At
+    FROM Change_Log
+    WHERE Seq_ID > GREATEST(from_seq - 1000, 0) AND Seq_ID <= to_seq;
+    SET copied = ROW_COUNT();
+
+    UPDATE Audit_State
+    SET Last_Seq = to_seq, Last_Run_At = NOW()
+    WHERE State_ID = 1;
+
+    COMMIT;
+
+    SELECT copied AS Rows_Copied, to_seq AS Last_Seq;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE EVENT audit_log_flusher
+ON SCHEDULE EVERY 10 SECOND
+STARTS CURRENT_TIMESTAMP
+DO BEGIN
+    CALL flush_audit_log(5000); -- Writes stay a single Change_Log insert; indexing happens here in bulk
+END //
+DELIMITER ;
+
+-- Loyalty campaign progress; Last_Guest_ID is the resume checkpoint
+CREATE TABLE Campaign_Progress (
+    Campaign_Name VARCHAR(100) PRIMARY KEY,
+    Min_Points INT NOT NULL,
+    Last_Guest_ID INT NOT NULL DEFAULT 0,
+    Sent INT NOT NULL DEFAULT 0,
+    Failed INT NOT NULL DEFAULT 0,
+    Status ENUM('Running', 'Paused', 'Completed') DEFAULT 'Running',
+    Started_At DATETIME DEFAULT CURRENT_TIMESTAMP,
+    Updated_At DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Guests whose campaign send failed; retried before new pages when the campaign resumes
+CREATE TABLE Campaign_Failure (
+    Campaign_Name VARCHAR(100),
+    Guest_ID INT,
+    Error VARCHAR(255),
+    Attempts INT NOT NULL DEFAULT 1,
+    Failed_At DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (Campaign_Name, Guest_ID),
+    CONSTRAINT fk_failure_campaign FOREIGN KEY (Campaign_Name)
+        REFERENCES Campaign_Progress(Campaign_Name) ON DELETE CASCADE
+);
+
+-- Lets the campaign stream eligible guests in Guest_ID order without a sort
+CREATE INDEX idx_crm_guest_points ON CRM (Guest_ID, Loyalty_Points);
+
+-- Cached RFM aggregates and scores per guest (refreshed by guest_segments.py)
+CREATE TABLE Guest_Segment (
+    Guest_ID INT PRIMARY KEY,
+    Last_Stay DATE NULL,
+    Frequency INT NOT NULL DEFAULT 0,
+    Monetary DECIMAL(12,2) NOT NULL DEFAULT 0,
+    R_Score TINYINT NULL,
+    F_Score TINYINT NULL,
+    M_Score TINYINT NULL,
+    Segment VARCHAR(20) NULL,
+    CONSTRAINT fk_segment_guest FOREIGN KEY (Guest_ID) REFERENCES Guest(Guest_ID) ON DELETE CASCADE
+);
+
+-- Change_Log position the last segment refresh has consumed
+CREATE TABLE Segment_Refresh_State (
+    State_ID TINYINT PRIMARY KEY,
+    Last_Seq BIGINT NOT NULL DEFAULT 0,
+    Refreshed_At DATETIME NULL -- NULL until the first (full) build
+);
+
+INSERT INTO Segment_Refresh_State (State_ID, Last_Seq) VALUES (1, 0);
+
+CREATE INDEX idx_change_log_table ON Change_Log (Table_Name, Seq_ID);
+
+-- The property (hotel) this database holds: each property's data lives in its own
+-- database built from this script, so the table has exactly one row per shard
+CREATE TABLE Property (
+    Property_Code VARCHAR(20) PRIMARY KEY,
+    Name VARCHAR(100) NOT NULL,
+    Address TEXT,
+    Phone VARCHAR(20)
+);
+
+INSERT INTO Property (Property_Code, Name) VALUES ('main', 'Farn Hotel & Resorts');
+
+-- Rooms left per type and date, so sell-out checks and month views read one row per
+-- night instead of joining Room and Booking. A stay holds a unit on every date from
+-- check-in to check-out inclusive (the same rule as prevent_overlapping_bookings).
+-- Kept from today to 365 days ahead by rebuild_room_inventory and the triggers below.
+-- Every room of the type counts, including ones under maintenance (Status is today's state).
+CREATE TABLE Room_Inventory (
+    Room_Type ENUM('Standard', 'Deluxe', 'Suite') NOT NULL,
+    Stay_Date DATE NOT NULL,
+    Total_Units INT NOT NULL,
+    Units_Left INT NOT NULL,
+    PRIMARY KEY (Room_Type, Stay_Date),
+    CONSTRAINT chk_units_left CHECK (Units_Left BETWEEN 0 AND Total_Units)
+);
+
+DELIMITER //
+CREATE PROCEDURE rebuild_room_inventory(IN days_ahead INT)
+BEGIN
+    -- Recount every room type for today .. days_ahead from Room and Booking and drop past
+    -- dates. Run once after creating the table; the daily event keeps the window moving.
+    DELETE FROM Room_Inventory WHERE Stay_Date < CURDATE();
+
+    INSERT INTO Room_Inventory (Room_Type, Stay_Date, Total_Units, Units_Left)
+    WITH RECURSIVE nights (Stay_Date) AS (
+        SELECT CURDATE()
+        UNION ALL
+        SELECT Stay_Date + INTERVAL 1 DAY FROM nights
+        WHERE Stay_Date < CURDATE() + INTERVAL days_ahead DAY
+    ),
+    units AS (
+        SELECT Room_Type, COUNT(*) AS Total_Units FROM Room GROUP BY Room_Type
+    )
+    SELECT u.Room_Type, n.Stay_Date, u.Total_Units,
+           u.Total_Units - (
+               SELECT COUNT(*) FROM Booking b
+               JOIN Room r ON b.Room_ID = r.Room_ID
+               WHERE r.Room_Type = u.Room_Type
+               AND n.Stay_Date BETWEEN b.Check_In_Date AND b.Check_Out_Date
+           )
+    FROM units u CROSS JOIN nights n
+    ON DUPLICATE KEY UPDATE Total_Units = VALUES(Total_Units), Units_Left = VALUES(Units_Left);
+
+    -- A type whose last room was removed
+    DELETE FROM Room_Inventory WHERE Room_Type NOT IN (SELECT Room_Type FROM Room);
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE take_room_inventory(IN stay_type VARCHAR(20), IN stay_check_in DATE, IN stay_check_out DATE)
+BEGIN
+    -- Conditional decrement: take a unit on each stocked date of the stay only where one is
+    -- left. Fewer rows changed than dates stocked means the type is sold out on some date;
+    -- the SIGNAL rolls the whole statement back, so no unit is taken and nothing oversells.
+    DECLARE stocked_dates INT;
+
+    SELECT COUNT(*) INTO stocked_dates
+    FROM Room_Inventory
+    WHERE Room_Type = stay_type
+    AND Stay_Date BETWEEN stay_check_in AND stay_check_out
+    FOR UPDATE;
+
+    UPDATE Room_Inventory
+    SET Units_Left = Units_Left - 1
+    WHERE Room_Type = stay_type
+    AND Stay_Date BETWEEN stay_check_in AND stay_check_out
+    AND Units_Left > 0;
+
+    IF ROW_COUNT() < stocked_dates THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'No rooms of this type left for these dates';
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE PROCEDURE release_room_inventory(IN stay_type VARCHAR(20), IN stay_check_in DATE, IN stay_check_out DATE)
+BEGIN
+    -- Give a stay's units back (cancel, archive or the old side of a modify)
+    UPDATE Room_Inventory
+    SET Units_Left = Units_Left + 1
+    WHERE Room_Type = stay_type
+    AND Stay_Date BETWEEN stay_check_in AND stay_check_out
+    AND Units_Left < Total_Units;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER take_inventory_on_booking_insert
+AFTER INSERT ON Booking
+FOR EACH ROW
+BEGIN
+    DECLARE stay_type VARCHAR(20);
+    SELECT Room_Type INTO stay_type FROM Room WHERE Room_ID = NEW.Room_ID;
+    CALL take_room_inventory(stay_type, NEW.Check_In_Date, NEW.Check_Out_Date);
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER move_inventory_on_booking_update
+AFTER UPDATE ON Booking
+FOR EACH ROW
+BEGIN
+    -- modify_booking: release the old stay, then take the new one (may be sold out)
+    DECLARE old_type VARCHAR(20);
+    DECLARE new_type VARCHAR(20);
+    IF NEW.Room_ID <> OLD.Room_ID
+        OR NEW.Check_In_Date <> OLD.Check_In_Date
+        OR NEW.Check_Out_Date <> OLD.Check_Out_Date THEN
+        SELECT Room_Type INTO old_type FROM Room WHERE Room_ID = OLD.Room_ID;
+        SELECT Room_Type INTO new_type FROM Room WHERE Room_ID = NEW.Room_ID;
+        CALL release_room_inventory(old_type, OLD.Check_In_Date, OLD.Check_Out_Date);
+        CALL take_room_inventory(new_type, NEW.Check_In_Date, NEW.Check_Out_Date);
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER release_inventory_on_booking_delete
+AFTER DELETE ON Booking
+FOR EACH ROW
+BEGIN
+    DECLARE stay_type VARCHAR(20);
+    SELECT Room_Type INTO stay_type FROM Room WHERE Room_ID = OLD.Room_ID;
+    CALL release_room_inventory(stay_type, OLD.Check_In_Date, OLD.Check_Out_Date);
+END //
+DELIMITER ;
+
+-- Adding, removing or retyping a room changes Total_Units; rare, so recount
+DELIMITER //
+CREATE TRIGGER recount_inventory_on_room_insert
+AFTER INSERT ON Room
+FOR EACH ROW
+BEGIN
+    CALL rebuild_room_inventory(365);
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER recount_inventory_on_room_update
+AFTER UPDATE ON Room
+FOR EACH ROW
+BEGIN
+    IF NEW.Room_Type <> OLD.Room_Type THEN
+        CALL rebuild_room_inventory(365);
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER recount_inventory_on_room_delete
+AFTER DELETE ON Room
+FOR EACH ROW
+BEGIN
+    CALL rebuild_room_inventory(365);
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE EVENT room_inventory_roller
+ON SCHEDULE EVERY 1 DAY
+STARTS CURRENT_DATE + INTERVAL 1 DAY
+DO BEGIN
+    CALL rebuild_room_inventory(365); -- Adds the new last date, drops yesterday, heals any drift
+END //
+DELIMITER ;
+
+CALL rebuild_room_inventory(365);
@@ -0,0 +1,327 @@
+"""Columnar copy of the booking data for reporting.
+
+extract() writes Booking_History, Guest, Room and CRM to one Parquet file per
+table under ANALYTICS_DIR/<property>/. The first run copies every row; after
+that only rows named in Change_Log since the last extract are re-read, by
+primary key, and merged into the files. The watermark is also recorded in
+Analytics_State, and purge_change_log keeps every entry after it, so a nightly
+extract stays incremental although the log is otherwise kept for a day (a full
+copy still happens if the files' watermark and the log ever disagree). The revenue, occupancy and top-guest reports
+run on DuckDB over those files, so heavy scans never reach MySQL.
+
+Usage: python analytics.py extract [--full] [--interval 86400]
+       python analytics.py report --start 2026-10-01 --end 2026-10-31
+"""
+from db_utils import current_shard, get_db, read_from_primary, run_query
+from datetime import date, datetime
+import argparse
+import json
+import logging
+import os
+import time
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv("config.env")
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")
+
+SEQ_OVERLAP = 200   # Re-read recent Change_Log rows in case a lower Seq_ID committed late (purge_change_log keeps them)
+FETCH_BATCH = 1000
+
+# Parquet file: (source table or view, key, columns)
+TABLES = {
+    "Booking": ("Booking_History", "Booking_ID",
+                ["Booking_ID", "Guest_ID", "Room_ID", "Check_In_Date", "Check_Out_Date",
+                 "Total_Amount", "Payment_Method"]),
+    "Guest": ("Guest", "Guest_ID", ["Guest_ID", "Name", "Email"]),
+    "Room": ("Room", "Room_ID", ["Room_ID", "Room_Type", "Price", "Status"]),
+    "CRM": ("CRM", "CRM_ID", ["CRM_ID", "Guest_ID", "Loyalty_Points"]),
+}
+DATE_COLUMNS = {"Check_In_Date", "Check_Out_Date"}
+MONEY_COLUMNS = {"Total_Amount", "Price"}
+
+
+def _directory():
+    return os.path.join(ANALYTICS_DIR, current_shard().code)
+
+
+def _path(table, directory=None):
+    return os.path.join(directory or _directory(), f"{table}.parquet")
+
+
+def _frame(table, rows):
+    """Rows (tuples or dicts) -> frame with the same column types every run"""
+    _, _, columns = TABLES[table]
+    frame = pd.DataFrame(rows, columns=columns)
+    for column in columns:
+        if column in DATE_COLUMNS:
+            frame[column] = pd.to_datetime(frame[column])
+        elif column in MONEY_COLUMNS:
+            frame[column] = frame[column].astype("float64")
+    return frame
+
+
+def _write(table, frames, directory):
+    """Write frames to the table's Parquet file, replacing it atomically; returns the row count"""
+    path = _path(table, directory)
+    temp_path = path + ".tmp"
+    writer = None
+    written = 0
+    try:
+        for frame in frames:
+            written += len(frame)
+            batch = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(temp_path, batch.schema)
+            writer.write_table(batch.cast(writer.schema))
+        if writer is None:
+            pq.write_table(pa.Table.from_pandas(_frame(table, []), preserve_index=False), temp_path)
+    finally:
+        if writer:
+            writer.close()
+    os.replace(temp_path, path)
+    return written
+
+
+def _stream(table, chunk_size=50000):
+    """Every row of the table on an unbuffered cursor, as frames of chunk_size rows"""
+    source, _, columns = TABLES[table]
+    conn = None
+    cursor = None
+    try:
+        conn = get_db(stream=True)
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {source}")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield _frame(table, rows)
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def _fetch(table, ids):
+    """Current rows for these keys (deleted ones are absent)"""
+    source, key, columns = TABLES[table]
+    ids = list(ids)
+    rows = []
+    for i in range(0, len(ids), FETCH_BATCH):
+        chunk = ids[i:i + FETCH_BATCH]
+        rows.extend(run_query(
+            f"SELECT {', '.join(columns)} FROM {source} WHERE {key} IN ({', '.join(['%s'] * len(chunk))})",
+            tuple(chunk)
+        ))
+    return _frame(table, rows)
+
+
+def _changed_rows(last_seq):
+    """({table: keys changed after last_seq}, new watermark); changes is None if the log no longer covers last_seq"""
+    bounds = run_query("SELECT MIN(Seq_ID) AS first_seq, MAX(Seq_ID) AS max_seq FROM Change_Log")[0]
+    max_seq = bounds["max_seq"] or last_seq
+    if bounds["first_seq"] is not None and bounds["first_seq"] > last_seq + 1:
+        return None, max_seq  # purge_change_log removed entries we never read
+    rows = run_query(
+        f"""SELECT DISTINCT Table_Name, Row_ID FROM Change_Log
+        WHERE Table_Name IN ({', '.join(['%s'] * len(TABLES))}) AND Seq_ID > %s AND Seq_ID <= %s""",
+        (*TABLES, max(last_seq - SEQ_OVERLAP, 0), max_seq)
+    )
+    changes = {table: set() for table in TABLES}
+    for row in rows:
+        changes[row["Table_Name"]].add(row["Row_ID"])
+    return changes, max_seq
+
+
+def _load_state(directory):
+    try:
+        with open(os.path.join(directory, "_state.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_state(directory, last_seq):
+    path = os.path.join(directory, "_state.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"last_seq": last_seq, "extracted_at": datetime.now().isoformat(timespec="seconds")}, f)
+    os.replace(path + ".tmp", path)
+    # Lets purge_change_log release the entries this extract has read
+    run_query("UPDATE Analytics_State SET Last_Seq = %s, Last_Run_At = NOW() WHERE State_ID = 1",
+              (last_seq,), fetch=False)
+
+
+def extract(full=False):
+    """Bring the current property's Parquet files up to date; returns rows re-read per table"""
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    # The watermark and the rows must come from the same, current copy of the data
+    with read_from_primary():
+        state = None if full else _load_state(directory)
+        changes, max_seq = (None, None) if state is None else _changed_rows(state["last_seq"])
+        if changes is None:
+            # Read the watermark before scanning so changes made during the scan are picked up next time
+            max_seq = run_query("SELECT COALESCE(MAX(Seq_ID), 0) AS max_seq FROM Change_Log")[0]["max_seq"]
+            stats = {table: _write(table, _stream(table), directory) for table in TABLES}
+            mode = "full"
+        else:
+            stats = _apply_changes(changes, directory)
+            mode = "incremental"
+    _save_state(directory, max_seq)
+    stats = {"Mode": mode, **stats}
+    logger.info(f"Analytics extract ({current_shard().code}): {stats}")
+    return stats
+
+
+def _apply_changes(changes, directory):
+    stats = {}
+    fresh = {}
+    for table in ("Guest", "Room", "CRM", "Booking"):
+        if table == "Booking":
+            # merge_guests moves archived stays without logging them; re-read the deleted guests' stays
+            deleted_guests = changes["Guest"] - set(fresh["Guest"]["Guest_ID"])
+            if deleted_guests:
+                bookings = pd.read_parquet(_path("Booking", directory), columns=["Booking_ID", "Guest_ID"])
+                changes["Booking"] |= set(bookings.loc[bookings["Guest_ID"].isin(deleted_guests), "Booking_ID"])
+        _, key, _ = TABLES[table]
+        fresh[table] = _fetch(table, changes[table])
+        if changes[table]:
+            old = pd.read_parquet(_path(table, directory))
+            _write(table, [old[~old[key].isin(changes[table])], fresh[table]], directory)
+        stats[table] = len(changes[table])
+    return stats
+
+
+def extracted_at():
+    """When the current property's files were last brought up to date (None before the first extract)"""
+    state = _load_state(_directory())
+    return datetime.fromisoformat(state["extracted_at"]) if state else None
+
+
+def run_extractor(interval=86400):
+    """Extract loop (nightly by default); a full copy happens automatically when Change_Log no longer covers the watermark"""
+    while True:
+        try:
+            extract()
+        except Exception as e:
+            logger.error(f"Analytics extract failed: {str(e)}")
+        time.sleep(interval)
+
+
+# --- Reports (DuckDB over the Parquet files) ---
+def _query(query, params=()):
+    """Run a DuckDB query with one view per extracted table; rows as dicts like run_query()"""
+    directory = _directory()
+    conn = duckdb.connect()
+    try:
+        for table in TABLES:
+            path = _path(table, directory).replace("'", "''")
+            conn.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def performance_metrics(start, end):
+    return _query("""
+        SELECT
+            COUNT(*) AS total_bookings,
+            SUM(Total_Amount) AS total_revenue,
+            AVG(Total_Amount) AS avg_booking_value,
+            COUNT(DISTINCT Guest_ID) AS unique_guests
+        FROM Booking
+        WHERE Check_In_Date BETWEEN ? AND ?
+        AND Payment_Method != 'Pending'
+    """, (start, end))
+
+
+def revenue_by_room_type(start, end):
+    return _query("""
+        SELECT
+            r.Room_Type,
+            COUNT(b.Booking_ID) AS bookings,
+            SUM(b.Total_Amount) AS revenue,
+            AVG(b.Total_Amount) AS avg_revenue
+        FROM Booking b
+        JOIN Room r ON b.Room_ID = r.Room_ID
+        WHERE b.Check_In_Date BETWEEN ? AND ?
+        AND b.Payment_Method != 'Pending'
+        GROUP BY r.Room_Type
+        ORDER BY revenue DESC
+    """, (start, end))
+
+
+def occupancy(start, end):
+    """Occupied rooms and occupancy rate for each night from start to end"""
+    return _query("""
+        WITH nights AS (
+            SELECT CAST(range AS DATE) AS Night
+            FROM range(CAST(? AS DATE), CAST(? AS DATE) + INTERVAL 1 DAY, INTERVAL 1 DAY)
+        ),
+        rooms AS (SELECT COUNT(*) AS total_rooms FROM Room)
+        SELECT
+            n.Night,
+            COUNT(b.Booking_ID) AS occupied,
+            ANY_VALUE(r.total_rooms) AS total_rooms,
+            COUNT(b.Booking_ID) / NULLIF(ANY_VALUE(r.total_rooms), 0) AS occupancy_rate
+        FROM nights n
+        CROSS JOIN rooms r
+        LEFT JOIN Booking b ON b.Check_In_Date <= n.Night AND b.Check_Out_Date > n.Night
+        GROUP BY n.Night
+        ORDER BY n.Night
+    """, (start, end))
+
+
+def top_guests(start, end, limit=10):
+    return _query("""
+        SELECT
+            g.Guest_ID,
+            g.Name,
+            g.Email,
+            COUNT(b.Booking_ID) AS visits,
+            SUM(b.Total_Amount) AS total_spend,
+            c.Loyalty_Points
+        FROM Booking b
+        JOIN Guest g ON b.Guest_ID = g.Guest_ID
+        JOIN CRM c ON g.Guest_ID = c.Guest_ID
+        WHERE b.Check_In_Date BETWEEN ? AND ?
+        GROUP BY g.Guest_ID, g.Name, g.Email, c.Loyalty_Points
+        ORDER BY visits DESC, total_spend DESC
+        LIMIT ?
+    """, (start, end, limit))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar analytics extract and reports")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("extract")
+    run.add_argument("--full", action="store_true", help="Copy every row instead of the Change_Log delta")
+    run.add_argument("--interval", type=int, help="Keep running, extracting every N seconds")
+    report = sub.add_parser("report")
+    report.add_argument("--start", type=date.fromisoformat, default=date.today().replace(day=1))
+    report.add_argument("--end", type=date.fromisoformat, default=date.today())
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        if args.interval:
+            if args.full:
+                extract(full=True)
+            run_extractor(args.interval)
+        else:
+            print(extract(full=args.full))
+    else:
+        print(f"Data as of {extracted_at()}")
+        print(performance_metrics(args.start, args.end))
+        for row in revenue_by_room_type(args.start, args.end):
+            print(f"{row['Room_Type']:<10} {row['bookings']:>6} bookings  Rs.{row['revenue']:,.2f}")
+        for guest in top_guests(args.start, args.end):
+            print(f"{guest['visits']:>4} visits  Rs.{guest['total_spend']:,.2f}  {guest['Name']} <{guest['Email']}>")
@@ -0,0 +1,147 @@
+"""Headless booking API for the channel manager.
+
+Run with: uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
+from datetime import date
+from typing import Literal, Optional
+import os
+
+import booking_queue
+import booking_service
+import db_utils
+from booking_service import BookingConflict
+from pricing import quote_rooms
+from receipts import HOTEL_NAME, generate_secure_receipt
+
+app = FastAPI(title=f"{HOTEL_NAME} Booking API" if len(db_utils.SHARDS) == 1 else "Booking API")
+
+
+@app.middleware("http")
+async def route_property(request: Request, call_next):
+    """X-Property header picks the property's database; without it the default one is used.
+    Writes are attributed to the X-Clerk header, else to the caller's address."""
+    code = request.headers.get("X-Property")
+    if code:
+        if code not in db_utils.SHARDS:
+            return Response(f"Unknown property: {code}", status_code=404)
+        db_utils.set_property(code)
+    db_utils.set_actor(request.headers.get("X-Clerk")
+                       or (f"api:{request.client.host}" if request.client else "api"))
+    return await call_next(request)
+
+
+class BookingRequest(BaseModel):
+    guest_id: int = Field(gt=0)
+    room_id: int = Field(gt=0)
+    check_in: date
+    check_out: date
+    payment_method: Literal["Pending", "Credit Card", "Cash", "UPI"] = "Pending"
+
+
+# Endpoints are plain `def` so FastAPI runs the blocking MySQL calls in its threadpool
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/availability")
+def availability(
+    check_in: date,
+    check_out: date,
+    room_type: Optional[Literal["Standard", "Deluxe", "Suite"]] = None
+):
+    if check_out <= check_in:
+        raise HTTPException(status_code=422, detail="check_out must be after check_in")
+    rooms = booking_service.available_rooms(check_in, check_out, room_type)
+    return quote_rooms(rooms, check_in, check_out)
+
+
+@app.post("/bookings", status_code=201)
+def create_booking(request: BookingRequest):
+    if not booking_service.get_guest(request.guest_id):
+        raise HTTPException(status_code=404, detail="Guest ID does not exist")
+    try:
+        return booking_queue.submit(
+            request.guest_id, request.room_id,
+            request.check_in, request.check_out, request.payment_method
+        )
+    except BookingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+class BookingChange(BaseModel):
+    room_id: int = Field(gt=0)
+    check_in: date
+    check_out: date
+
+
+@app.patch("/bookings/{booking_id}")
+def modify_booking(booking_id: int, change: BookingChange):
+    try:
+        booking = booking_service.modify_booking(booking_id, change.room_id, change.check_in, change.check_out)
+    except BookingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return booking
+
+
+@app.delete("/bookings/{booking_id}", status_code=204)
+def cancel_booking(booking_id: int):
+    if not booking_service.cancel_booking(booking_id):
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return Response(status_code=204)
+
+
+@app.get("/guests/{guest_id}")
+def get_guest(guest_id: int):
+    guest = booking_service.get_guest(guest_id)
+    if not guest:
+        raise HTTPException(status_code=404, detail="Guest not found")
+    return guest
+
+
+@app.get("/guests")
+def find_guests(email: Optional[str] = None, phone: Optional[str] = None,
+                limit: int = Query(50, le=500)):
+    if not (email or phone):
+        raise HTTPException(status_code=422, detail="Pass email or phone")
+    return booking_service.find_guests(email, phone, limit)
+
+
+def _unavailable(e):
+    """The property's database is down or not answering (503), as opposed to a failed request"""
+    return isinstance(e, (db_utils.CircuitOpenError, TimeoutError)) or db_utils._is_outage(e)
+
+
+@app.get("/bookings/{booking_id}/receipt")
+def get_receipt(booking_id: int):
+    try:
+        booking = booking_service.get_booking(booking_id)
+        if booking:
+            pdf_path, _ = generate_secure_receipt(booking_id, max_retries=1)
+    except Exception as e:
+        if _unavailable(e.__cause__ or e):
+            raise HTTPException(status_code=503, detail=str(e))
+        raise HTTPException(status_code=500, detail="Receipt generation failed")
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    try:
+        with open(pdf_path, "rb") as f:
+            content = f.read()
+    finally:
+        os.remove(pdf_path)
+    return Response(
+        content,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="Booking_{booking_id}.pdf"'}
+    )
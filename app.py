@@ -1,134 +1,173 @@
 import streamlit as st
 from db_utils import run_query,get_db
+import db_utils
+from room_sweeper import sweeper_status
+from change_feed import ChangeFeed
+from receipts import generate_secure_receipt, hotel_name, send_secure_email
+from receipt_batch import write_receipts_zip
+from loyalty_campaign import claim_campaign, run_campaign
+import booking_queue
+import booking_service
+from tracing import span
+from profiler import PROFILER_ENABLED, RerunProfiler
+import pricing
+from pricing import quote_rooms
+from availability_index import AvailabilityIndex
+from room_assignment import auto_book
+from room_inventory import MONTH_INVENTORY, month_bounds
+from room_store import RoomStore
+from guest_segments import refresh_segments
+from guest_dedup import GuestMatcher, find_duplicates, merge_guests
+from audit_log import booking_as_of, changes_today
 import pandas as pd
-from fpdf import FPDF
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from email.mime.text import MIMEText
 import tempfile
+import threading
+import contextvars
 import os
 from dotenv import load_dotenv
-from datetime import datetime
-import time 
+from datetime import datetime, timedelta
 
 # --- Minimal Config ---
 load_dotenv("config.env")
-HOTEL_NAME = "Farn Hotel & Resorts"
 
 
-# --- Minimal PDF/Email Functions ---
-def generate_secure_receipt(booking_id, max_retries=3, delay=1):
-    """Enhanced with retry logic for database consistency"""
-    for attempt in range(max_retries):
-        try:
-            booking = run_query("""
-                SELECT b.Booking_ID, g.Name, g.Email, r.Room_Type, 
-                       b.Check_In_Date, b.Check_Out_Date, b.Total_Amount
-                FROM Booking b
-                JOIN Guest g ON b.Guest_ID = g.Guest_ID
-                JOIN Room r ON b.Room_ID = r.Room_ID
-                WHERE b.Booking_ID = %s
-            """, (booking_id,))
-            
-            if not booking:
-                if attempt == max_retries - 1:
-                    raise ValueError(f"Booking {booking_id} not found after {max_retries} attempts")
-                time.sleep(delay)  # This is where we needed the time import
-                continue
-                
-            booking = booking[0]
-            
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            pdf.cell(0, 10, "Booking Receipt", 0, 1, 'C')
-            
-            # Add receipt content
-            for label, value in [
-                ("Booking ID:", booking['Booking_ID']),
-                ("Guest:", booking['Name']),
-                ("Room:", booking['Room_Type']),
-                ("Check-In:", str(booking['Check_In_Date'])),
-                ("Check-Out:", str(booking['Check_Out_Date'])),
-                ("Total:", f"Rs.{booking['Total_Amount']}")
-            ]:
-                pdf.cell(40, 10, label, 0, 0)
-                pdf.cell(0, 10, str(value), 0, 1)
-            
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-            pdf.output(temp_file.name)
-            return temp_file.name, booking['Email']
-            
-        except Exception as e:
-            if attempt == max_retries - 1:
-                raise Exception(f"Receipt generation failed after {max_retries} attempts: {str(e)}")
-            time.sleep(delay)  # Also needed here
+# --- Tab Reads: (query, params, tables it depends on) ---
+GUEST_DIRECTORY = ("SELECT * FROM Guest ORDER BY Guest_ID DESC", None, ("Guest",))
+
+STAFF_DIRECTORY = ("SELECT * FROM Staff ORDER BY Staff_ID DESC", None, ("Staff",))
+
+CRM_LOYALTY = ("""
+    SELECT g.Guest_ID, g.Name, g.Email, c.Loyalty_Points,
+           COALESCE(s.Segment, 'No Stays') AS Segment
+    FROM CRM c
+    JOIN Guest g ON c.Guest_ID = g.Guest_ID
+    LEFT JOIN Guest_Segment s ON s.Guest_ID = c.Guest_ID
+    ORDER BY c.Loyalty_Points DESC
+""", None, ("CRM", "Guest"))
 
-def send_secure_email(to_email, pdf_path):
-    """Final battle-tested version with every safeguard"""
+
+# --- Change Feed (one set of shared resources per property) ---
+@st.cache_resource
+def get_change_feed(property):
+    """One Change_Log watcher per property, shared by every session in this process"""
+    feed = ChangeFeed(property=property)
+    # Quotes must follow rate changes at once, or they differ from what the booking is charged
+    feed.subscribe(lambda entries: _on_property(property, pricing.apply_changes, entries))
+    return feed.start()
+
+@st.cache_resource
+def get_availability_index(property):
+    """Room-night bitmaps shared by all sessions, patched from the change feed"""
+    index = AvailabilityIndex()
+    # Subscribe before loading so writes seen while the load runs are not skipped
+    get_change_feed(property).subscribe(lambda entries: _on_property(property, index.apply_changes, entries))
+    with db_utils.use_property(property):
+        index.rebuild()
+    return index
+
+@st.cache_resource
+def get_room_store(property):
+    """Compact Room/active Booking arrays behind Available Rooms and Active Bookings, patched from the change feed"""
+    store = RoomStore()
+    # Subscribe before loading so writes seen while the load runs are not skipped
+    get_change_feed(property).subscribe(lambda entries: _on_property(property, store.apply_changes, entries))
+    with db_utils.use_property(property):
+        store.rebuild()
+    return store
+
+@st.cache_resource
+def get_guest_matcher(property):
+    """Duplicate-guest blocking index shared by all sessions, patched from the change feed"""
+    matcher = GuestMatcher()
+    # Subscribe before loading so writes seen while the load runs are not skipped
+    get_change_feed(property).subscribe(lambda entries: _on_property(property, matcher.apply_changes, entries))
+    with db_utils.use_property(property):
+        matcher.rebuild()
+    return matcher
+
+def _on_property(property, listener, entries):
+    with db_utils.use_property(property):
+        listener(entries)
+
+def register_guest(feed, name, email, phone, address):
     try:
-        # Validate inputs
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"PDF not found at {pdf_path}")
-        if not '@' in to_email:
-            raise ValueError(f"Invalid email: {to_email}")
-
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = os.getenv("EMAIL_ADDRESS")
-        msg['To'] = to_email
-        msg['Subject'] = f"{HOTEL_NAME} Booking Confirmation"
-        
-        # Simple text body
-        msg.attach(MIMEText(
-            "Please find your booking receipt attached.\n\n"
-            "Thank you for your reservation!",
-            'plain'
-        ))
-
-        # Attach PDF with explicit encoding
-        with open(pdf_path, 'rb') as f:
-            part = MIMEApplication(
-                f.read(),
-                _subtype='pdf',
-                Name="Receipt.pdf"
-            )
-        part.add_header(
-            'Content-Disposition',
-            'attachment',
-            filename="Booking_Receipt.pdf"
+        run_query(
+            "INSERT INTO Guest (Name, Email, Phone, Address) VALUES (%s, %s, %s, %s)",
+            (name, email, phone, address),
+            fetch=False
         )
-        msg.attach(part)
+        st.success(f"Guest {name} registered successfully!")
+        feed.refresh()
+        st.rerun()
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
 
-        # Print raw email headers for debugging
-        print("\n=== EMAIL HEADERS ===")
-        print(msg.as_string()[:500])  # First 500 characters
-        print("====================")
+@st.fragment(run_every=2)
+def watch_for_changes(feed):
+    """Rerun this session only when the watcher has seen a write"""
+    current = feed.snapshot()
+    seen = st.session_state.setdefault("seen_versions", current)
+    if current != seen:
+        st.session_state.seen_versions = current
+        st.rerun()
 
-        # Send with timeout
-        with smtplib.SMTP(os.getenv("SMTP_SERVER"), int(os.getenv("SMTP_PORT")), timeout=10) as server:
-            server.starttls()
-            server.login(os.getenv("EMAIL_ADDRESS"), os.getenv("EMAIL_PASSWORD"))
-            response = server.send_message(msg)
-            print(f"SMTP Response: {response}")
-            return True
+def request_profile():
+    st.session_state.profile_run = True
 
-    except Exception as e:
-        print(f"❌ FULL ERROR TRACE:\n{type(e).__name__}: {str(e)}\n")
-        return False
-    finally:
-        # Guaranteed cleanup
-        try:
-            if os.path.exists(pdf_path):
-                os.remove(pdf_path)
-                print(f"Temporary file {pdf_path} deleted")
-        except Exception as e:
-            print(f"Cleanup warning: {str(e)}")
+def profiler_panel():
+    """Debug sidebar (?debug=1): profile one rerun and show where its time went"""
+    with st.sidebar.expander("Profiler", expanded=True):
+        st.button("Profile a rerun", on_click=request_profile)
+        profile = st.session_state.get("last_profile")
+        if not profile:
+            return
+        st.caption(f"{profile['seconds']}s · {profile['samples']} samples · {profile['file']}")
+        st.bar_chart(pd.Series(profile["categories"], name="Seconds"))
+        st.dataframe(pd.DataFrame(profile["top"], columns=["Function (self time)", "Seconds"]),
+                     hide_index=True, use_container_width=True)
+        with open(profile["file"], "rb") as f:
+            st.download_button("⬇️ Collapsed stacks", data=f.read(),
+                               file_name=os.path.basename(profile["file"]), mime="text/plain")
 
 # --- Main Application ---
 def main():
     st.set_page_config(layout="wide", page_title="Hotel Management System")
+    debug = PROFILER_ENABLED and st.query_params.get("debug") == "1"
+    if debug and st.session_state.pop("profile_run", False):
+        profile = RerunProfiler()
+        try:
+            with profile:
+                render()
+        finally:
+            # Also kept when the rerun ends in st.rerun(); shown on the next run
+            st.session_state.last_profile = profile.summary
+    else:
+        render()
+    if debug:
+        profiler_panel()
+
+def render():
+    if len(db_utils.SHARDS) > 1:
+        property = st.sidebar.selectbox(
+            "Property", list(db_utils.SHARDS),
+            index=list(db_utils.SHARDS).index(db_utils.DEFAULT_PROPERTY),
+            format_func=lambda code: db_utils.SHARDS[code].name
+        )
+    else:
+        property = db_utils.DEFAULT_PROPERTY
+    db_utils.set_property(property)
+    # Writes are attributed to the signed-in user, else to the name the clerk enters
+    clerk = st.user.get("email") if st.user.get("is_logged_in") else None
+    if not clerk:
+        clerk = st.sidebar.text_input("Clerk", key="clerk", help="Recorded with your changes in the audit trail")
+    db_utils.set_actor(clerk)
+    feed = get_change_feed(property)
+    if db_utils.current_shard().breaker.opened:
+        st.warning("Database unavailable: showing the last loaded data, changes cannot be saved right now.")
+    st.session_state.seen_versions = feed.snapshot()
+    watch_for_changes(feed)
+    # Independent tab reads run concurrently; cached ones are skipped
+    feed.prefetch([GUEST_DIRECTORY, STAFF_DIRECTORY, CRM_LOYALTY])
     
     tab1, tab2, tab3, tab4 = st.tabs([
         "Guest Registration", 
@@ -156,20 +195,29 @@ def main():
                     elif len(phone) != 10 or not phone.isdigit():
                         st.error("Phone must be 10 digits")
                     else:
-                        try:
-                            run_query(
-                                "INSERT INTO Guest (Name, Email, Phone, Address) VALUES (%s, %s, %s, %s)",
-                                (name, email, phone, address),
-                                fetch=False
-                            )
-                            st.success(f"Guest {name} registered successfully!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error: {str(e)}")
+                        matches = get_guest_matcher(property).candidates(name, email, phone)
+                        if matches:
+                            # Hold the entry until the clerk decides; the form clears on submit
+                            st.session_state.pending_guest = (name, email, phone, address, matches)
+                        else:
+                            register_guest(feed, name, email, phone, address)
+
+            pending = st.session_state.get("pending_guest")
+            if pending:
+                name, email, phone, address, matches = pending
+                st.warning(f"{name} looks like an existing guest:")
+                st.dataframe(pd.DataFrame(matches), hide_index=True, use_container_width=True)
+                keep_col, cancel_col = st.columns(2)
+                if keep_col.button("Register Anyway"):
+                    del st.session_state.pending_guest
+                    register_guest(feed, name, email, phone, address)
+                if cancel_col.button("Discard"):
+                    del st.session_state.pending_guest
+                    st.rerun()
         
         with col2:
             st.subheader("Guest Directory")
-            guests = run_query("SELECT * FROM Guest ORDER BY Guest_ID DESC")
+            guests = feed.query(*GUEST_DIRECTORY)
             
             if guests:
                 df = pd.DataFrame(guests)
@@ -202,12 +250,38 @@ def main():
                                 fetch=False
                             )
                         st.success(f"Deleted {len(selected_ids)} guest(s)")
+                        feed.refresh()
                         st.rerun()
                     else:
                         st.warning("No guests selected for deletion")
             else:
                 st.info("No guests found in database")
 
+            with st.expander("Possible Duplicates"):
+                if st.button("Scan Guests"):
+                    with st.spinner("Comparing guests..."):
+                        st.session_state.duplicate_proposals = find_duplicates(get_guest_matcher(property).records())
+                proposals = st.session_state.get("duplicate_proposals")
+                if proposals:
+                    st.dataframe(pd.DataFrame(proposals), hide_index=True, use_container_width=True)
+                    choice = st.selectbox(
+                        "Merge",
+                        range(len(proposals)),
+                        format_func=lambda i: f"{proposals[i]['Duplicate_ID']} {proposals[i]['Duplicate_Name']} "
+                                              f"into {proposals[i]['Keep_ID']} {proposals[i]['Keep_Name']}"
+                    )
+                    if st.button("Merge Guests", type="primary"):
+                        proposal = proposals.pop(choice)
+                        try:
+                            merge_guests(proposal['Keep_ID'], proposal['Duplicate_ID'])
+                            st.success(f"Merged guest {proposal['Duplicate_ID']} into {proposal['Keep_ID']}")
+                            feed.refresh()
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error: {str(e)}")
+                elif proposals is not None:
+                    st.info("No likely duplicates found")
+
     # TAB 2: Room Booking
     with tab2:
         st.header("Room Booking")
@@ -218,6 +292,8 @@ def main():
                 st.subheader("New Booking")
                 guest_id = st.number_input("Guest ID*", min_value=1, step=1)
                 room_id = st.number_input("Room ID*", min_value=1, step=1)
+                auto_assign = st.checkbox("Auto-assign a room instead")
+                auto_room_type = st.selectbox("Room Type", ["Standard", "Deluxe", "Suite"])
                 check_in = st.date_input("Check-In Date*")
                 check_out = st.date_input("Check-Out Date*", min_value=check_in)
                 payment_method = st.selectbox(
@@ -227,89 +303,165 @@ def main():
                 )
         
                 if st.form_submit_button("Confirm Booking"):
-                    try:
-                        # 1. Validate guest exists
-                        guest_exists = run_query(
-                            "SELECT 1 FROM Guest WHERE Guest_ID = %s",
-                            (guest_id,)
-                        )
-                        if not guest_exists:
-                            st.error("Guest ID does not exist!")
-                            return
-
-                        # 2. Create booking (returns the new booking ID)
-                        booking_id = run_query(
-                            """INSERT INTO Booking 
-                            (Guest_ID, Room_ID, Check_In_Date, Check_Out_Date, Payment_Method)
-                            VALUES (%s, %s, %s, %s, %s)""",
-                            (guest_id, room_id, check_in, check_out, payment_method),
-                            fetch=False
-                        )
+                    # One trace per submission; stage timings land in TRACE_FILE
+                    with span("booking.confirm", guest_id=guest_id, room_id=room_id,
+                              nights=(check_out - check_in).days) as trace:
+                        try:
+                            # 1. Validate guest exists
+                            with span("booking.guest_check"):
+                                guest_exists = run_query(
+                                    "SELECT 1 FROM Guest WHERE Guest_ID = %s",
+                                    (guest_id,)
+                                )
+                            if not guest_exists:
+                                trace["outcome"] = "unknown_guest"
+                                st.error("Guest ID does not exist!")
+                                return
 
-                        # 3. Generate receipt with retries
-                        receipt_path, guest_email = generate_secure_receipt(booking_id)
+                            # 2. Create booking (group-committed with other clerks' bookings; returns the new booking ID)
+                            with span("booking.insert", auto_assign=auto_assign):
+                                if auto_assign:
+                                    booking = auto_book(get_availability_index(property), guest_id,
+                                                        auto_room_type, check_in, check_out, payment_method)
+                                    if not booking:
+                                        trace["outcome"] = "no_room"
+                                        st.error(f"No {auto_room_type} room is free for these dates")
+                                        return
+                                    room_id = booking['Room_ID']
+                                    st.info(f"Assigned Room {room_id}")
+                                else:
+                                    booking = booking_queue.submit(
+                                        guest_id, room_id, check_in, check_out, payment_method
+                                    )
+                                booking_id = booking['Booking_ID']
+                            trace["booking_id"] = booking_id
+                            # Show the new booking below without a watcher-driven rerun wiping this result
+                            feed.refresh()
+                            st.session_state.seen_versions = feed.snapshot()
+
+                            # 3. Generate receipt with retries
+                            with span("booking.receipt"):
+                                receipt_path, guest_email = generate_secure_receipt(booking_id)
                         
-                        if not receipt_path:
-                            st.error("Receipt generation failed!")
-                            return
-
-                        # 4. Send email
-                        email_sent = False
-                        if guest_email and '@' in guest_email:
-                            email_sent = send_secure_email(guest_email, receipt_path)
-
-                        # 5. User feedback
-                        if email_sent:
-                            st.success(f"""
-                            ✅ Booking #{booking_id} Confirmed!
-                            📧 Receipt sent to {guest_email}
-                            """)
-                        else:
-                            st.warning(f"""
-                            ✅ Booking #{booking_id} Confirmed!
-                            ⚠️ Email not sent - download your receipt below
-                            """)
-                            # PDF download fallback
-                            with open(receipt_path, "rb") as f:
-                                st.download_button(
-                                    label="⬇️ Download Receipt",
-                                    data=f,
-                                    file_name=f"{HOTEL_NAME}_Booking_{booking_id}.pdf",
-                                    mime="application/pdf"
-                                )
+                            if not receipt_path:
+                                st.error("Receipt generation failed!")
+                                return
+
+                            # 4. Send email
+                            email_sent = False
+                            if guest_email and '@' in guest_email:
+                                with span("booking.email"):
+                                    email_sent = send_secure_email(guest_email, receipt_path)
+                            trace["email_sent"] = email_sent
+
+                            # 5. User feedback
+                            if email_sent:
+                                st.success(f"""
+                                ✅ Booking #{booking_id} Confirmed!
+                                💰 Total charged: Rs.{booking['Total_Amount']}
+                                📧 Receipt sent to {guest_email}
+                                """)
+                            else:
+                                st.warning(f"""
+                                ✅ Booking #{booking_id} Confirmed!
+                                💰 Total charged: Rs.{booking['Total_Amount']}
+                                ⚠️ Email not sent - download your receipt below
+                                """)
+                                # PDF download fallback
+                                with open(receipt_path, "rb") as f:
+                                    st.download_button(
+                                        label="⬇️ Download Receipt",
+                                        data=f,
+                                        file_name=f"{hotel_name()}_Booking_{booking_id}.pdf",
+                                        mime="application/pdf"
+                                    )
 
-                        st.balloons()
+                            st.balloons()
+                            trace["outcome"] = "confirmed"
+
+                        except Exception as e:
+                            trace["outcome"] = f"failed: {type(e).__name__}"
+                            st.error(f"❌ Booking failed: {str(e)}")
 
+            with st.expander("Stay Quote"):
+                quote_in = st.date_input("Check-In", key="quote_in")
+                quote_out = st.date_input("Check-Out", key="quote_out",
+                                          value=quote_in + timedelta(days=1), min_value=quote_in)
+                if quote_out > quote_in:
+                    rooms = feed.query("SELECT Room_ID, Room_Type, Price FROM Room ORDER BY Room_ID",
+                                       tables=("Room",))
+                    quotes = quote_rooms([dict(r) for r in rooms], quote_in, quote_out)
+                    if quotes:
+                        st.dataframe(
+                            pd.DataFrame(quotes).groupby("Room_Type")["Quote"].agg(["min", "max"]),
+                            column_config={"min": "From (Rs.)", "max": "To (Rs.)"},
+                            use_container_width=True
+                        )
+                        st.caption("Calendar rates per night, before loyalty discount")
+
+            with st.expander("Re-issue Receipts"):
+                reissue_from = st.date_input("From", key="reissue_from",
+                                             value=datetime.now().replace(day=1).date())
+                reissue_to = st.date_input("To", key="reissue_to", value=datetime.now().date())
+                if st.button("Build Receipt ZIP"):
+                    zip_path = tempfile.NamedTemporaryFile(delete=False, suffix=".zip").name
+                    try:
+                        stats = write_receipts_zip(reissue_from, reissue_to, zip_path)
+                        st.caption(f"{stats['receipts']} receipts · {stats['receipts_per_sec']} receipts/sec")
+                        with open(zip_path, "rb") as f:
+                            st.download_button(
+                                label="⬇️ Download Receipts",
+                                data=f.read(),
+                                file_name=f"{hotel_name()}_Receipts_{reissue_from}_{reissue_to}.zip",
+                                mime="application/zip"
+                            )
                     except Exception as e:
-                        st.error(f"❌ Booking failed: {str(e)}")
+                        st.error(f"Receipt re-issue failed: {str(e)}")
+                    finally:
+                        os.remove(zip_path)
 
         with col2:
+            st.subheader("Find a Room")
+            search_cols = st.columns(3)
+            search_in = search_cols[0].date_input("From", key="search_in")
+            search_out = search_cols[1].date_input("To", key="search_out",
+                                                   value=search_in + timedelta(days=1), min_value=search_in)
+            search_type = search_cols[2].selectbox("Room Type", ["Any", "Standard", "Deluxe", "Suite"])
+            free = get_availability_index(property).free_rooms(
+                search_in, search_out, None if search_type == "Any" else search_type
+            )
+            if free and search_out > search_in:
+                free = quote_rooms(free, search_in, search_out)
+            st.dataframe(pd.DataFrame(free), hide_index=True, use_container_width=True)
+
+            st.subheader("Rooms Left by Month")
+            months = [(datetime.now().date().replace(day=1) + timedelta(days=32 * i)).replace(day=1)
+                      for i in range(12)]
+            inventory_month = st.selectbox("Month", months, format_func=lambda m: m.strftime("%B %Y"))
+            inventory = feed.query(MONTH_INVENTORY, month_bounds(inventory_month), tables=("Booking", "Room"))
+            if inventory:
+                grid = pd.DataFrame(inventory).pivot(index="Room_Type", columns="Stay_Date", values="Units_Left")
+                grid.columns = [day.strftime("%a %d") for day in grid.columns]
+                st.dataframe(grid, use_container_width=True)
+                st.caption("Units of each type still free per date (0 = sold out)")
+            else:
+                st.info("No inventory for this month yet (run python room_inventory.py)")
+
             st.subheader("Available Rooms")
-            available_rooms = run_query("""
-                SELECT r.Room_ID, r.Room_Type, r.Price 
-                FROM Room r
-                WHERE r.Status = 'Available'
-                AND r.Room_ID NOT IN (
-                    SELECT Room_ID FROM Booking 
-                    WHERE Check_Out_Date > CURDATE()
+            sweep = sweeper_status()
+            if sweep and sweep['Last_Run_At']:
+                st.caption(
+                    f"Room status last swept {sweep['Seconds_Since_Run']}s ago · "
+                    f"{sweep['Last_Rooms_Freed']} freed · "
+                    f"{sweep['Pending_Bookings']} expired bookings pending"
                 )
-                ORDER BY r.Room_ID
-            """)
-            st.dataframe(pd.DataFrame(available_rooms), use_container_width=True)
+            room_store = get_room_store(property)
+            st.dataframe(room_store.available_rooms(), use_container_width=True)
             
             st.subheader("Active Bookings")
-            active_bookings = run_query("""
-                SELECT b.Booking_ID, g.Name, r.Room_ID, r.Room_Type, 
-                       b.Check_In_Date, b.Check_Out_Date, b.Payment_Method
-                FROM Booking b
-                JOIN Guest g ON b.Guest_ID = g.Guest_ID
-                JOIN Room r ON b.Room_ID = r.Room_ID
-                WHERE b.Check_Out_Date > CURDATE()
-                ORDER BY b.Check_In_Date
-            """)
+            df = room_store.active_bookings()
             
-            if active_bookings:
-                df = pd.DataFrame(active_bookings)
+            if not df.empty:
                 df['Select'] = False
                 
                 edited_bookings = st.data_editor(
@@ -340,12 +492,54 @@ def main():
                                 fetch=False
                             )
                         st.success(f"Cancelled {len(selected_bookings)} booking(s)")
+                        feed.refresh()
                         st.rerun()
                     else:
                         st.warning("No bookings selected for cancellation")
             else:
                 st.info("No active bookings found")
 
+            with st.expander("Modify Booking"):
+                with st.form("modify_form"):
+                    modify_id = st.number_input("Booking ID", min_value=1, step=1, key="modify_booking")
+                    modify_room = st.number_input("New Room ID", min_value=1, step=1, key="modify_room")
+                    modify_in = st.date_input("New Check-In", key="modify_in")
+                    modify_out = st.date_input("New Check-Out", key="modify_out",
+                                               value=modify_in + timedelta(days=1))
+                    if st.form_submit_button("Update Booking"):
+                        try:
+                            changed = booking_service.modify_booking(modify_id, modify_room, modify_in, modify_out)
+                            if changed:
+                                st.success(f"Booking #{modify_id} moved: Rs.{changed['Previous_Amount']} → "
+                                           f"Rs.{changed['Total_Amount']}")
+                                feed.refresh()
+                            else:
+                                st.error("Booking not found")
+                        except Exception as e:
+                            st.error(f"❌ Update failed: {str(e)}")
+
+            with st.expander("Audit Trail"):
+                audit_booking = st.number_input("Booking ID", min_value=1, step=1, key="audit_booking")
+                audit_date = st.date_input("As of Date", key="audit_date")
+                audit_time = st.time_input("As of Time", key="audit_time")
+                if st.button("Show Booking As Of"):
+                    state = booking_as_of(audit_booking, datetime.combine(audit_date, audit_time))
+                    if state:
+                        st.json(state)
+                    else:
+                        st.info("No record of this booking at that time")
+
+                if st.button("Show Today's Changes"):
+                    today_changes = changes_today(limit=200)
+                    if today_changes:
+                        st.dataframe(
+                            pd.DataFrame(today_changes)[["Changed_At", "Changed_By", "Operation", "Table_Name", "Row_ID"]],
+                            hide_index=True,
+                            use_container_width=True
+                        )
+                    else:
+                        st.info("No changes recorded today")
+
     # TAB 3: Staff Management
     with tab3:
         st.header("Staff Management")
@@ -374,13 +568,14 @@ def main():
                                 fetch=False
                             )
                             st.success(f"Staff {name} added successfully!")
+                            feed.refresh()
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error: {str(e)}")
         
         with col2:
             st.subheader("Staff Directory")
-            staff = run_query("SELECT * FROM Staff ORDER BY Staff_ID DESC")
+            staff = feed.query(*STAFF_DIRECTORY)
             
             if staff:
                 df = pd.DataFrame(staff)
@@ -410,6 +605,7 @@ def main():
                                 fetch=False
                             )
                         st.success(f"Deleted {len(selected_ids)} staff member(s)")
+                        feed.refresh()
                         st.rerun()
                     else:
                         st.warning("No staff selected for deletion")
@@ -419,26 +615,63 @@ def main():
     # TAB 4: CRM View
     with tab4:
         st.header("Customer Loyalty Program")
-        crm_data = run_query("""
-            SELECT g.Guest_ID, g.Name, g.Email, c.Loyalty_Points
-            FROM CRM c
-            JOIN Guest g ON c.Guest_ID = g.Guest_ID
-            ORDER BY c.Loyalty_Points DESC
-        """)
+        all_properties = len(db_utils.SHARDS) > 1 and st.checkbox("All properties")
+        if all_properties:
+            crm_data, failed = db_utils.scatter_gather(CRM_LOYALTY[0])
+            crm_data.sort(key=lambda row: row['Loyalty_Points'], reverse=True)
+            if failed:
+                st.warning(f"Unavailable, not shown: {', '.join(db_utils.SHARDS[code].name for code in failed)}")
+        else:
+            crm_data = feed.query(*CRM_LOYALTY)
         
         if crm_data:
             st.dataframe(
                 pd.DataFrame(crm_data),
                 column_config={
+                    "Property": "Property",
                     "Guest_ID": "Guest ID",
                     "Name": "Name",
                     "Email": "Email",
-                    "Loyalty_Points": "Loyalty Points"
+                    "Loyalty_Points": "Loyalty Points",
+                    "Segment": "RFM Segment"
                 },
                 use_container_width=True
             )
         else:
             st.info("No CRM data available")
 
+        if st.button("Refresh Segments", help="Re-score guests whose bookings changed since the last refresh"):
+            with st.spinner("Scoring guests..."):
+                stats = refresh_segments()
+            # Guest_Segment is not in Change_Log, so drop the cached CRM read by hand
+            feed.invalidate(["CRM"])
+            st.success(f"Re-scored {stats['Guests_Reaggregated']} guests ({stats['Rows_Written']} rows updated)")
+            st.rerun()
+
+        with st.expander("Loyalty Campaign"):
+            with st.form("campaign_form"):
+                campaign_name = st.text_input("Campaign Name*", help="Reuse a name to resume it")
+                min_points = st.number_input("Minimum Points", min_value=0, value=100, step=50)
+                rate = st.number_input("Messages per Second", min_value=1, value=50)
+                if st.form_submit_button("Start Campaign"):
+                    if not campaign_name:
+                        st.error("Please enter a campaign name")
+                    elif not claim_campaign(campaign_name, min_points):
+                        st.warning(f"Campaign '{campaign_name}' is already running")
+                    else:
+                        # Runs in the background; progress is checkpointed to Campaign_Progress
+                        # copy_context() keeps the thread on this session's property
+                        threading.Thread(
+                            target=contextvars.copy_context().run,
+                            args=(run_campaign, campaign_name, min_points, float(rate)),
+                            kwargs={"claimed": True},
+                            daemon=True
+                        ).start()
+                        st.success(f"Campaign '{campaign_name}' started")
+
+            campaigns = run_query("SELECT * FROM Campaign_Progress ORDER BY Updated_At DESC LIMIT 20")
+            if campaigns:
+                st.dataframe(pd.DataFrame(campaigns), hide_index=True, use_container_width=True)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
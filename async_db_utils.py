@@ -0,0 +1,182 @@
+import aiomysql
+import asyncio
+from concurrent.futures import TimeoutError as FutureTimeout
+from db_utils import (CONNECT_TIMEOUT, OUTAGE_ERRNOS, READ_TIMEOUT_MS, CircuitOpenError,
+                      acting_as, current_actor, current_shard, use_property)
+from dotenv import load_dotenv
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+load_dotenv("config.env")
+
+# Longest a blocking caller waits in run_sync(): a capped read plus a connection attempt
+SYNC_TIMEOUT = float(os.getenv("DB_ASYNC_TIMEOUT", str(READ_TIMEOUT_MS / 1000 + CONNECT_TIMEOUT)))
+
+# aiomysql pools are bound to the event loop that created them; one per loop and property
+_pools = {}
+_pools_lock = threading.Lock()
+
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+async def get_pool():
+    shard = current_shard()
+    key = (asyncio.get_running_loop(), shard.code)
+    pool = _pools.get(key)
+    if pool is None:
+        host, _, port = (shard.host or "").partition(":")
+        pool = await aiomysql.create_pool(
+            host=host,
+            port=int(port or os.getenv("DB_PORT", 3306)),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASS"),
+            db=shard.database,
+            minsize=1,
+            maxsize=int(os.getenv("DB_POOL_SIZE", 10)),
+            connect_timeout=CONNECT_TIMEOUT,
+            # Same cap on reads as get_db() connections
+            init_command=f"SET SESSION max_execution_time = {READ_TIMEOUT_MS}" if READ_TIMEOUT_MS else None,
+            autocommit=False  # Explicit transaction control, same as get_db()
+        )
+        with _pools_lock:
+            existing = _pools.setdefault(key, pool)
+        if existing is not pool:
+            # Another coroutine on this loop won the race
+            pool.close()
+            pool = existing
+    return pool
+
+
+async def close_pool():
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _pools if key[0] is loop]:
+        pool = _pools.pop(key)
+        pool.close()
+        await pool.wait_closed()
+
+
+def _is_outage(e):
+    """Can't connect or lost the server: counted against the property's circuit breaker like db_utils failures"""
+    return isinstance(e, (OSError, asyncio.TimeoutError)) or (
+        isinstance(e, aiomysql.OperationalError) and bool(e.args) and e.args[0] in OUTAGE_ERRNOS
+    )
+
+
+async def _guarded(operation):
+    """Run `operation()` unless the circuit is open, and report the outcome to the breaker"""
+    breaker = current_shard().breaker
+    if not breaker.allow():
+        raise CircuitOpenError(f"Database for {current_shard().code} unavailable (circuit open)")
+    try:
+        result = await operation()
+    except Exception as e:
+        if _is_outage(e):
+            breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+async def _set_actor(cursor):
+    """Pooled connections outlive a request, so set (or clear) @audit_actor before each write"""
+    await cursor.execute("SET @audit_actor = %s", (current_actor(),))
+
+
+async def run_query(query, params=None, fetch=True):
+    """Async counterpart of db_utils.run_query"""
+    return await _guarded(lambda: _run_query(query, params, fetch))
+
+
+async def _run_query(query, params, fetch):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        try:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                if not fetch:
+                    await _set_actor(cursor)
+                await cursor.execute(query, params or ())
+                if fetch:
+                    result = await cursor.fetchall()
+                    await conn.rollback()  # End the read snapshot before the connection goes back to the pool
+                else:
+                    result = cursor.lastrowid
+                    await conn.commit()
+            return list(result) if fetch else result
+        except Exception as e:
+            await conn.rollback()
+            logger.error(f"Query failed: {str(e)}\nQuery: {query}\nParams: {params}")
+            raise
+
+
+async def execute_transaction(queries):
+    """Async counterpart of db_utils.execute_transaction"""
+    return await _guarded(lambda: _execute_transaction(queries))
+
+
+async def _execute_transaction(queries):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        try:
+            results = []
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await _set_actor(cursor)
+                for query, params in queries:
+                    await cursor.execute(query, params or ())
+                    if cursor.description:
+                        results.append(list(await cursor.fetchall()))
+                    else:
+                        results.append(cursor.lastrowid)
+            await conn.commit()
+            return results
+        except Exception as e:
+            await conn.rollback()
+            logger.error(f"Transaction failed: {str(e)}")
+            raise
+
+
+async def run_queries(queries):
+    """Run independent reads concurrently; `queries` maps a name to (query, params)"""
+    names = list(queries)
+    results = await asyncio.gather(*(run_query(q, p) for q, p in queries.values()))
+    return dict(zip(names, results))
+
+
+# --- Sync wrappers for Streamlit code paths ---
+def _get_sync_loop():
+    """A long-lived loop on a daemon thread, so the pool survives between reruns"""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="async-db", daemon=True).start()
+    return _sync_loop
+
+
+async def _on_property(code, actor, coro):
+    with use_property(code), acting_as(actor):
+        return await coro
+
+
+def run_sync(coro, timeout=SYNC_TIMEOUT):
+    """Run a coroutine from blocking code, as the caller's property and actor, and wait for its result.
+
+    After `timeout` seconds the coroutine is cancelled, the wait counts as a
+    failure against the property's circuit breaker and TimeoutError is raised.
+    """
+    shard = current_shard()
+    future = asyncio.run_coroutine_threadsafe(_on_property(shard.code, current_actor(), coro), _get_sync_loop())
+    try:
+        return future.result(timeout)
+    except FutureTimeout:
+        future.cancel()
+        shard.breaker.record_failure()
+        raise TimeoutError(f"Database for {shard.code} did not answer within {timeout}s")
+
+
+def run_queries_sync(queries, timeout=SYNC_TIMEOUT):
+    """Blocking wrapper around run_queries()"""
+    return run_sync(run_queries(queries), timeout)
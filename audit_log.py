@@ -0,0 +1,144 @@
+"""Audit trail queries over Audit_Log.
+
+Every write to Guest, Booking, Room, Staff and CRM already lands in Change_Log
+(one insert inside the writer's transaction) with before/after row images;
+flush_audit_log copies those rows into the indexed, append-only Audit_Log in
+batches. Rows not flushed yet are read straight from the Change_Log tail, so
+queries never lag the writes.
+
+Usage: python audit_log.py flush | today [--by USER] | booking ID [--at "2026-10-01 12:00"]
+"""
+from db_utils import call_procedure, run_query
+from datetime import date, datetime
+from decimal import Decimal
+import argparse
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = "Table_Name, Row_ID, Operation, Before_Image, After_Image, Changed_By, Changed_At"
+ARCHIVE_ACTOR = "archiver"  # Changed_By of the Booking deletes made by archive_completed_bookings
+
+# Audit_Log rows plus the Change_Log tail flush_audit_log has not copied yet
+_ROW_VERSIONS = f"""
+    SELECT Audit_ID, {AUDIT_COLUMNS} FROM Audit_Log
+    WHERE Table_Name = %s AND Row_ID = %s {{time_filter}}
+    UNION ALL
+    SELECT Seq_ID, {AUDIT_COLUMNS} FROM Change_Log
+    WHERE Seq_ID > (SELECT Last_Seq FROM Audit_State WHERE State_ID = 1)
+    AND Table_Name = %s AND Row_ID = %s {{time_filter}}
+"""
+
+
+def _decode(rows):
+    for row in rows:
+        for key in ("Before_Image", "After_Image"):
+            if isinstance(row.get(key), (str, bytes, bytearray)):
+                row[key] = json.loads(row[key])
+    return rows
+
+
+def flush_audit_log(batch_size=5000):
+    """Copy one batch of Change_Log rows into Audit_Log (the audit_log_flusher event does this every 10s)"""
+    rows = call_procedure("flush_audit_log", (batch_size,))
+    return rows[0] if rows else {"Rows_Copied": 0, "Last_Seq": None}
+
+
+def row_history(table, row_id):
+    """Every recorded version of a row, oldest first"""
+    return _decode(run_query(
+        _ROW_VERSIONS.format(time_filter="") + " ORDER BY Changed_At, Audit_ID",
+        (table, row_id, table, row_id)
+    ))
+
+
+def _version_as_of(table, row_id, as_of):
+    rows = _decode(run_query(
+        _ROW_VERSIONS.format(time_filter="AND Changed_At <= %s")
+        + " ORDER BY Changed_At DESC, Audit_ID DESC LIMIT 1",
+        (table, row_id, as_of, table, row_id, as_of)
+    ))
+    return rows[0] if rows else None
+
+
+def row_as_of(table, row_id, as_of):
+    """The row as it stood at `as_of` (a dict), or None if it did not exist then.
+
+    None is also returned for rows with no change recorded before `as_of`
+    (created before auditing began).
+    """
+    version = _version_as_of(table, row_id, as_of)
+    return version["After_Image"] if version else None
+
+
+def booking_as_of(booking_id, as_of):
+    """Like row_as_of, but a stay moved to Booking_Archive still exists after it was archived"""
+    version = _version_as_of("Booking", booking_id, as_of)
+    if not version:
+        return None
+    if version["Operation"] == "DELETE" and version["Changed_By"] == ARCHIVE_ACTOR:
+        archived = run_query("""
+            SELECT Booking_ID, Guest_ID, Room_ID, Check_In_Date, Check_Out_Date, Total_Amount, Payment_Method
+            FROM Booking_Archive WHERE Booking_ID = %s
+        """, (booking_id,))
+        if not archived:
+            return version["Before_Image"]
+        # Same value types as the JSON images
+        return {key: value.isoformat() if isinstance(value, date)
+                else float(value) if isinstance(value, Decimal) else value
+                for key, value in archived[0].items()}
+    return version["After_Image"]
+
+
+def changes_since(since, changed_by=None, table=None, limit=500):
+    """Changes at or after `since`, newest first, optionally for one account or table"""
+    filters = ["Changed_At >= %s"]
+    params = [since]
+    if changed_by:
+        filters.append("Changed_By = %s")
+        params.append(changed_by)
+    if table:
+        filters.append("Table_Name = %s")
+        params.append(table)
+    where = " AND ".join(filters)
+    return _decode(run_query(
+        f"""SELECT Audit_ID, {AUDIT_COLUMNS} FROM Audit_Log WHERE {where}
+        UNION ALL
+        SELECT Seq_ID, {AUDIT_COLUMNS} FROM Change_Log
+        WHERE Seq_ID > (SELECT Last_Seq FROM Audit_State WHERE State_ID = 1) AND {where}
+        ORDER BY Changed_At DESC, Audit_ID DESC
+        LIMIT %s""",
+        (*params, *params, limit)
+    ))
+
+
+def changes_today(changed_by=None, table=None, limit=500):
+    """Who changed what since midnight"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return changes_since(today, changed_by, table, limit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit trail")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("flush")
+    today = sub.add_parser("today")
+    today.add_argument("--by")
+    today.add_argument("--table")
+    booking = sub.add_parser("booking")
+    booking.add_argument("booking_id", type=int)
+    booking.add_argument("--at", type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    if args.command == "flush":
+        print(flush_audit_log())
+    elif args.command == "today":
+        for change in changes_today(args.by, args.table):
+            print(f"{change['Changed_At']}  {change['Changed_By']}  {change['Operation']} "
+                  f"{change['Table_Name']} {change['Row_ID']}")
+    elif args.at:
+        print(booking_as_of(args.booking_id, args.at))
+    else:
+        for version in row_history("Booking", args.booking_id):
+            print(f"{version['Changed_At']}  {version['Changed_By']}  {version['Operation']}  {version['After_Image']}")
@@ -0,0 +1,180 @@
+"""In-process room-night availability index.
+
+Each room has one bit per day of a rolling window (bit set = occupied), packed
+eight days to a byte with NumPy. A booking occupies its check-in through its
+check-out day inclusive, and a stay is free when none of its days (again
+inclusive) are set -- the same rule prevent_overlapping_bookings enforces.
+"Which rooms of type X are free from D1 to D2" is a masked AND over the few
+bytes the range spans, for every room at once.
+"""
+from db_utils import read_from_primary, run_query
+import booking_service
+from datetime import date, timedelta
+import logging
+import numpy as np
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _pack(row_bits):
+    return np.packbits(row_bits, bitorder="little")
+
+
+def _unpack(row_bytes, days):
+    return np.unpackbits(row_bytes, count=days, bitorder="little").astype(bool)
+
+
+class AvailabilityIndex:
+    """Starts empty: subscribe apply_changes to the change feed, then rebuild(), so
+    no write lands between the initial load and the first patch"""
+
+    def __init__(self, days=366):
+        self.days = days
+        self.start = None      # First day of the window; None = never loaded
+        self._stale = False    # A patch was lost; reload before the next read
+        self._lock = threading.Lock()
+        self._build_lock = threading.RLock()  # Serializes rebuilds and patches
+
+    def rebuild(self):
+        """Load rooms and bookings overlapping the window from scratch"""
+        with self._build_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        start = date.today()
+        end = start + timedelta(days=self.days)
+        # Change feed patches only cover later writes, so the base must not lag
+        with read_from_primary():
+            rooms = run_query("SELECT Room_ID, Room_Type, Price, Status FROM Room ORDER BY Room_ID")
+            bookings = run_query(
+                """SELECT Booking_ID, Room_ID, Check_In_Date, Check_Out_Date FROM Booking
+                WHERE Check_Out_Date >= %s AND Check_In_Date < %s""",
+                (start, end)
+            )
+
+        with self._lock:
+            self.start = start
+            self.end = end
+            self._rooms = rooms
+            self._row = {room['Room_ID']: i for i, room in enumerate(rooms)}
+            self._room_types = np.array([room['Room_Type'] for room in rooms], dtype=object)
+            self._sellable = np.array([room['Status'] != 'Under Maintenance' for room in rooms], dtype=bool)
+
+            occupied = np.zeros((len(rooms), self.days), dtype=bool)
+            self._spans = {}
+            for booking in bookings:
+                span = self._clip(booking)
+                row = self._row.get(booking['Room_ID'])
+                if span and row is not None:
+                    occupied[row, span[0]:span[1] + 1] = True
+                    self._spans[booking['Booking_ID']] = (row, *span)
+            self._bits = np.packbits(occupied, axis=1, bitorder="little")
+            self._stale = False
+
+        logger.info(f"Availability index built: {len(rooms)} rooms, {len(bookings)} bookings")
+
+    def _clip(self, booking):
+        """Inclusive day offsets of a booking inside the window, or None"""
+        a = max((booking['Check_In_Date'] - self.start).days, 0)
+        b = min((booking['Check_Out_Date'] - self.start).days, self.days - 1)
+        return (a, b) if a <= b else None
+
+    def _set(self, row, a, b, value):
+        bits = _unpack(self._bits[row], self.days)
+        bits[a:b + 1] = value
+        self._bits[row] = _pack(bits)
+
+    def covers(self, check_in, check_out):
+        return self.start <= check_in and check_out < self.end
+
+    def free_rooms(self, check_in, check_out, room_type=None):
+        """Rooms with no booking touching [check_in, check_out], as Room rows"""
+        if self._stale or self.start != date.today():
+            self.rebuild()  # Slide the window forward, or recover a lost patch
+        if not self.covers(check_in, check_out):
+            return booking_service.available_rooms(check_in, check_out, room_type)
+
+        a = (check_in - self.start).days
+        b = (check_out - self.start).days
+        lo, hi = a // 8, b // 8 + 1
+        mask_bits = np.zeros((hi - lo) * 8, dtype=bool)
+        mask_bits[a - lo * 8:b - lo * 8 + 1] = True
+        mask = _pack(mask_bits)
+
+        with self._lock:
+            busy = (self._bits[:, lo:hi] & mask).any(axis=1)
+            free = ~busy & self._sellable
+            if room_type:
+                free &= self._room_types == room_type
+            return [
+                {key: self._rooms[i][key] for key in ('Room_ID', 'Room_Type', 'Price')}
+                for i in np.flatnonzero(free)
+            ]
+
+    def apply_changes(self, entries):
+        """ChangeFeed listener: patch the bitmaps, or rebuild them if the patch fails"""
+        with self._build_lock:
+            if self.start is None:
+                return  # Not loaded yet; the initial rebuild reads these writes
+            try:
+                self._patch(entries)
+                return
+            except Exception as e:
+                logger.warning(f"Availability index patch failed, rebuilding: {str(e)}")
+                self._stale = True
+        self.rebuild()  # If this fails too, the next read retries it
+
+    def _patch(self, entries):
+        booking_ids = {e['Row_ID'] for e in entries if e['Table_Name'] == 'Booking'}
+        room_changes = [e for e in entries if e['Table_Name'] == 'Room']
+
+        if any(e['Operation'] != 'UPDATE' or e['Row_ID'] not in self._row for e in room_changes):
+            self.rebuild()  # Rooms added or removed
+            return
+
+        if room_changes:
+            ids = list({e['Row_ID'] for e in room_changes})
+            rooms = run_query(
+                f"SELECT Room_ID, Room_Type, Price, Status FROM Room WHERE Room_ID IN ({', '.join(['%s'] * len(ids))})",
+                tuple(ids)
+            )
+            with self._lock:
+                for room in rooms:
+                    row = self._row[room['Room_ID']]
+                    self._rooms[row] = room
+                    self._room_types[row] = room['Room_Type']
+                    self._sellable[row] = room['Status'] != 'Under Maintenance'
+
+        if booking_ids:
+            ids = list(booking_ids)
+            current = run_query(
+                f"""SELECT Booking_ID, Room_ID, Check_In_Date, Check_Out_Date FROM Booking
+                WHERE Booking_ID IN ({', '.join(['%s'] * len(ids))})""",
+                tuple(ids)
+            )
+            with self._lock:
+                # Same-room bookings never share a day, so clearing an old span is safe
+                for booking_id in ids:
+                    old = self._spans.pop(booking_id, None)
+                    if old:
+                        self._set(*old, False)
+                for booking in current:
+                    span = self._clip(booking)
+                    row = self._row.get(booking['Room_ID'])
+                    if span and row is not None:
+                        self._set(row, *span, True)
+                        self._spans[booking['Booking_ID']] = (row, *span)
+
+    def occupancy(self, room_type=None):
+        """Copy of (Room_IDs, unpacked rooms x days occupancy) for sellable rooms of a type"""
+        if self._stale or self.start != date.today():
+            self.rebuild()
+        with self._lock:
+            rows = self._sellable.copy()
+            if room_type:
+                rows &= self._room_types == room_type
+            picked = np.flatnonzero(rows)
+            room_ids = np.array([self._rooms[i]['Room_ID'] for i in picked], dtype=np.int64)
+            occupied = np.unpackbits(self._bits[picked], axis=1, count=self.days, bitorder="little").astype(bool)
+        return room_ids, occupied
@@ -0,0 +1,31 @@
+from db_utils import call_procedure
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def archive_completed_bookings(batch_size=1000, keep_days=30):
+    """Move one batch of completed stays from Booking into Booking_Archive"""
+    rows = call_procedure("archive_completed_bookings", (batch_size, keep_days))
+    return rows[0]["Bookings_Archived"] if rows else 0
+
+
+def run_archiver(batch_size=1000, keep_days=30, pause=0.5, max_batches=None):
+    """Drain the backlog in small transactions, sleeping between batches to throttle load"""
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_completed_bookings(batch_size, keep_days)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+        time.sleep(pause)
+
+    logger.info(f"Archived {total} bookings in {batches} batch(es)")
+    return total
+
+
+if __name__ == "__main__":
+    run_archiver()
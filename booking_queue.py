@@ -0,0 +1,227 @@
+"""Group commit for booking submissions.
+
+At check-in peaks every clerk's booking used to be its own connection,
+transaction and commit, and bookings for the same room raced each other on the
+room lock and the overlap trigger. submit() hands the booking to the current
+property's BookingQueue instead; one committer thread per property takes what
+has queued up (at most MAX_BATCH, waiting at most MAX_DELAY for more) and
+commits it as a single transaction:
+
+* at most one booking per room goes into a batch; later ones for that room
+  wait for the next batch, so same-room requests are decided in arrival order
+* the batch's rooms are locked in Room_ID order (one statement), so batches
+  and create_booking() callers cannot deadlock each other
+* prevent_overlapping_bookings still checks every INSERT. Each runs under its
+  own savepoint, so a rejected one (overlap, unknown guest, ...) is rolled back
+  alone and only its caller gets the error (BookingConflict for an overlap);
+  a booking for a Room_ID the batch could not lock fails with ValueError.
+  Only connection errors, deadlocks and lock wait timeouts fail (and retry)
+  the whole batch
+
+Waiting is bounded twice: a batch closes after MAX_DELAY, and submit() gives
+up after SUBMIT_TIMEOUT if the batch has not even started.
+"""
+from booking_service import OVERLAP_ERRNO, PAYMENT_METHODS, BookingConflict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from db_utils import (RETRIES, RETRYABLE_TRANSACTION_ERRNOS, CircuitOpenError, _backoff,
+                      _is_outage, current_actor, current_shard, get_db, mark_written, use_property)
+from collections import deque
+from mysql.connector import errors
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = int(os.getenv("BOOKING_BATCH_SIZE", "32"))
+MAX_DELAY = float(os.getenv("BOOKING_BATCH_DELAY", "0.005"))       # seconds a batch stays open
+SUBMIT_TIMEOUT = float(os.getenv("BOOKING_SUBMIT_TIMEOUT", "10"))  # seconds
+
+INSERT_BOOKING = """INSERT INTO Booking
+    (Guest_ID, Room_ID, Check_In_Date, Check_Out_Date, Payment_Method)
+    VALUES (%s, %s, %s, %s, %s)"""
+
+
+class BookingQueue:
+    """Admission queue and committer thread for one property"""
+
+    def __init__(self, property, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.property = property
+        self.max_batch = max(max_batch, 1)
+        self.max_delay = max_delay
+        self.batches = 0
+        self.committed = 0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"booking-commit-{property}", daemon=True)
+        self._thread.start()
+
+    def submit(self, guest_id, room_id, check_in, check_out, payment_method="Pending", timeout=SUBMIT_TIMEOUT):
+        """Queue a booking and wait for its batch; same result and errors as create_booking()"""
+        if payment_method not in PAYMENT_METHODS:
+            raise ValueError(f"Invalid payment method: {payment_method}")
+        if check_out <= check_in:
+            raise ValueError("Check-out must be after check-in")
+
+        future = Future()
+        with self._cond:
+            # The committer thread has no context of its own; each booking carries its clerk
+            self._pending.append(((guest_id, room_id, check_in, check_out, payment_method, current_actor()), future))
+            self._cond.notify()
+        try:
+            booking = future.result(timeout)
+        except FutureTimeout:
+            # Still queued: withdraw it. Already in a running batch: let that batch decide
+            if future.cancel():
+                raise TimeoutError(f"Booking for room {room_id} not admitted within {timeout}s")
+            booking = future.result()
+        mark_written()
+        return booking
+
+    def stats(self):
+        with self._cond:
+            return {"Batches": self.batches, "Committed": self.committed,
+                    "Avg_Batch": round(self.committed / self.batches, 2) if self.batches else 0.0,
+                    "Queued": len(self._pending)}
+
+    def _next_batch(self):
+        """Wait for work, give the batch MAX_DELAY to fill, then take one booking per room"""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            closes = time.monotonic() + self.max_delay
+            while len(self._pending) < self.max_batch:
+                remaining = closes - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, rooms, deferred = [], set(), []
+            while self._pending and len(batch) < self.max_batch:
+                request = self._pending.popleft()
+                room_id = request[0][1]
+                if room_id in rooms:
+                    deferred.append(request)
+                elif request[1].set_running_or_notify_cancel():  # False: caller timed out
+                    rooms.add(room_id)
+                    batch.append(request)
+            # Same-room requests keep their place at the head of the queue
+            self._pending.extendleft(reversed(deferred))
+        return batch
+
+    def _run(self):
+        with use_property(self.property):
+            while True:
+                batch = self._next_batch()
+                if batch:
+                    self._commit(batch)
+
+    def _commit(self, batch):
+        for attempt in range(RETRIES + 1):
+            try:
+                outcomes = self._execute([args for args, _ in batch])
+                current_shard().breaker.record_success()
+                break
+            except Exception as e:
+                if getattr(e, "errno", None) in RETRYABLE_TRANSACTION_ERRNOS and attempt < RETRIES:
+                    _backoff(attempt)
+                    continue
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+        with self._cond:
+            self.batches += 1
+            self.committed += sum(not isinstance(outcome, Exception) for outcome in outcomes)
+        for (_, future), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def _execute(self, bookings):
+        """One transaction for the batch; returns a booking dict or the exception per entry"""
+        conn = None
+        cursor = None
+        try:
+            conn = get_db()
+            cursor = conn.cursor(dictionary=True)
+            rooms = sorted({room_id for _, room_id, *_ in bookings})
+            cursor.execute(
+                f"SELECT Room_ID FROM Room WHERE Room_ID IN ({', '.join(['%s'] * len(rooms))}) "
+                "ORDER BY Room_ID FOR UPDATE",
+                tuple(rooms)
+            )
+            locked = {row["Room_ID"] for row in cursor.fetchall()}
+
+            outcomes = []
+            actor = None
+            for *args, booking_actor in bookings:
+                if args[1] not in locked:
+                    outcomes.append(ValueError(f"Room {args[1]} does not exist"))
+                    continue
+                if booking_actor != actor:
+                    actor = booking_actor
+                    cursor.execute("SET @audit_actor = %s", (actor,))
+                # A failed INSERT is undone alone; the rest of the batch still commits
+                cursor.execute("SAVEPOINT booking")
+                try:
+                    cursor.execute(INSERT_BOOKING, tuple(args))
+                    outcomes.append(cursor.lastrowid)
+                except errors.DatabaseError as e:
+                    if _is_outage(e) or e.errno in RETRYABLE_TRANSACTION_ERRNOS:
+                        raise  # The whole batch fails (and is retried on deadlock/lock wait)
+                    cursor.execute("ROLLBACK TO SAVEPOINT booking")
+                    outcomes.append(BookingConflict(str(e.msg)) if e.errno == OVERLAP_ERRNO else e)
+
+            # Totals come from the pricing trigger; read them back in one round trip
+            booking_ids = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+            totals = {}
+            if booking_ids:
+                cursor.execute(
+                    f"SELECT Booking_ID, Total_Amount FROM Booking "
+                    f"WHERE Booking_ID IN ({', '.join(['%s'] * len(booking_ids))})",
+                    tuple(booking_ids)
+                )
+                totals = {row["Booking_ID"]: row["Total_Amount"] for row in cursor.fetchall()}
+
+            conn.commit()
+            return [outcome if isinstance(outcome, Exception)
+                    else {"Booking_ID": outcome, "Total_Amount": totals[outcome]}
+                    for outcome in outcomes]
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            if _is_outage(e):
+                current_shard().breaker.record_failure()
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            logger.error(f"Booking batch of {len(bookings)} failed: {str(e)}")
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn and conn.is_connected():
+                conn.close()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(property=None):
+    """The BookingQueue of a property (default: the current one), started on first use"""
+    property = property or current_shard().code
+    with _queues_lock:
+        if property not in _queues:
+            _queues[property] = BookingQueue(property)
+        return _queues[property]
+
+
+def submit(guest_id, room_id, check_in, check_out, payment_method="Pending", timeout=SUBMIT_TIMEOUT):
+    """Book through the current property's group-commit queue"""
+    return get_queue().submit(guest_id, room_id, check_in, check_out, payment_method, timeout)
@@ -0,0 +1,129 @@
+from db_utils import call_procedure, run_query, execute_transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_METHODS = ("Pending", "Credit Card", "Cash", "UPI")
+ROOM_TYPES = ("Standard", "Deluxe", "Suite")
+
+# SQLSTATE 45000 raised by prevent_overlapping_bookings arrives as MySQL error 1644
+OVERLAP_ERRNO = 1644
+
+
+class BookingConflict(Exception):
+    """Room is already booked for the requested dates"""
+
+
+def get_guest(guest_id):
+    rows = run_query(
+        "SELECT Guest_ID, Name, Email, Phone, Address FROM Guest WHERE Guest_ID = %s",
+        (guest_id,)
+    )
+    return rows[0] if rows else None
+
+
+def get_booking(booking_id):
+    """A booking by ID, archived stays included"""
+    rows = run_query(
+        """SELECT Booking_ID, Guest_ID, Room_ID, Check_In_Date, Check_Out_Date, Total_Amount, Payment_Method
+        FROM Booking_History WHERE Booking_ID = %s""",
+        (booking_id,)
+    )
+    return rows[0] if rows else None
+
+
+def find_guests(email=None, phone=None, limit=50):
+    """Look up guests by exact email or phone"""
+    conditions, params = [], []
+    if email:
+        conditions.append("Email = %s")
+        params.append(email)
+    if phone:
+        conditions.append("Phone = %s")
+        params.append(phone)
+    if not conditions:
+        return []
+
+    params.append(limit)
+    return run_query(
+        f"""SELECT Guest_ID, Name, Email, Phone, Address FROM Guest
+        WHERE {' OR '.join(conditions)} ORDER BY Guest_ID DESC LIMIT %s""",
+        tuple(params)
+    )
+
+
+def available_rooms(check_in, check_out, room_type=None):
+    """Rooms free for the whole stay, using the same overlap rule as the trigger"""
+    query = """
+        SELECT r.Room_ID, r.Room_Type, r.Price
+        FROM Room r
+        WHERE r.Status != 'Under Maintenance'
+        AND NOT EXISTS (
+            SELECT 1 FROM Booking b
+            WHERE b.Room_ID = r.Room_ID
+            AND b.Check_Out_Date >= %s
+            AND b.Check_In_Date <= %s
+        )
+    """
+    params = [check_in, check_out]
+    if room_type:
+        query += " AND r.Room_Type = %s"
+        params.append(room_type)
+    query += " ORDER BY r.Room_ID"
+    return run_query(query, tuple(params))
+
+
+def create_booking(guest_id, room_id, check_in, check_out, payment_method="Pending"):
+    """Insert a booking with the room row locked so concurrent requests can't both pass the overlap check"""
+    if payment_method not in PAYMENT_METHODS:
+        raise ValueError(f"Invalid payment method: {payment_method}")
+    if check_out <= check_in:
+        raise ValueError("Check-out must be after check-in")
+
+    try:
+        _, booking_id, booking = execute_transaction([
+            ("SELECT Room_ID FROM Room WHERE Room_ID = %s FOR UPDATE", (room_id,)),
+            ("""INSERT INTO Booking
+                (Guest_ID, Room_ID, Check_In_Date, Check_Out_Date, Payment_Method)
+                VALUES (%s, %s, %s, %s, %s)""",
+             (guest_id, room_id, check_in, check_out, payment_method)),
+            ("SELECT Total_Amount FROM Booking WHERE Booking_ID = LAST_INSERT_ID()", None),
+        ])
+    except Exception as e:
+        if getattr(e, "errno", None) == OVERLAP_ERRNO:
+            raise BookingConflict(str(e.msg)) from e
+        raise
+
+    return {"Booking_ID": booking_id, "Total_Amount": booking[0]["Total_Amount"]}
+
+
+def modify_booking(booking_id, room_id, check_in, check_out):
+    """Change a booking's dates and/or room in place (modify_booking procedure).
+
+    The overlap check skips the booking itself, the stay is repriced and keeps
+    its loyalty discount, and Booking_ID, payment and receipt history stay the
+    same. Returns the new and previous totals, or None if the booking does not exist.
+    """
+    if check_out <= check_in:
+        raise ValueError("Check-out must be after check-in")
+
+    try:
+        rows = call_procedure("modify_booking", (booking_id, room_id, check_in, check_out))
+    except Exception as e:
+        if getattr(e, "errno", None) == OVERLAP_ERRNO:
+            raise BookingConflict(str(e.msg)) from e
+        raise
+
+    if not rows:
+        return None
+    return {"Booking_ID": booking_id, "Room_ID": rows[0]["Room_ID"],
+            "Total_Amount": rows[0]["Total_Amount"], "Previous_Amount": rows[0]["Previous_Amount"]}
+
+
+def cancel_booking(booking_id):
+    """Delete a booking; returns False if it did not exist"""
+    rows = execute_transaction([
+        ("SELECT Booking_ID FROM Booking WHERE Booking_ID = %s FOR UPDATE", (booking_id,)),
+        ("DELETE FROM Booking WHERE Booking_ID = %s", (booking_id,)),
+    ])
+    return bool(rows[0])
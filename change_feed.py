@@ -0,0 +1,160 @@
+from db_utils import SHARDS, current_shard, read_from_primary, run_query, use_property
+from async_db_utils import run_queries_sync
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TRACKED_TABLES = ("Guest", "Booking", "Room", "Staff", "CRM")
+
+
+class ChangeFeed:
+    """Tails Change_Log by sequence number and invalidates cached reads per table.
+
+    The feed and its cached reads use the primary: a lagging replica could
+    refill the cache with rows older than the change that just invalidated it.
+    One feed follows one property's database (the current one by default).
+    """
+
+    def __init__(self, poll_interval=1.0, batch_size=1000, overlap=200, property=None):
+        self.property = property or current_shard().code
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.overlap = overlap
+        self._seen = set()
+        self.last_seq = None
+        self.versions = dict.fromkeys(TRACKED_TABLES, 0)
+        self._cache = {}
+        self._tags = {table: set() for table in TRACKED_TABLES}
+        self._lock = threading.RLock()
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listeners = []
+        self._thread = None
+
+    def start(self):
+        """Start the background watcher thread"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self.refresh()  # Pin the log head before anything gets cached
+        self._thread = threading.Thread(target=self._watch, name="change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Change feed poll failed: {str(e)}")
+            self._stop.wait(self.poll_interval)
+
+    def refresh(self):
+        """Read new Change_Log entries and invalidate the tables they touch"""
+        with self._poll_lock, use_property(self.property), read_from_primary():
+            if self.last_seq is None:
+                # Nothing is cached yet, so start from the current head of the log
+                head = run_query("SELECT COALESCE(MAX(Seq_ID), 0) AS Seq_ID FROM Change_Log")
+                self.last_seq = head[0]['Seq_ID']
+                return set()
+
+            # Concurrent transactions can commit sequence numbers out of order, so
+            # re-read a short window behind the cursor and skip entries already seen
+            changed = set()
+            entries = []
+            cursor = max(self.last_seq - self.overlap, 0)
+            while True:
+                rows = run_query(
+                    """SELECT Seq_ID, Table_Name, Row_ID, Operation FROM Change_Log
+                    WHERE Seq_ID > %s ORDER BY Seq_ID LIMIT %s""",
+                    (cursor, self.batch_size)
+                )
+                if not rows:
+                    break
+                cursor = rows[-1]['Seq_ID']
+                for row in rows:
+                    if row['Seq_ID'] not in self._seen:
+                        self._seen.add(row['Seq_ID'])
+                        changed.add(row['Table_Name'])
+                        entries.append(row)
+                if len(rows) < self.batch_size:
+                    break
+            self.last_seq = max(self.last_seq, cursor)
+            self._seen = {seq for seq in self._seen if seq > self.last_seq - self.overlap}
+
+            if changed:
+                self.invalidate(changed)
+            for listener in self._listeners if entries else ():
+                try:
+                    listener(entries)
+                except Exception as e:
+                    logger.warning(f"Change feed listener failed: {str(e)}")
+            return changed
+
+    def subscribe(self, listener):
+        """Call `listener(entries)` with each batch of new Change_Log rows"""
+        self._listeners.append(listener)
+
+    def invalidate(self, tables):
+        """Drop cached results that read any of the given tables"""
+        with self._lock:
+            for table in tables:
+                if table not in self.versions:
+                    continue
+                self.versions[table] += 1
+                for key in self._tags[table]:
+                    self._cache.pop(key, None)
+                self._tags[table].clear()
+
+    def query(self, query, params=None, tables=()):
+        """run_query() with results cached until one of `tables` changes"""
+        key = (query, tuple(params or ()))
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            before = self.snapshot(tables)
+
+        with use_property(self.property), read_from_primary():
+            rows = run_query(query, params)
+
+        with self._lock:
+            # Skip caching if a change landed while the query was running
+            if self.snapshot(tables) == before:
+                self._cache[key] = rows
+                for table in tables:
+                    self._tags[table].add(key)
+        return rows
+
+    def snapshot(self, tables=TRACKED_TABLES):
+        """Current per-table versions; a session compares these to know when to refresh"""
+        with self._lock:
+            return tuple(self.versions[table] for table in tables)
+
+    def prefetch(self, reads):
+        """Fill missing cache entries concurrently; `reads` is a list of (query, params, tables)"""
+        with self._lock:
+            missing = [
+                (query, params, tables) for query, params, tables in reads
+                if (query, tuple(params or ())) not in self._cache
+            ]
+            before = [self.snapshot(tables) for _, _, tables in missing]
+        if not missing or SHARDS[self.property].breaker.opened:
+            return  # With the circuit open, each read falls back to run_query's cached result
+
+        try:
+            with use_property(self.property):
+                results = run_queries_sync({i: (query, params) for i, (query, params, _) in enumerate(missing)})
+        except Exception as e:
+            logger.warning(f"Prefetch failed, reads will run one by one: {str(e)}")
+            return
+
+        with self._lock:
+            for i, (query, params, tables) in enumerate(missing):
+                if self.snapshot(tables) == before[i]:
+                    key = (query, tuple(params or ()))
+                    self._cache[key] = results[i]
+                    for table in tables:
+                        self._tags[table].add(key)
@@ -1,7 +1,15 @@
 import mysql.connector
+from mysql.connector import errors
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
+import contextvars
 import os
 import logging
+import random
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -9,44 +17,400 @@ logger = logging.getLogger(__name__)
 
 load_dotenv("config.env")
 
-def get_db():
-    try:
-        conn = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASS"),
-            database=os.getenv("DB_NAME"),
-            autocommit=False  # Explicit transaction control
+# --- Timeouts, retries and circuit breaker (all overridable in config.env) ---
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))            # seconds
+READ_TIMEOUT_MS = int(float(os.getenv("DB_READ_TIMEOUT", "10")) * 1000)  # SELECTs, via max_execution_time
+RETRIES = int(os.getenv("DB_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.1"))
+BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))        # consecutive failures to open
+BREAKER_RESET = float(os.getenv("DB_BREAKER_RESET", "30"))             # seconds before a probe is let through
+READ_CACHE_SIZE = int(os.getenv("DB_READ_CACHE_SIZE", "256"))
+
+# --- Read replicas: DB_REPLICAS=host[:port],host[:port] (same user, password and schema as DB_HOST) ---
+MAX_REPLICA_LAG = float(os.getenv("DB_MAX_REPLICA_LAG", "5"))               # seconds
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))  # seconds
+# After a write, this context reads from the primary for longer than any replica allowed to serve can lag
+STICKY_SECONDS = float(os.getenv("DB_STICKY_SECONDS", str(MAX_REPLICA_LAG + 1)))
+
+# --- Properties: each hotel's data lives in its own database (shard) ---
+# PROPERTIES=farn,lake with, per code, PROPERTY_FARN_NAME, PROPERTY_FARN_DB_NAME and optionally
+# PROPERTY_FARN_DB_HOST / PROPERTY_FARN_DB_REPLICAS (default to DB_HOST / none).
+# Without PROPERTIES there is one property, "main", on DB_HOST / DB_NAME / DB_REPLICAS.
+# PROPERTY picks the default for scripts and jobs.
+DEFAULT_HOTEL_NAME = "Farn Hotel & Resorts"
+
+# Can't connect, server gone, lost connection: count towards opening the circuit.
+# A query hitting max_execution_time (3024) is a slow query, not an outage.
+OUTAGE_ERRNOS = {2003, 2006, 2013, 2055}
+# Connection dropped mid-query: a read can simply be run again on a new connection
+RECONNECT_ERRNOS = {2006, 2013, 2055}
+# Lock wait timeout and deadlock: the statement was rolled back and is safe to retry
+RETRYABLE_TRANSACTION_ERRNOS = {1205, 1213}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of touching the database while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive transient failures; then lets one probe through per `reset_timeout`"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if not self.opened:
+                return True
+            now = time.monotonic()
+            if now >= self._retry_at:
+                self._retry_at = now + self.reset_timeout  # One probe per window
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened:
+                logger.info("Database circuit closed")
+            self.failures = 0
+            self.opened = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold and not self.opened:
+                self.opened = True
+                self._retry_at = time.monotonic() + self.reset_timeout
+                logger.error(f"Database circuit opened after {self.failures} failures")
+
+    @property
+    def state(self):
+        return "open" if self.opened else "closed"
+
+
+class ReplicaPool:
+    """Round-robins reads over replicas a background check found reachable and within MAX_REPLICA_LAG"""
+
+    def __init__(self, hosts, database=None):
+        self.hosts = hosts
+        self.database = database
+        self.healthy = []  # Nothing is trusted until the first check completes
+        self.lag = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.hosts:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="replica-check", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self.check()
+            time.sleep(REPLICA_CHECK_INTERVAL)
+
+    def check(self):
+        healthy = []
+        for host in self.hosts:
+            conn = None
+            try:
+                conn = _connect(host, self.database)
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                except errors.ProgrammingError:
+                    cursor.execute("SHOW SLAVE STATUS")  # Before MySQL 8.0.22
+                status = cursor.fetchone() or {}
+                cursor.close()
+                lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+            except Exception as e:
+                lag = None
+                logger.warning(f"Replica {host} check failed: {str(e)}")
+            finally:
+                if conn and conn.is_connected():
+                    conn.close()
+
+            self.lag[host] = lag
+            # NULL lag means replication is stopped or this is not a replica
+            if lag is not None and lag <= MAX_REPLICA_LAG:
+                healthy.append(host)
+        with self._lock:
+            if set(healthy) != set(self.healthy):
+                logger.info(f"Healthy replicas: {healthy or 'none (reads go to the primary)'}")
+            self.healthy = healthy
+
+    def pick(self):
+        self.start()
+        with self._lock:
+            if not self.healthy:
+                return None
+            self._next = (self._next + 1) % len(self.healthy)
+            return self.healthy[self._next]
+
+    def mark_down(self, host):
+        with self._lock:
+            if host in self.healthy:
+                self.healthy.remove(host)  # Until the next check brings it back
+
+
+class Shard:
+    """One property's database: where to connect, its replicas and its own circuit breaker"""
+
+    def __init__(self, code, name, host, database, replica_hosts=()):
+        self.code = code
+        self.name = name
+        self.host = host
+        self.database = database
+        self.breaker = CircuitBreaker()
+        self.replicas = ReplicaPool(list(replica_hosts), database)
+
+
+def _hosts(value):
+    return [h.strip() for h in (value or "").split(",") if h.strip()]
+
+
+def _load_shards():
+    codes = _hosts(os.getenv("PROPERTIES"))
+    if not codes:
+        return {"main": Shard("main", os.getenv("HOTEL_NAME", DEFAULT_HOTEL_NAME), os.getenv("DB_HOST"),
+                              os.getenv("DB_NAME"), _hosts(os.getenv("DB_REPLICAS")))}
+    shards = {}
+    for code in codes:
+        prefix = f"PROPERTY_{code.upper()}_"
+        shards[code] = Shard(
+            code,
+            os.getenv(prefix + "NAME", code),
+            os.getenv(prefix + "DB_HOST", os.getenv("DB_HOST")),
+            os.getenv(prefix + "DB_NAME", f"{os.getenv('DB_NAME')}_{code}"),
+            _hosts(os.getenv(prefix + "DB_REPLICAS"))
         )
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection failed: {str(e)}")
-        raise
+    return shards
+
+
+SHARDS = _load_shards()
+DEFAULT_PROPERTY = os.getenv("PROPERTY") or next(iter(SHARDS))
+_property = contextvars.ContextVar("property", default=None)
+_scatter_pool = None
+_scatter_pool_lock = threading.Lock()
+_primary_until = contextvars.ContextVar("primary_until", default=0.0)
+_actor = contextvars.ContextVar("actor", default=None)
+_read_cache = OrderedDict()
+_read_cache_lock = threading.Lock()
+
+
+def _is_outage(e):
+    return isinstance(e, errors.InterfaceError) or getattr(e, "errno", None) in OUTAGE_ERRNOS
+
+
+def _is_transient(e):
+    """Worth re-running a read: a dropped connection or lock conflict (get_db already retries connecting)"""
+    return getattr(e, "errno", None) in RECONNECT_ERRNOS | RETRYABLE_TRANSACTION_ERRNOS
+
+
+def _backoff(attempt):
+    """Full jitter: sleep a random time up to the exponential step"""
+    time.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _cache_read(key, rows):
+    with _read_cache_lock:
+        _read_cache[key] = rows
+        _read_cache.move_to_end(key)
+        while len(_read_cache) > READ_CACHE_SIZE:
+            _read_cache.popitem(last=False)
+
+
+def _cached_read(key):
+    with _read_cache_lock:
+        return _read_cache.get(key)
+
+
+def current_shard():
+    """The Shard this context is working against"""
+    return SHARDS[_property.get() or DEFAULT_PROPERTY]
+
+
+def set_property(code):
+    """Route this context's queries to a property (e.g. once per Streamlit run)"""
+    if code not in SHARDS:
+        raise ValueError(f"Unknown property: {code}")
+    _property.set(code)
+
+
+@contextmanager
+def use_property(code):
+    """Route queries in the block to a property"""
+    if code not in SHARDS:
+        raise ValueError(f"Unknown property: {code}")
+    token = _property.set(code)
+    try:
+        yield SHARDS[code]
+    finally:
+        _property.reset(token)
+
+
+def set_actor(name):
+    """Attribute this context's writes to a clerk or API caller (Changed_By in the audit trail)"""
+    _actor.set(name or None)
+
+
+def current_actor():
+    return _actor.get()
+
+
+@contextmanager
+def acting_as(name):
+    """Attribute writes in the block to `name`"""
+    token = _actor.set(name or None)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def mark_written():
+    """Read-your-writes: keep this context's reads on the primary for STICKY_SECONDS"""
+    if current_shard().replicas.hosts:
+        _primary_until.set(time.monotonic() + STICKY_SECONDS)
+
+
+@contextmanager
+def read_from_primary():
+    """Send every read in the block to the primary"""
+    token = _primary_until.set(float("inf"))
+    try:
+        yield
+    finally:
+        _primary_until.reset(token)
+
+
+def _connect(host, database, read_timeout_ms=READ_TIMEOUT_MS):
+    host, _, port = (host or "").partition(":")
+    conn = mysql.connector.connect(
+        host=host,
+        port=int(port or os.getenv("DB_PORT", 3306)),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        database=database,
+        connection_timeout=CONNECT_TIMEOUT,
+        autocommit=False  # Explicit transaction control
+    )
+    settings, values = [], []
+    if read_timeout_ms:
+        settings.append("SESSION max_execution_time = %s")
+        values.append(read_timeout_ms)
+    if _actor.get():
+        # Change_Log triggers record COALESCE(@audit_actor, USER()) as Changed_By
+        settings.append("@audit_actor = %s")
+        values.append(_actor.get())
+    if settings:
+        cursor = conn.cursor()
+        cursor.execute("SET " + ", ".join(settings), tuple(values))
+        cursor.close()
+    return conn
+
+
+def get_db(read_only=False, stream=False):
+    """Connection to the current property's primary, or to a healthy replica for
+    `read_only` use outside a sticky window. Interactive reads are capped at
+    DB_READ_TIMEOUT; `stream` connections (long report and batch scans) are not."""
+    shard = current_shard()
+    read_timeout_ms = 0 if stream else READ_TIMEOUT_MS
+    breaker, replicas = shard.breaker, shard.replicas
+    if read_only and replicas.hosts and time.monotonic() >= _primary_until.get():
+        host = replicas.pick()
+        if host:
+            try:
+                return _connect(host, shard.database, read_timeout_ms)
+            except Exception as e:
+                replicas.mark_down(host)
+                logger.warning(f"Replica {host} unavailable, reading from the primary: {str(e)}")
+
+    if not breaker.allow():
+        raise CircuitOpenError(f"Database for {shard.code} unavailable (circuit open)")
+
+    for attempt in range(RETRIES + 1):
+        try:
+            return _connect(shard.host, shard.database, read_timeout_ms)
+        except Exception as e:
+            if not _is_outage(e):
+                logger.error(f"Database connection failed: {str(e)}")
+                raise
+            breaker.record_failure()
+            if attempt == RETRIES or breaker.opened:
+                logger.error(f"Database connection failed: {str(e)}")
+                raise
+            _backoff(attempt)
 
 def run_query(query, params=None, fetch=True, conn=None):
-    """Enhanced with transaction support"""
+    """Enhanced with transaction support.
+
+    Reads on their own connection are retried on transient errors; if the
+    database stays unavailable, the last good result for the same query is
+    returned when one is cached.
+    """
+    shard = current_shard()
+    cache_key = (shard.code, query, repr(params)) if fetch and conn is None else None
+    attempt = 0
+    while True:
+        try:
+            result = _run_query(query, params, fetch, conn)
+            if conn is None:
+                shard.breaker.record_success()
+            if cache_key:
+                _cache_read(cache_key, result)
+            return result
+        except Exception as e:
+            if not (cache_key and (_is_outage(e) or _is_transient(e) or isinstance(e, CircuitOpenError))):
+                raise
+            if not _is_transient(e) or attempt >= RETRIES or shard.breaker.opened:
+                cached = _cached_read(cache_key)
+                if cached is None:
+                    raise
+                logger.warning(f"Serving cached result ({str(e)}): {query.strip()[:80]}")
+                return cached
+            attempt += 1
+            _backoff(attempt)
+
+def _run_query(query, params, fetch, conn):
     cursor = None
     close_conn = False
-    
+
     try:
         if not conn:
-            conn = get_db()
+            conn = get_db(read_only=fetch)
             close_conn = True
-            
+
         cursor = conn.cursor(dictionary=True)
         cursor.execute(query, params or ())
-        
+
         if fetch:
             result = cursor.fetchall()
         else:
             result = cursor.lastrowid  # Return last inserted ID for INSERTs
             conn.commit()  # Explicit commit for write operations
-            
+            mark_written()
+
         return result
-        
+
+    except CircuitOpenError:
+        raise
     except Exception as e:
+        if close_conn and _is_outage(e):
+            current_shard().breaker.record_failure()
         if conn:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except Exception:
+                pass  # Connection already gone
         logger.error(f"Query failed: {str(e)}\nQuery: {query}\nParams: {params}")
         raise
     finally:
@@ -56,12 +420,24 @@ def run_query(query, params=None, fetch=True, conn=None):
             conn.close()
 
 def execute_transaction(queries):
-    """Execute multiple queries as an atomic transaction"""
+    """Execute multiple queries as an atomic transaction (retried on deadlock or lock wait timeout)"""
+    for attempt in range(RETRIES + 1):
+        try:
+            results = _execute_transaction(queries)
+            current_shard().breaker.record_success()
+            return results
+        except Exception as e:
+            if getattr(e, "errno", None) not in RETRYABLE_TRANSACTION_ERRNOS or attempt == RETRIES:
+                raise
+            _backoff(attempt)
+
+def _execute_transaction(queries):
     conn = None
+    cursor = None
     try:
         conn = get_db()
         cursor = conn.cursor(dictionary=True)
-        
+
         results = []
         for query, params in queries:
             cursor.execute(query, params or ())
@@ -69,16 +445,88 @@ def execute_transaction(queries):
                 results.append(cursor.fetchall())
             else:
                 results.append(cursor.lastrowid)
-        
+
         conn.commit()
+        mark_written()
         return results
+    except CircuitOpenError:
+        raise
     except Exception as e:
+        if _is_outage(e):
+            current_shard().breaker.record_failure()
         if conn:
-            conn.rollback()
+            try:
+                conn.rollback()
+            except Exception:
+                pass
         logger.error(f"Transaction failed: {str(e)}")
         raise
     finally:
         if cursor:
             cursor.close()
         if conn and conn.is_connected():
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+def call_procedure(name, args=()):
+    """Call a stored procedure, commit, and return its last result set as dicts"""
+    conn = None
+    cursor = None
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.callproc(name, args)
+
+        rows = []
+        for result in cursor.stored_results():
+            rows = [dict(zip(result.column_names, row)) for row in result.fetchall()]
+        conn.commit()
+        mark_written()
+        current_shard().breaker.record_success()
+        return rows
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        if _is_outage(e):
+            current_shard().breaker.record_failure()
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        logger.error(f"Procedure {name} failed: {str(e)}\nArgs: {args}")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+def scatter_gather(query, params=None, properties=None):
+    """Run one read on every property's database in parallel.
+
+    Returns (rows, failed): rows carry a 'Property' key with the property code,
+    and failed lists properties whose shard could not answer, so callers can
+    show partial results.
+    """
+    global _scatter_pool
+    codes = list(properties or SHARDS)
+    with _scatter_pool_lock:
+        if _scatter_pool is None:
+            _scatter_pool = ThreadPoolExecutor(max_workers=max(len(SHARDS), 1), thread_name_prefix="scatter")
+    # Worker threads do not inherit this context, so carry the sticky-read window over
+    primary_until = _primary_until.get()
+
+    def run_on(code):
+        with use_property(code):
+            _primary_until.set(primary_until)
+            return [{**row, "Property": code} for row in run_query(query, params)]
+
+    futures = {code: _scatter_pool.submit(run_on, code) for code in codes}
+    rows, failed = [], []
+    for code, future in futures.items():
+        try:
+            rows.extend(future.result())
+        except Exception as e:
+            logger.warning(f"Property {code} skipped in scatter-gather: {str(e)}")
+            failed.append(code)
+    return rows, failed
@@ -0,0 +1,83 @@
+"""Load test for api.py: concurrent availability searches plus conflicting booking attempts.
+
+Usage: python dev_utils/api_load_test.py --url http://localhost:8000 --workers 32 --requests 2000
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import argparse
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+
+
+def call(method, url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def one_request(base_url, guest_id, room_ids, booking_ratio):
+    check_in = date.today() + timedelta(days=random.randint(1, 60))
+    check_out = check_in + timedelta(days=random.randint(1, 5))
+    if random.random() < booking_ratio:
+        return "book", *call("POST", f"{base_url}/bookings", {
+            "guest_id": guest_id,
+            "room_id": random.choice(room_ids),
+            "check_in": check_in.isoformat(),
+            "check_out": check_out.isoformat(),
+        })
+    return "search", *call("GET", f"{base_url}/availability?check_in={check_in}&check_out={check_out}")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000 if values else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--guest-id", type=int, default=1)
+    parser.add_argument("--rooms", default="1,2,3,4,5")
+    parser.add_argument("--booking-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+    room_ids = [int(r) for r in args.rooms.split(",")]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(
+            lambda _: one_request(args.url, args.guest_id, room_ids, args.booking_ratio),
+            range(args.requests)
+        ))
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(results)} requests in {elapsed:.2f}s -> {len(results) / elapsed:.1f} req/s")
+    for kind in ("search", "book"):
+        rows = [r for r in results if r[0] == kind]
+        if not rows:
+            continue
+        latencies = [r[2] for r in rows]
+        statuses = {}
+        for r in rows:
+            statuses[r[1]] = statuses.get(r[1], 0) + 1
+        print(f"{kind:>6}: n={len(rows)} p50={percentile(latencies, 50):.1f}ms "
+              f"p95={percentile(latencies, 95):.1f}ms p99={percentile(latencies, 99):.1f}ms "
+              f"statuses={statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""Load test for app.py: N concurrent front-desk sessions against one Streamlit server.
+
+Each session is a websocket client speaking the browser's protocol (Streamlit's
+BackMsg/ForwardMsg protobufs), so script runs, the shared change feed and the
+cached indexes behave as they do for real clerks. Sessions loop over weighted
+flows -- register a guest, book a room, cancel one of their bookings, browse
+(a plain rerun, e.g. the CRM tab) -- and every script run is timed from the
+rerun request to the server reporting the run finished. During each step
+MySQL's Threads_connected is sampled and the Connections counter diffed.
+
+The harness starts an SMTP sink and, unless --url is given, the app itself
+with SMTP_SERVER pointed at the sink. Point config.env at a scratch database:
+the flows write guests (@loadtest.invalid, removed with --cleanup) and bookings.
+
+Usage: PYTHONPATH=. python dev_utils/app_load_test.py --sessions 1,5,10,25 --duration 60 --rooms 1,2,3,4,5
+Needs: pip install websockets (installed with recent Streamlit); openssl on PATH for STARTTLS
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import argparse
+import json
+import os
+import random
+import re
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+import pyarrow as pa
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+from db_utils import execute_transaction, get_db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL_DOMAIN = "loadtest.invalid"
+FLOWS = {"register": 0.2, "book": 0.3, "cancel": 0.1, "browse": 0.4}
+WIDGET_KINDS = ("text_input", "text_area", "number_input", "date_input", "selectbox", "checkbox", "button")
+FIRST_NAMES = ["Aarav", "Diya", "Kabir", "Meera", "Rohan", "Ananya", "Vikram", "Isha", "Arjun", "Sara"]
+LAST_NAMES = ["Sharma", "Iyer", "Khan", "Das", "Patel", "Reddy", "Singh", "Nair", "Gupta", "Bose"]
+
+
+# --- SMTP stand-in ---
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Accepts any login and message; STARTTLS with a throwaway certificate when openssl is available"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _SmtpHandler)
+        self.received = 0
+        self.lock = threading.Lock()
+        self.tls = _self_signed_context()
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+        self.wfile.flush()
+
+    def handle(self):
+        self.reply("220 loadtest ESMTP")
+        while True:
+            line = self.rfile.readline().decode(errors="replace").strip()
+            if not line:
+                return
+            verb = line.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                extensions = ["loadtest", "AUTH PLAIN LOGIN"]  # First line is the greeting
+                if self.server.tls and not isinstance(self.request, ssl.SSLSocket):
+                    extensions.append("STARTTLS")
+                for ext in extensions:
+                    self.reply(f"250-{ext}")
+                self.reply("250 SIZE 10485760")
+            elif verb == "STARTTLS" and self.server.tls:
+                self.reply("220 Ready to start TLS")
+                self.request = self.server.tls.wrap_socket(self.request, server_side=True)
+                self.rfile = self.request.makefile("rb")
+                self.wfile = self.request.makefile("wb")
+            elif verb == "AUTH":
+                self.reply("235 Authenticated")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline().rstrip(b"\r\n") != b".":
+                    pass
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply("250 Queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            else:
+                self.reply("502 Not implemented")
+
+
+def _self_signed_context():
+    directory = tempfile.mkdtemp()
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        print("openssl not available: SMTP sink has no STARTTLS, so receipt emails will fail")
+        return None
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+# --- One browser session ---
+class Session:
+    """Drives app.py over the Streamlit websocket like a browser tab would"""
+
+    def __init__(self, url, timeout=60):
+        self.ws = connect(url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream",
+                          subprotocols=["streamlit"], max_size=None, open_timeout=timeout)
+        self.timeout = timeout
+        self.widgets = {}
+        self.tables = []
+        self.alerts = []
+        self.exceptions = []
+
+    def close(self):
+        self.ws.close()
+
+    def run(self, states=()):
+        """Request a script run with these widget states; returns seconds until it finished"""
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.widget_states.widgets.extend(states)
+        start = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv(timeout=self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                # st.rerun() starts over; only the last run's elements are on screen
+                self.widgets, self.tables, self.alerts, self.exceptions = {}, [], [], []
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._collect(forward.delta.new_element)
+            elif kind == "script_finished":
+                status = forward.script_finished
+                if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("app.py failed to compile")
+                if status == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    return time.perf_counter() - start
+
+    def _collect(self, element):
+        kind = element.WhichOneof("type")
+        if kind in WIDGET_KINDS:
+            proto = getattr(element, kind)
+            self.widgets[(proto.form_id, proto.label)] = proto.id
+        elif kind == "dataframe" and element.dataframe.id:
+            self.tables.append((element.dataframe.id, element.dataframe.arrow_data.data))
+        elif kind == "alert":
+            self.alerts.append(element.alert.body)
+        elif kind == "exception":
+            self.exceptions.append(element.exception.message)
+
+    def widget(self, label, form=""):
+        try:
+            return self.widgets[(form, label)]
+        except KeyError:
+            raise KeyError(f"No widget {label!r} in form {form!r} on screen") from None
+
+    def editor(self, column):
+        """(widget id, Arrow table) of the data editor that has `column`"""
+        for widget_id, data in self.tables:
+            table = pa.ipc.open_stream(data).read_all()
+            if column in table.column_names:
+                return widget_id, table
+        return None, None
+
+
+def _state(widget_id, value):
+    state = WidgetState(id=widget_id)
+    if value is True:
+        state.trigger_value = True
+    elif isinstance(value, str):
+        state.string_value = value
+    elif isinstance(value, (int, float)):
+        state.double_value = value
+    elif isinstance(value, date):
+        state.string_array_value.data.append(value.strftime("%Y/%m/%d"))
+    else:
+        raise TypeError(f"Unsupported widget value: {value!r}")
+    return state
+
+
+# --- Flows: each returns (script run seconds, outcome) ---
+def register(session, ctx):
+    name = f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}"
+    email = f"{uuid.uuid4().hex}@{EMAIL_DOMAIN}"
+    phone = str(random.randint(6_000_000_000, 9_999_999_999))
+    form = "guest_form"
+    elapsed = session.run([
+        _state(session.widget("Full Name*", form), name),
+        _state(session.widget("Email*", form), email),
+        _state(session.widget("Phone*", form), phone),
+        _state(session.widget("Register Guest", form), True),
+    ])
+    if ("", "Register Anyway") in session.widgets:
+        elapsed += session.run([_state(session.widget("Register Anyway"), True)])
+    _, guests = session.editor("Guest_ID")
+    if guests is not None:
+        for guest_id, guest_email in zip(guests.column("Guest_ID").to_pylist(), guests.column("Email").to_pylist()):
+            if guest_email == email:
+                ctx["guests"].append(guest_id)
+                return elapsed, "registered"
+    return elapsed, "not_visible"
+
+
+def book(session, ctx, rooms):
+    if not ctx["guests"]:
+        return register(session, ctx)
+    check_in = date.today() + timedelta(days=random.randint(1, 90))
+    check_out = check_in + timedelta(days=random.randint(1, 3))
+    form = "booking_form"
+    elapsed = session.run([
+        _state(session.widget("Guest ID*", form), random.choice(ctx["guests"])),
+        _state(session.widget("Room ID*", form), random.choice(rooms)),
+        _state(session.widget("Check-In Date*", form), check_in),
+        _state(session.widget("Check-Out Date*", form), check_out),
+        _state(session.widget("Confirm Booking", form), True),
+    ])
+    for body in session.alerts:
+        match = re.search(r"Booking #(\d+) Confirmed", body)
+        if match:
+            ctx["bookings"].append(int(match.group(1)))
+            return elapsed, "booked"
+    return elapsed, "conflict" if any("Booking failed" in body for body in session.alerts) else "failed"
+
+
+def cancel(session, ctx):
+    if not ctx["bookings"]:
+        return browse(session, ctx)
+    booking_id = ctx["bookings"].pop(random.randrange(len(ctx["bookings"])))
+    editor_id, bookings = session.editor("Booking_ID")
+    ids = bookings.column("Booking_ID").to_pylist() if bookings is not None else []
+    if booking_id not in ids:
+        return session.run(), "not_visible"
+    edits = {"edited_rows": {str(ids.index(booking_id)): {"Select": True}}, "added_rows": [], "deleted_rows": []}
+    elapsed = session.run([
+        _state(editor_id, json.dumps(edits)),
+        _state(session.widget("Cancel Selected Bookings"), True),
+    ])
+    return elapsed, "cancelled"
+
+
+def browse(session, ctx):
+    return session.run(), "ok"
+
+
+def run_session(url, deadline, rooms, think):
+    """One clerk: connect, then run weighted flows until the deadline"""
+    results = []
+    ctx = {"guests": [], "bookings": []}
+    try:
+        session = Session(url)
+    except Exception as e:
+        return [("connect", 0.0, f"error: {type(e).__name__}")]
+    try:
+        results.append(("load", session.run(), "ok"))
+        while time.monotonic() < deadline:
+            flow = random.choices(list(FLOWS), weights=list(FLOWS.values()))[0]
+            try:
+                if flow == "book":
+                    elapsed, outcome = book(session, ctx, rooms)
+                else:
+                    elapsed, outcome = globals()[flow](session, ctx)
+                if session.exceptions:
+                    outcome = f"exception: {session.exceptions[0][:60]}"
+            except Exception as e:
+                elapsed, outcome = 0.0, f"error: {type(e).__name__}: {str(e)[:60]}"
+            results.append((flow, elapsed, outcome))
+            time.sleep(random.uniform(0, 2 * think))
+    finally:
+        session.close()
+    return results
+
+
+# --- Measurements ---
+class ConnectionSampler:
+    """Peak Threads_connected and connections opened, from MySQL's global status"""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._conn = get_db()
+
+    def _status(self):
+        cursor = self._conn.cursor()
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_connected', 'Connections')")
+        status = {name: int(value) for name, value in cursor.fetchall()}
+        cursor.close()
+        return status
+
+    def __enter__(self):
+        self.opened_before = self._status()["Connections"]
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._status()["Threads_connected"] - 1)  # Not counting this one
+            self._stop.wait(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.opened = self._status()["Connections"] - self.opened_before
+        self._conn.close()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000 if values else 0
+
+
+def report(sessions, results, elapsed, sampler, emails):
+    runs = [r for r in results if r[1]]
+    errors = [r for r in results if r[2].startswith(("error", "exception"))]
+    print(f"\n{sessions} sessions: {len(runs)} script runs in {elapsed:.1f}s -> {len(runs) / elapsed:.1f} runs/s, "
+          f"{len(errors)} errors, DB connections peak={sampler.peak} opened={sampler.opened}, emails={emails}")
+    for flow in ("load", *FLOWS, "all"):
+        rows = runs if flow == "all" else [r for r in runs if r[0] == flow]
+        if not rows:
+            continue
+        outcomes = {}
+        for r in rows:
+            outcomes[r[2]] = outcomes.get(r[2], 0) + 1
+        latencies = [r[1] for r in rows]
+        print(f"{flow:>9}: n={len(rows)} p50={percentile(latencies, 50):.0f}ms "
+              f"p95={percentile(latencies, 95):.0f}ms p99={percentile(latencies, 99):.0f}ms"
+              + (f" {outcomes}" if flow != "all" else ""))
+    for r in errors[:5]:
+        print(f"   {r[0]}: {r[2]}")
+
+
+def start_app(port, smtp_port):
+    env = {**os.environ, "SMTP_SERVER": "127.0.0.1", "SMTP_PORT": str(smtp_port),
+           "EMAIL_ADDRESS": os.getenv("EMAIL_ADDRESS") or f"frontdesk@{EMAIL_DOMAIN}",
+           "EMAIL_PASSWORD": "loadtest"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "app.py", "--global.developmentMode", "false",
+         "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://localhost:{port}"
+    for _ in range(120):
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1):
+                return proc, url
+        except Exception:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("Streamlit server did not start")
+
+
+def cleanup():
+    """Delete load-test guests and every row that references them (fk_guest, fk_archive_guest, fk_crm_guest)"""
+    pattern = (f"%@{EMAIL_DOMAIN}",)
+    execute_transaction([
+        ("DELETE a FROM Booking_Archive a JOIN Guest g ON g.Guest_ID = a.Guest_ID WHERE g.Email LIKE %s", pattern),
+        ("DELETE b FROM Booking b JOIN Guest g ON g.Guest_ID = b.Guest_ID WHERE g.Email LIKE %s", pattern),
+        ("DELETE c FROM CRM c JOIN Guest g ON g.Guest_ID = c.Guest_ID WHERE g.Email LIKE %s", pattern),
+        ("DELETE FROM Guest WHERE Email LIKE %s", pattern),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="A running app (its SMTP settings are used); default: start one")
+    parser.add_argument("--port", type=int, default=8599, help="Port for the started app")
+    parser.add_argument("--sessions", default="1,5,10,25", help="Concurrent sessions per step")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per step")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean seconds between a clerk's actions")
+    parser.add_argument("--rooms", default="1,2,3,4,5")
+    parser.add_argument("--cleanup", action="store_true", help="Delete load-test guests and bookings afterwards")
+    args = parser.parse_args()
+    rooms = [int(r) for r in args.rooms.split(",")]
+
+    sink = SmtpSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    proc, url = (None, args.url) if args.url else start_app(args.port, sink.server_address[1])
+    try:
+        for sessions in (int(n) for n in args.sessions.split(",")):
+            emails_before = sink.received
+            start = time.perf_counter()
+            deadline = time.monotonic() + args.duration
+            with ConnectionSampler() as sampler, ThreadPoolExecutor(max_workers=sessions) as pool:
+                futures = [pool.submit(run_session, url, deadline, rooms, args.think) for _ in range(sessions)]
+                results = [r for f in futures for r in f.result()]
+            report(sessions, results, time.perf_counter() - start, sampler, sink.received - emails_before)
+    finally:
+        if proc:
+            proc.terminate()
+        sink.shutdown()
+        if args.cleanup:
+            cleanup()
+
+
+if __name__ == "__main__":
+    main()
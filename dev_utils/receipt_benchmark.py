@@ -0,0 +1,59 @@
+"""Per-receipt CPU time and allocations: precompiled template vs. building each PDF with FPDF.
+
+Usage: python dev_utils/receipt_benchmark.py [n]
+"""
+from datetime import date
+from fpdf import FPDF
+import sys
+import time
+import tracemalloc
+
+from receipts import draw_receipt, pdf_bytes, receipt_template
+
+BOOKING = {
+    'Booking_ID': 10452,
+    'Name': "Ananya Sharma",
+    'Email': "ananya@example.com",
+    'Room_Type': "Deluxe",
+    'Check_In_Date': date(2026, 9, 12),
+    'Check_Out_Date': date(2026, 9, 15),
+    'Total_Amount': "10500.00",
+}
+
+
+def fpdf_receipt(booking):
+    """The pre-template path: new FPDF document per receipt"""
+    pdf = FPDF()
+    draw_receipt(pdf, booking)
+    return pdf_bytes(pdf)
+
+
+def measure(name, render, n):
+    render(BOOKING)  # Warm up
+
+    start = time.process_time()
+    for _ in range(n):
+        render(BOOKING)
+    cpu = (time.process_time() - start) / n
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(min(n, 200)):
+        render(BOOKING)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    allocs = sum(s.count_diff for s in stats if s.count_diff > 0)
+
+    size = len(render(BOOKING))
+    print(f"{name:>10}: {cpu * 1e6:8.1f} µs CPU/receipt  {1 / cpu:8.0f} receipts/s  "
+          f"peak {peak / 1024:7.1f} KiB  retained blocks {allocs:5d}  {size} bytes")
+    return cpu
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    base = measure("fpdf", fpdf_receipt, n)
+    fast = measure("template", receipt_template().render, n)
+    print(f"speedup: {base / fast:.1f}x")
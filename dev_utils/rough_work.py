@@ -168,6 +168,8 @@ if __name__ == "__main__":
 
 import streamlit as st
 from db_utils import run_query
+from async_db_utils import run_queries_sync
+from analytics import extracted_at, occupancy, performance_metrics, revenue_by_room_type, top_guests
 import pandas as pd
 from fpdf import FPDF
 import smtplib
@@ -549,25 +551,32 @@ def main():
         st.markdown("---")
         st.subheader("Current Hotel Status")
         
-        # Metrics
+        # Metrics (the four counts are independent, so fetch them concurrently)
+        status = run_queries_sync({
+            'occupied': ("SELECT COUNT(*) FROM Booking WHERE Check_Out_Date > CURDATE()", None),
+            'total_rooms': ("SELECT COUNT(*) FROM Room", None),
+            'arrivals': ("""
+                SELECT COUNT(*) FROM Booking 
+                WHERE Check_In_Date = CURDATE()
+            """, None),
+            'departures': ("""
+                SELECT COUNT(*) FROM Booking 
+                WHERE Check_Out_Date = CURDATE()
+            """, None),
+        })
+        occupied, total_rooms, arrivals, departures = (
+            status[name][0]['COUNT(*)']
+            for name in ('occupied', 'total_rooms', 'arrivals', 'departures')
+        )
+
         col1, col2, col3 = st.columns(3)
         with col1:
-            occupied = run_query("SELECT COUNT(*) FROM Booking WHERE Check_Out_Date > CURDATE()")[0]['COUNT(*)']
-            total_rooms = run_query("SELECT COUNT(*) FROM Room")[0]['COUNT(*)']
             st.metric("Occupancy", f"{occupied}/{total_rooms} Rooms", delta=f"{round(occupied/total_rooms*100)}%")
         
         with col2:
-            arrivals = run_query("""
-                SELECT COUNT(*) FROM Booking 
-                WHERE Check_In_Date = CURDATE()
-            """)[0]['COUNT(*)']
             st.metric("Today's Arrivals", arrivals)
         
         with col3:
-            departures = run_query("""
-                SELECT COUNT(*) FROM Booking 
-                WHERE Check_Out_Date = CURDATE()
-            """)[0]['COUNT(*)']
             st.metric("Today's Departures", departures)
         
         # Room Availability
@@ -693,18 +702,16 @@ def main():
         with col2:
             end_date = st.date_input("To Date", datetime.now().date())
         
+        # Reports read the Parquet extract (python analytics.py extract), never MySQL
+        as_of = extracted_at()
+        if as_of is None:
+            st.warning("No analytics extract yet: run `python analytics.py extract`")
+            return
+        st.caption(f"Data as of {as_of:%Y-%m-%d %H:%M}")
+
         # Key Metrics
         st.subheader("Performance Metrics")
-        metrics = run_query("""
-            SELECT 
-                COUNT(*) AS total_bookings,
-                SUM(Total_Amount) AS total_revenue,
-                AVG(Total_Amount) AS avg_booking_value,
-                COUNT(DISTINCT Guest_ID) AS unique_guests
-            FROM Booking
-            WHERE Check_In_Date BETWEEN %s AND %s
-            AND Payment_Method != 'Pending'
-        """, (start_date, end_date))
+        metrics = performance_metrics(start_date, end_date)
         
         if metrics and metrics[0]['total_bookings'] > 0:
             m = metrics[0]
@@ -722,19 +729,7 @@ def main():
         
         # Revenue by Room Type
         st.subheader("Revenue by Room Type")
-        revenue_data = run_query("""
-            SELECT 
-                r.Room_Type,
-                COUNT(b.Booking_ID) AS bookings,
-                SUM(b.Total_Amount) AS revenue,
-                AVG(b.Total_Amount) AS avg_revenue
-            FROM Booking b
-            JOIN Room r ON b.Room_ID = r.Room_ID
-            WHERE b.Check_In_Date BETWEEN %s AND %s
-            AND b.Payment_Method != 'Pending'
-            GROUP BY r.Room_Type
-            ORDER BY revenue DESC
-        """, (start_date, end_date))
+        revenue_data = revenue_by_room_type(start_date, end_date)
         
         if revenue_data:
             st.bar_chart(
@@ -743,29 +738,23 @@ def main():
             )
         else:
             st.info("No revenue data available")
+
+        # Occupancy
+        st.subheader("Nightly Occupancy")
+        nights = occupancy(start_date, end_date)
+        if nights:
+            st.line_chart(
+                pd.DataFrame(nights).set_index('Night')['occupancy_rate'],
+                use_container_width=True
+            )
         
         # Guest Loyalty Report
         st.subheader("Top Guests by Visits")
-        top_guests = run_query("""
-            SELECT 
-                g.Guest_ID,
-                g.Name,
-                g.Email,
-                COUNT(b.Booking_ID) AS visits,
-                SUM(b.Total_Amount) AS total_spend,
-                c.Loyalty_Points
-            FROM Booking b
-            JOIN Guest g ON b.Guest_ID = g.Guest_ID
-            JOIN CRM c ON g.Guest_ID = c.Guest_ID
-            WHERE b.Check_In_Date BETWEEN %s AND %s
-            GROUP BY g.Guest_ID
-            ORDER BY visits DESC, total_spend DESC
-            LIMIT 10
-        """, (start_date, end_date))
+        top = top_guests(start_date, end_date)
         
-        if top_guests:
+        if top:
             st.dataframe(
-                pd.DataFrame(top_guests).style.background_gradient(
+                pd.DataFrame(top).style.background_gradient(
                     subset=['visits', 'total_spend'], 
                     cmap='Blues'
                 ),
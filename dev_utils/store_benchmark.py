@@ -0,0 +1,98 @@
+"""Memory and filter time: Room/Booking rows as dicts (run_query's shape) vs. RoomStore arrays.
+
+Usage: python dev_utils/store_benchmark.py [rooms] [bookings]
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from booking_service import PAYMENT_METHODS, ROOM_TYPES
+from room_store import ROOM_STATUSES, RoomStore
+
+
+def dict_rows(n_rooms, n_bookings):
+    """Synthetic rows with fresh str/Decimal/date objects per row, as the connector builds them"""
+    rng = random.Random(7)
+    today = date.today()
+    rooms = [{
+        'Room_ID': i,
+        'Room_Type': "".join(rng.choice(ROOM_TYPES)),
+        'Price': Decimal(f"{rng.randrange(1500, 9000)}.00"),
+        'Status': "".join(rng.choice(ROOM_STATUSES)),
+    } for i in range(1, n_rooms + 1)]
+    bookings = []
+    for i in range(1, n_bookings + 1):
+        check_in = today + timedelta(days=rng.randrange(-3, 180))
+        bookings.append({
+            'Booking_ID': i,
+            'Guest_ID': rng.randrange(1, n_bookings),
+            'Name': f"Guest {i}",
+            'Room_ID': rng.randrange(1, n_rooms + 1),
+            'Check_In_Date': check_in,
+            'Check_Out_Date': check_in + timedelta(days=rng.randrange(1, 8)),
+            'Total_Amount': Decimal(f"{rng.randrange(1500, 60000)}.00"),
+            'Payment_Method': "".join(rng.choice(PAYMENT_METHODS)),
+        })
+    return rooms, bookings
+
+
+def allocated(build):
+    """(result, bytes still allocated after building it)"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+# Both sides end in the DataFrame the app renders
+def dict_available(rooms, bookings):
+    today = date.today()
+    busy = {b['Room_ID'] for b in bookings if b['Check_Out_Date'] > today}
+    return pd.DataFrame([r for r in rooms if r['Status'] == 'Available' and r['Room_ID'] not in busy])
+
+
+def dict_active(rooms, bookings):
+    today = date.today()
+    types = {r['Room_ID']: r['Room_Type'] for r in rooms}
+    active = [{**b, 'Room_Type': types[b['Room_ID']]} for b in bookings if b['Check_Out_Date'] > today]
+    return pd.DataFrame(sorted(active, key=lambda b: b['Check_In_Date']))
+
+
+def timed(fn, repeat=20):
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    n_rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n_bookings = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    (rooms, bookings), dict_bytes = allocated(lambda: dict_rows(n_rooms, n_bookings))
+    def build_store():
+        store = RoomStore()
+        store.load(rooms, bookings)
+        return store
+
+    store, store_bytes = allocated(build_store)
+    rows = n_rooms + n_bookings
+    print(f"{n_rooms} rooms, {n_bookings} bookings")
+    print(f"  dict rows: {dict_bytes / 2**20:8.2f} MiB  ({dict_bytes / rows:6.1f} bytes/row)")
+    print(f"  RoomStore: {store_bytes / 2**20:8.2f} MiB  ({store_bytes / rows:6.1f} bytes/row, "
+          f"arrays {store.nbytes() / 2**20:.2f} MiB + guest names)")
+    print(f"  memory: {dict_bytes / store_bytes:.1f}x smaller")
+
+    for name, dict_fn, store_fn in [
+        ("available rooms", lambda: dict_available(rooms, bookings), store.available_rooms),
+        ("active bookings", lambda: dict_active(rooms, bookings), store.active_bookings),
+    ]:
+        slow, fast = timed(dict_fn), timed(store_fn)
+        print(f"  {name:>15}: dicts {slow * 1e3:7.2f} ms  RoomStore {fast * 1e3:7.2f} ms  ({slow / fast:.1f}x)")
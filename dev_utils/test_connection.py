@@ -1,4 +1,4 @@
-from db_utils import get_db
+from db_utils import SHARDS, get_db, use_property
 
 def test_connection():
     try:
@@ -29,5 +29,22 @@ def test_connection():
             conn.close()
             print("\n🔌 Connection closed.")
 
+def test_replicas():
+    """Lag and health of each property's replicas, as read routing sees them"""
+    for shard in SHARDS.values():
+        replicas = shard.replicas
+        if not replicas.hosts:
+            print(f"\n{shard.name}: no replicas configured; all reads go to the primary.")
+            continue
+        replicas.check()
+        print(f"\n{shard.name} replicas:")
+        for host in replicas.hosts:
+            lag = replicas.lag.get(host)
+            state = "serving reads" if host in replicas.healthy else "skipped"
+            print(f"- {host}: lag {'unknown' if lag is None else f'{lag}s'} ({state})")
+
 if __name__ == "__main__":
-    test_connection()
\ No newline at end of file
+    for code in SHARDS:
+        with use_property(code):
+            test_connection()
+    test_replicas()
\ No newline at end of file
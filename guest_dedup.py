@@ -0,0 +1,316 @@
+"""Duplicate-guest detection.
+
+Guests are grouped under blocking keys -- phone, normalized name, normalized
+email local part, and email domain plus a prefix of the local part -- so only
+guests sharing a key are ever compared. Pairs are then scored with a weighted fuzzy
+match of name, phone and email. GuestMatcher keeps the keys in memory (patched
+from the change feed) for checks at registration; find_duplicates() scans the
+whole table, comparing within blocks and, for oversized blocks, only within a
+sliding window of the block sorted by name, so the scan stays near-linear.
+
+Usage: python guest_dedup.py [--threshold 0.65]
+"""
+from db_utils import read_from_primary, run_query, execute_transaction
+from collections import Counter
+from difflib import SequenceMatcher
+import argparse
+import logging
+import re
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+NAME_WEIGHT, PHONE_WEIGHT, EMAIL_WEIGHT = 0.4, 0.3, 0.3
+NAME_CUTOFF = 0.8    # Names less similar than this never match
+EMAIL_CUTOFF = 0.9   # Only near-identical emails (typos) count
+LIKELY_DUPLICATE = 0.65
+MAX_BLOCK = 50      # Larger blocks are compared within a sorted window only
+WINDOW = 10
+TITLES = {"mr", "mrs", "ms", "miss", "dr", "shri", "smt"}
+
+
+def name_tokens(name):
+    """Lowercase ASCII tokens without titles"""
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode().lower()
+    return [t for t in re.findall(r"[a-z]+", text) if t not in TITLES]
+
+
+def normalize_name(name):
+    """Name tokens sorted so word order does not matter"""
+    return " ".join(sorted(name_tokens(name)))
+
+
+def normalize_email(email):
+    """(local part without dots or +tags, domain)"""
+    local, _, domain = (email or "").strip().lower().partition("@")
+    return local.split("+", 1)[0].replace(".", ""), domain
+
+
+def normalize_phone(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] if len(digits) >= 10 else ""
+
+
+def _record(guest_id, name, email, phone):
+    local, domain = normalize_email(email)
+    tokens = name_tokens(name)
+    name_key = " ".join(sorted(tokens))
+    return {
+        "Guest_ID": guest_id, "Name": name, "Email": email, "Phone": phone,
+        "name_text": " ".join(tokens), "name_key": name_key, "name_chars": Counter(name_key),
+        "local": local, "domain": domain,
+        "phone_key": normalize_phone(phone)
+    }
+
+
+def blocking_keys(record):
+    keys = set()
+    if record["phone_key"]:
+        keys.add("p:" + record["phone_key"])
+    if record["name_key"]:
+        keys.add("n:" + record["name_key"])
+    if len(record["local"]) >= 4:
+        keys.add("e:" + record["local"])
+    if record["domain"] and len(record["local"]) >= 4:
+        # Same domain and local prefix catches typos later in the address
+        keys.add(f"d:{record['domain']}|{record['local'][:6]}")
+    return keys
+
+
+def _similarity(a, b, cutoff):
+    """difflib ratio, or 0 below cutoff (cheap upper bounds reject most pairs first)"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b)
+    if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+        return 0.0
+    ratio = matcher.ratio()
+    return ratio if ratio >= cutoff else 0.0
+
+
+def match_score(a, b):
+    """Weighted 0-1 likelihood that two guest records are the same person"""
+    # Shared-character bound on the name ratio, much cheaper than building a SequenceMatcher
+    total = len(a["name_key"]) + len(b["name_key"])
+    if not total or 2 * sum((a["name_chars"] & b["name_chars"]).values()) < NAME_CUTOFF * total:
+        return 0.0
+    # Sorted tokens forgive word order; as written forgives a typo that changes the sort
+    name = (_similarity(a["name_key"], b["name_key"], NAME_CUTOFF)
+            or _similarity(a["name_text"], b["name_text"], NAME_CUTOFF))
+    if not name:
+        return 0.0  # Shared phone or email alone (e.g. family members) is not a duplicate
+    phone = 1.0 if a["phone_key"] and a["phone_key"] == b["phone_key"] else 0.0
+    if a["local"] and a["local"] == b["local"]:
+        email = 1.0
+    else:
+        email = _similarity(f"{a['local']}@{a['domain']}", f"{b['local']}@{b['domain']}", EMAIL_CUTOFF)
+    return NAME_WEIGHT * name + PHONE_WEIGHT * phone + EMAIL_WEIGHT * email
+
+
+class GuestMatcher:
+    """In-memory blocking index over the Guest table.
+
+    Starts empty: subscribe apply_changes to the change feed, then rebuild(), so
+    no write lands between the initial load and the first patch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()         # Guards the records and blocks readers take
+        self._build_lock = threading.Lock()   # Serializes rebuilds and patches
+        self._loaded = False
+        self._stale = False                   # A patch was lost; reload before the next read
+        self._records = {}
+        self._blocks = {}
+
+    def rebuild(self):
+        with self._build_lock:
+            with read_from_primary():  # Change feed patches only cover later writes
+                rows = run_query("SELECT Guest_ID, Name, Email, Phone FROM Guest")
+            with self._lock:
+                self._records = {}
+                self._blocks = {}
+                for row in rows:
+                    self._add(_record(row['Guest_ID'], row['Name'], row['Email'], row['Phone']))
+                self._loaded = True
+                self._stale = False
+        logger.info(f"Guest matcher built: {len(rows)} guests")
+
+    def _ensure_current(self):
+        if self._stale or not self._loaded:
+            self.rebuild()
+
+    def _add(self, record):
+        self._records[record["Guest_ID"]] = record
+        for key in blocking_keys(record):
+            self._blocks.setdefault(key, set()).add(record["Guest_ID"])
+
+    def _remove(self, guest_id):
+        record = self._records.pop(guest_id, None)
+        if record:
+            for key in blocking_keys(record):
+                members = self._blocks.get(key)
+                if members:
+                    members.discard(guest_id)
+                    if not members:
+                        del self._blocks[key]
+
+    def candidates(self, name, email, phone, threshold=LIKELY_DUPLICATE, limit=5):
+        """Existing guests that probably match a new registration, best first"""
+        probe = _record(None, name, email, phone)
+        self._ensure_current()
+        with self._lock:
+            ids = set()
+            for key in blocking_keys(probe):
+                ids |= self._blocks.get(key, set())
+            scored = [(match_score(probe, self._records[i]), self._records[i]) for i in ids]
+        matches = sorted((pair for pair in scored if pair[0] >= threshold), key=lambda pair: -pair[0])
+        return [
+            {"Guest_ID": r["Guest_ID"], "Name": r["Name"], "Email": r["Email"], "Phone": r["Phone"],
+             "Score": round(s, 2)}
+            for s, r in matches[:limit]
+        ]
+
+    def apply_changes(self, entries):
+        """ChangeFeed listener: re-read changed guests, or rebuild the index if that fails"""
+        with self._build_lock:
+            if not self._loaded:
+                return  # Not loaded yet; the initial rebuild reads these writes
+            try:
+                self._patch(entries)
+                return
+            except Exception as e:
+                logger.warning(f"Guest matcher patch failed, rebuilding: {str(e)}")
+                self._stale = True
+        self.rebuild()  # If this fails too, the next read retries it
+
+    def _patch(self, entries):
+        """Re-read inserted, updated or deleted guests (caller holds the build lock)"""
+        ids = list({e['Row_ID'] for e in entries if e['Table_Name'] == 'Guest'})
+        if not ids:
+            return
+        rows = run_query(
+            f"SELECT Guest_ID, Name, Email, Phone FROM Guest WHERE Guest_ID IN ({', '.join(['%s'] * len(ids))})",
+            tuple(ids)
+        )
+        with self._lock:
+            for guest_id in ids:
+                self._remove(guest_id)
+            for row in rows:
+                self._add(_record(row['Guest_ID'], row['Name'], row['Email'], row['Phone']))
+
+    def records(self):
+        self._ensure_current()
+        with self._lock:
+            return list(self._records.values())
+
+
+def candidate_pairs(records):
+    """Guest_ID pairs sharing a block (windowed within oversized blocks)"""
+    by_id = {r["Guest_ID"]: r for r in records}
+    blocks = {}
+    for record in records:
+        for key in blocking_keys(record):
+            blocks.setdefault(key, []).append(record["Guest_ID"])
+
+    pairs = set()
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) <= MAX_BLOCK:
+            pairs.update(
+                (a, b) if a < b else (b, a)
+                for i, a in enumerate(members) for b in members[i + 1:]
+            )
+        else:
+            members = sorted(members, key=lambda i: by_id[i]["name_key"])
+            for i, a in enumerate(members):
+                for b in members[i + 1:i + 1 + WINDOW]:
+                    pairs.add((a, b) if a < b else (b, a))
+    return pairs
+
+
+def find_duplicates(records=None, threshold=LIKELY_DUPLICATE):
+    """Propose merges: one row per duplicate, pointing at the guest to keep.
+
+    Likely pairs are clustered transitively; in each cluster the guest with the
+    most stays (then the oldest Guest_ID) is kept.
+    """
+    if records is None:
+        records = [_record(r['Guest_ID'], r['Name'], r['Email'], r['Phone'])
+                   for r in run_query("SELECT Guest_ID, Name, Email, Phone FROM Guest")]
+    by_id = {r["Guest_ID"]: r for r in records}
+
+    parent = {}
+
+    def find(i):
+        while parent.get(i, i) != i:
+            parent[i] = parent.get(parent[i], parent[i])
+            i = parent[i]
+        return i
+
+    best = {}
+    for a, b in candidate_pairs(records):
+        s = match_score(by_id[a], by_id[b])
+        if s >= threshold:
+            parent[find(a)] = find(b)
+            best[a] = max(best.get(a, 0), s)
+            best[b] = max(best.get(b, 0), s)
+
+    clusters = {}
+    for guest_id in best:
+        clusters.setdefault(find(guest_id), []).append(guest_id)
+    if not clusters:
+        return []
+
+    involved = list(best)
+    stays = {}
+    for i in range(0, len(involved), 1000):
+        chunk = involved[i:i + 1000]
+        for row in run_query(
+            f"""SELECT Guest_ID, COUNT(*) AS Stays FROM Booking_History
+            WHERE Guest_ID IN ({', '.join(['%s'] * len(chunk))}) GROUP BY Guest_ID""",
+            tuple(chunk)
+        ):
+            stays[row['Guest_ID']] = row['Stays']
+
+    proposals = []
+    for members in clusters.values():
+        keep = min(members, key=lambda i: (-stays.get(i, 0), i))
+        for guest_id in sorted(members):
+            if guest_id == keep:
+                continue
+            proposals.append({
+                "Keep_ID": keep, "Keep_Name": by_id[keep]["Name"], "Keep_Email": by_id[keep]["Email"],
+                "Duplicate_ID": guest_id, "Duplicate_Name": by_id[guest_id]["Name"],
+                "Duplicate_Email": by_id[guest_id]["Email"],
+                "Score": round(match_score(by_id[keep], by_id[guest_id]), 2)
+            })
+    return sorted(proposals, key=lambda p: -p["Score"])
+
+
+def merge_guests(keep_id, duplicate_id):
+    """Move the duplicate's stays and loyalty points to keep_id, then delete the duplicate"""
+    if keep_id == duplicate_id:
+        raise ValueError("Cannot merge a guest into itself")
+    execute_transaction([
+        ("SELECT Guest_ID FROM Guest WHERE Guest_ID IN (%s, %s) FOR UPDATE", (keep_id, duplicate_id)),
+        ("UPDATE Booking SET Guest_ID = %s WHERE Guest_ID = %s", (keep_id, duplicate_id)),
+        ("UPDATE Booking_Archive SET Guest_ID = %s WHERE Guest_ID = %s", (keep_id, duplicate_id)),
+        ("""UPDATE CRM k JOIN CRM d ON d.Guest_ID = %s
+            SET k.Loyalty_Points = GREATEST(k.Loyalty_Points, d.Loyalty_Points)
+            WHERE k.Guest_ID = %s""", (duplicate_id, keep_id)),
+        ("DELETE FROM Guest WHERE Guest_ID = %s", (duplicate_id,))  # remove_crm_on_guest_delete drops its CRM row
+    ])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose duplicate guest merges")
+    parser.add_argument("--threshold", type=float, default=LIKELY_DUPLICATE)
+    args = parser.parse_args()
+
+    for proposal in find_duplicates(threshold=args.threshold):
+        print(f"{proposal['Score']:.2f}  keep {proposal['Keep_ID']} {proposal['Keep_Name']} <{proposal['Keep_Email']}>"
+              f"  <- merge {proposal['Duplicate_ID']} {proposal['Duplicate_Name']} <{proposal['Duplicate_Email']}>")
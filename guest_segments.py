@@ -0,0 +1,276 @@
+"""RFM (recency, frequency, monetary) guest segmentation.
+
+Per-guest aggregates (last check-in, number of stays, total spend) are cached
+in Guest_Segment. A full build streams Booking_History once in chunks (the
+first refresh does one automatically, so an existing database is seeded); after
+that, refresh_segments() only re-aggregates guests whose bookings appear in
+Change_Log since the last run. Scores are quintiles (1-5) over all guests and
+are recomputed in one vectorized pass each refresh, since recency moves daily;
+only rows whose values changed are written back.
+
+Usage: python guest_segments.py [--full] [--interval 900]
+"""
+from db_utils import get_db, read_from_primary, run_query
+from datetime import date
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import time
+
+logger = logging.getLogger(__name__)
+
+SEQ_OVERLAP = 200   # Re-read recent Change_Log rows in case a lower Seq_ID committed late
+WRITE_BATCH = 1000
+COLUMNS = ["Guest_ID", "Last_Stay", "Frequency", "Monetary", "R_Score", "F_Score", "M_Score", "Segment"]
+
+
+def _empty_aggregates():
+    return pd.DataFrame({
+        "Last_Stay": pd.Series(dtype="datetime64[ns]"),
+        "Frequency": pd.Series(dtype="int64"),
+        "Monetary": pd.Series(dtype="float64")
+    }, index=pd.Index([], name="Guest_ID", dtype="int64"))
+
+
+def _aggregate(rows):
+    """Booking rows (Guest_ID, Check_In_Date, Total_Amount) -> per-guest aggregates"""
+    frame = pd.DataFrame(rows, columns=["Guest_ID", "Check_In_Date", "Total_Amount"])
+    frame["Check_In_Date"] = pd.to_datetime(frame["Check_In_Date"])
+    frame["Total_Amount"] = frame["Total_Amount"].astype("float64")
+    return frame.groupby("Guest_ID").agg(
+        Last_Stay=("Check_In_Date", "max"),
+        Frequency=("Check_In_Date", "size"),
+        Monetary=("Total_Amount", "sum")
+    )
+
+
+def _combine(partials):
+    """Merge chunk aggregates; a guest can straddle chunk boundaries"""
+    if not partials:
+        return _empty_aggregates()
+    return pd.concat(partials).groupby(level=0).agg(
+        {"Last_Stay": "max", "Frequency": "sum", "Monetary": "sum"}
+    )
+
+
+def aggregate_all(chunk_size=50000):
+    """Stream all of Booking_History on an unbuffered cursor, aggregating chunk by chunk"""
+    conn = None
+    cursor = None
+    partials = []
+    try:
+        conn = get_db(stream=True)
+        cursor = conn.cursor(buffered=False)
+        cursor.execute("SELECT Guest_ID, Check_In_Date, Total_Amount FROM Booking_History")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            partials.append(_aggregate(rows))
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+    return _combine(partials)
+
+
+def aggregate_guests(guest_ids, chunk_size=1000):
+    """Aggregates for just these guests (guests with no bookings are absent)"""
+    guest_ids = list(guest_ids)
+    partials = []
+    for i in range(0, len(guest_ids), chunk_size):
+        chunk = guest_ids[i:i + chunk_size]
+        rows = run_query(
+            f"""SELECT Guest_ID, Check_In_Date, Total_Amount FROM Booking_History
+            WHERE Guest_ID IN ({', '.join(['%s'] * len(chunk))})""",
+            tuple(chunk)
+        )
+        if rows:
+            partials.append(_aggregate(rows))
+    return _combine(partials)
+
+
+def _quintile(values):
+    """Score 1-5 by percentile rank; ties share the average rank"""
+    if len(values) == 0:
+        return np.array([], dtype=np.int8)
+    pct = pd.Series(values).rank(method="average", pct=True).to_numpy()
+    return np.clip(np.ceil(pct * 5), 1, 5).astype(np.int8)
+
+
+def score(aggregates, today=None):
+    """Add R/F/M scores and a Segment label to an aggregates frame (vectorized)"""
+    today = pd.Timestamp(today or date.today())
+    frame = aggregates.copy()
+    recency = (today - frame["Last_Stay"]).dt.days.to_numpy()
+    frequency = frame["Frequency"].to_numpy()
+
+    r = _quintile(-recency)  # More recent scores higher
+    f = _quintile(frequency)
+    m = _quintile(frame["Monetary"].to_numpy())
+    frame["R_Score"], frame["F_Score"], frame["M_Score"] = r, f, m
+
+    # First matching rule wins
+    frame["Segment"] = np.select(
+        [
+            (r >= 4) & (f >= 4) & (m >= 4),
+            f >= 4,
+            (r >= 4) & (frequency == 1),
+            (r <= 2) & (f >= 3),
+            r <= 2
+        ],
+        ["Champions", "Loyal", "New", "At Risk", "Hibernating"],
+        default="Regular"
+    )
+    return frame
+
+
+def _load_cached():
+    rows = run_query("SELECT Guest_ID, Last_Stay, Frequency, Monetary, R_Score, F_Score, M_Score, Segment FROM Guest_Segment")
+    if not rows:
+        return score(_empty_aggregates())
+    frame = pd.DataFrame(rows, columns=COLUMNS).set_index("Guest_ID")
+    frame["Last_Stay"] = pd.to_datetime(frame["Last_Stay"])
+    frame["Monetary"] = frame["Monetary"].astype("float64")
+    return frame
+
+
+def _changed_guests(last_seq):
+    """(guests with booking changes after last_seq, new watermark); guests is None if the log no longer covers last_seq"""
+    bounds = run_query("SELECT MIN(Seq_ID) AS first_seq, MAX(Seq_ID) AS max_seq FROM Change_Log")[0]
+    max_seq = bounds["max_seq"] or last_seq
+    if bounds["first_seq"] is not None and bounds["first_seq"] > last_seq + 1:
+        return None, max_seq  # purge_change_log removed entries we never read
+    rows = run_query(
+        """SELECT DISTINCT Parent_ID FROM Change_Log
+        WHERE Table_Name = 'Booking' AND Seq_ID > %s AND Seq_ID <= %s AND Parent_ID IS NOT NULL""",
+        (max(last_seq - SEQ_OVERLAP, 0), max_seq)
+    )
+    return {row["Parent_ID"] for row in rows}, max_seq
+
+
+def _write(frame, deleted):
+    """Upsert changed rows and drop guests who no longer have stays"""
+    conn = None
+    cursor = None
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        out = frame.reset_index()
+        out["Last_Stay"] = out["Last_Stay"].dt.date
+        records = [
+            (int(g), ls, int(fr), round(float(mo), 2), int(r), int(f), int(m), seg)
+            for g, ls, fr, mo, r, f, m, seg in out[COLUMNS].itertuples(index=False)
+        ]
+        for i in range(0, len(records), WRITE_BATCH):
+            cursor.executemany(
+                """INSERT INTO Guest_Segment
+                (Guest_ID, Last_Stay, Frequency, Monetary, R_Score, F_Score, M_Score, Segment)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE Last_Stay = VALUES(Last_Stay), Frequency = VALUES(Frequency),
+                    Monetary = VALUES(Monetary), R_Score = VALUES(R_Score), F_Score = VALUES(F_Score),
+                    M_Score = VALUES(M_Score), Segment = VALUES(Segment)""",
+                records[i:i + WRITE_BATCH]
+            )
+            conn.commit()
+        deleted = list(deleted)
+        for i in range(0, len(deleted), WRITE_BATCH):
+            chunk = deleted[i:i + WRITE_BATCH]
+            cursor.execute(
+                f"DELETE FROM Guest_Segment WHERE Guest_ID IN ({', '.join(['%s'] * len(chunk))})",
+                tuple(chunk)
+            )
+            conn.commit()
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def _differs(old, new):
+    """Rows of `new` whose aggregates or scores differ from the cached `old`"""
+    previous = old.reindex(new.index)[COLUMNS[1:]]
+    current = new[COLUMNS[1:]]
+    same = previous.eq(current) | (previous.isna() & current.isna())
+    return ~same.all(axis=1)
+
+
+def refresh_segments(full=False):
+    """Bring Guest_Segment up to date; returns counts of guests re-aggregated and rows written"""
+    # The watermark and the aggregates must come from the same, current copy of the data
+    with read_from_primary():
+        return _refresh_segments(full)
+
+
+def _refresh_segments(full):
+    state = run_query("SELECT Last_Seq, Refreshed_At FROM Segment_Refresh_State WHERE State_ID = 1")
+    # No snapshot yet: bookings made before the first refresh are not in the deltas
+    full = full or not state or state[0]["Refreshed_At"] is None
+    last_seq = state[0]["Last_Seq"] if state else 0
+
+    changed, max_seq = (None, None) if full else _changed_guests(last_seq)
+    if changed is None:
+        # Read the watermark before scanning so changes made during the scan are picked up next time
+        max_seq = run_query("SELECT COALESCE(MAX(Seq_ID), 0) AS max_seq FROM Change_Log")[0]["max_seq"]
+        old = _load_cached()
+        aggregates = aggregate_all()
+        deleted = set(old.index) - set(aggregates.index)
+        reaggregated = len(aggregates)
+    else:
+        old = _load_cached()
+        fresh = aggregate_guests(changed)
+        aggregates = old[["Last_Stay", "Frequency", "Monetary"]].drop(index=list(changed), errors="ignore")
+        aggregates = pd.concat([aggregates, fresh])
+        deleted = (changed - set(fresh.index)) & set(old.index)
+        reaggregated = len(changed)
+
+    aggregates["Monetary"] = aggregates["Monetary"].round(2)
+    scored = score(aggregates)
+    to_write = scored[_differs(old, scored)]
+    _write(to_write, deleted)
+
+    run_query(
+        """INSERT INTO Segment_Refresh_State (State_ID, Last_Seq, Refreshed_At) VALUES (1, %s, NOW())
+        ON DUPLICATE KEY UPDATE Last_Seq = VALUES(Last_Seq), Refreshed_At = VALUES(Refreshed_At)""",
+        (max_seq,), fetch=False
+    )
+    stats = {"Mode": "full" if changed is None else "incremental", "Guests_Reaggregated": reaggregated,
+             "Rows_Written": len(to_write), "Rows_Deleted": len(deleted)}
+    logger.info(f"Segment refresh: {stats}")
+    return stats
+
+
+def segment_counts():
+    """Guests per segment, for the CRM summary"""
+    return run_query("SELECT Segment, COUNT(*) AS Guests FROM Guest_Segment GROUP BY Segment ORDER BY Guests DESC")
+
+
+def run_refresher(interval=900):
+    """Refresh loop; a full rebuild happens automatically when Change_Log no longer covers the watermark"""
+    while True:
+        try:
+            refresh_segments()
+        except Exception as e:
+            logger.error(f"Segment refresh failed: {str(e)}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh RFM guest segments")
+    parser.add_argument("--full", action="store_true", help="Rebuild from all of Booking_History")
+    parser.add_argument("--interval", type=int, help="Keep running, refreshing every N seconds")
+    args = parser.parse_args()
+
+    if args.interval:
+        if args.full:
+            refresh_segments(full=True)
+        run_refresher(args.interval)
+    else:
+        print(refresh_segments(full=args.full))
@@ -0,0 +1,356 @@
+"""Loyalty points campaign mailer.
+
+Messages go out over `--connections` separate SMTP sessions, one per sender
+thread, each logged in once and sending one message at a time; a shared token
+bucket caps the total rate. (smtplib does not pipeline, so concurrency comes
+from the sessions, not from batching commands on one.) Only one sender may run
+a campaign at a time: claim_campaign() marks it Running atomically.
+
+Usage: python loyalty_campaign.py <campaign-name> --min-points 100 --rate 60 --connections 8 [--property CODE]
+Local run: python -m aiosmtpd -n -l localhost:1025, then set CAMPAIGN_SMTP_SERVER=localhost CAMPAIGN_SMTP_PORT=1025
+"""
+from concurrent.futures import ThreadPoolExecutor
+from db_utils import SHARDS, execute_transaction, get_db, mark_written, run_query, set_property
+from email.mime.text import MIMEText
+from receipts import hotel_name
+from string import Template
+from dotenv import load_dotenv
+import argparse
+import logging
+import os
+import smtplib
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+load_dotenv("config.env")
+
+CLAIM_TIMEOUT = int(os.getenv("CAMPAIGN_CLAIM_TIMEOUT", "3600"))  # seconds without progress before a Running campaign counts as abandoned
+
+DEFAULT_SUBJECT = Template("$name, you have $points loyalty points at $hotel")
+DEFAULT_BODY = Template(
+    "Dear $name,\n\n"
+    "You have $points loyalty points with $hotel.\n"
+    "Your next eligible stay gets Rs.100 off automatically.\n\n"
+    "We look forward to welcoming you back!"
+)
+
+
+def iter_eligible_guests(min_points, after_guest_id=0, page_size=500):
+    """Stream CRM ⋈ Guest in Guest_ID order, one page per query.
+
+    Each page is read through an unbuffered cursor; paging by Guest_ID keeps the
+    server-side cursor short-lived so a rate-limited sender never trips
+    net_write_timeout, and doubles as the resume checkpoint.
+    """
+    last_id = after_guest_id
+    while True:
+        conn = get_db(stream=True)
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute("""
+                SELECT g.Guest_ID, g.Name, g.Email, c.Loyalty_Points
+                FROM CRM c
+                JOIN Guest g ON c.Guest_ID = g.Guest_ID
+                WHERE c.Guest_ID > %s
+                AND c.Loyalty_Points >= %s
+                AND g.Email IS NOT NULL
+                ORDER BY c.Guest_ID
+                LIMIT %s
+            """, (last_id, min_points, page_size))
+            page = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+        if not page:
+            return
+        yield page
+        last_id = page[-1]['Guest_ID']
+        if len(page) < page_size:
+            return
+
+
+class RateLimiter:
+    """Token bucket shared by all sender threads"""
+
+    def __init__(self, per_second, burst=None):
+        self.rate = per_second
+        self.capacity = burst or max(1.0, per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SMTPSenderPool:
+    """One persistent SMTP session per sender thread (login once, many messages)"""
+
+    def __init__(self):
+        self.server = os.getenv("CAMPAIGN_SMTP_SERVER", os.getenv("SMTP_SERVER"))
+        self.port = int(os.getenv("CAMPAIGN_SMTP_PORT", os.getenv("SMTP_PORT")))
+        self.sender = os.getenv("EMAIL_ADDRESS")
+        self.password = os.getenv("EMAIL_PASSWORD")
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def _session(self):
+        smtp = getattr(self._local, "smtp", None)
+        if smtp is None:
+            smtp = smtplib.SMTP(self.server, self.port, timeout=10)
+            smtp.ehlo()
+            if smtp.has_extn("starttls"):
+                smtp.starttls()
+                smtp.ehlo()
+            if self.password and smtp.has_extn("auth"):
+                smtp.login(self.sender, self.password)
+            self._local.smtp = smtp
+            with self._lock:
+                self._sessions.append(smtp)
+        return smtp
+
+    def send(self, to_email, subject, body):
+        msg = MIMEText(body, "plain")
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        try:
+            self._session().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Session dropped (idle timeout / server limit): reconnect once
+            self._local.smtp = None
+            self._session().send_message(msg)
+
+    def close(self):
+        with self._lock:
+            for smtp in self._sessions:
+                try:
+                    smtp.quit()
+                except Exception:
+                    pass
+            self._sessions.clear()
+
+
+class CampaignRunning(Exception):
+    """Another sender is already running this campaign"""
+
+
+def claim_campaign(name, min_points=100):
+    """Mark the campaign Running for the caller; False if another sender already runs it.
+
+    Status is checked and set in one UPDATE, so a double-clicked Start or two
+    clerks cannot both send from the same checkpoint. A Running campaign whose
+    progress has not moved for CLAIM_TIMEOUT seconds (its sender was killed) can
+    be claimed again.
+    """
+    run_query(
+        "INSERT IGNORE INTO Campaign_Progress (Campaign_Name, Min_Points, Status) VALUES (%s, %s, 'Paused')",
+        (name, min_points), fetch=False
+    )
+    conn = None
+    cursor = None
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(
+            """UPDATE Campaign_Progress SET Status = 'Running'
+            WHERE Campaign_Name = %s
+            AND (Status <> 'Running' OR Updated_At < NOW() - INTERVAL %s SECOND)""",
+            (name, CLAIM_TIMEOUT)
+        )
+        claimed = cursor.rowcount == 1
+        conn.commit()
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+    mark_written()
+    return claimed
+
+
+def _load_progress(name):
+    return run_query(
+        "SELECT * FROM Campaign_Progress WHERE Campaign_Name = %s", (name,)
+    )[0]
+
+
+def iter_failed_guests(name, min_points, page_size=500):
+    """Guests whose send failed in an earlier run and who are still eligible, one page per query.
+
+    Failures for guests that have since dropped below min_points or lost their
+    email are discarded first; the campaign would not mail them any more.
+    """
+    run_query("""
+        DELETE f FROM Campaign_Failure f
+        LEFT JOIN CRM c ON c.Guest_ID = f.Guest_ID
+        LEFT JOIN Guest g ON g.Guest_ID = f.Guest_ID
+        WHERE f.Campaign_Name = %s
+        AND (c.Loyalty_Points IS NULL OR c.Loyalty_Points < %s OR g.Email IS NULL)
+    """, (name, min_points), fetch=False)
+
+    last_id = 0
+    while True:
+        page = run_query("""
+            SELECT g.Guest_ID, g.Name, g.Email, c.Loyalty_Points
+            FROM Campaign_Failure f
+            JOIN CRM c ON c.Guest_ID = f.Guest_ID
+            JOIN Guest g ON g.Guest_ID = f.Guest_ID
+            WHERE f.Campaign_Name = %s AND f.Guest_ID > %s
+            ORDER BY f.Guest_ID
+            LIMIT %s
+        """, (name, last_id, page_size))
+        if not page:
+            return
+        yield page
+        last_id = page[-1]['Guest_ID']
+        if len(page) < page_size:
+            return
+
+
+def _save_checkpoint(name, last_guest_id, sent, failures, delivered=()):
+    """Record a page's failed sends, clear retried ones that went through, and move the checkpoint.
+
+    One transaction, so the checkpoint never passes a guest whose failure was not
+    recorded. Failed is the number of failures still outstanding.
+    """
+    queries = [(
+        """INSERT INTO Campaign_Failure (Campaign_Name, Guest_ID, Error) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE Error = VALUES(Error), Attempts = Attempts + 1""",
+        (name, guest_id, error[:255])
+    ) for guest_id, error in failures]
+    if delivered:
+        queries.append((
+            f"DELETE FROM Campaign_Failure WHERE Campaign_Name = %s "
+            f"AND Guest_ID IN ({', '.join(['%s'] * len(delivered))})",
+            (name, *delivered)
+        ))
+    queries.append((
+        """UPDATE Campaign_Progress
+        SET Last_Guest_ID = GREATEST(Last_Guest_ID, %s), Sent = Sent + %s, Status = 'Running',
+            Updated_At = CURRENT_TIMESTAMP,  -- Progress, even when every send in the page failed
+            Failed = (SELECT COUNT(*) FROM Campaign_Failure WHERE Campaign_Name = %s)
+        WHERE Campaign_Name = %s""",
+        (last_guest_id, sent, name, name)
+    ))
+    execute_transaction(queries)
+
+
+def _outstanding_failures(name):
+    return run_query(
+        "SELECT COUNT(*) AS Failed FROM Campaign_Failure WHERE Campaign_Name = %s", (name,)
+    )[0]['Failed']
+
+
+def _set_status(name, status):
+    run_query(
+        "UPDATE Campaign_Progress SET Status = %s WHERE Campaign_Name = %s",
+        (status, name), fetch=False
+    )
+
+
+def run_campaign(name, min_points=100, rate=50.0, connections=4,
+                 subject=DEFAULT_SUBJECT, body=DEFAULT_BODY, page_size=500, claimed=False):
+    """Send the campaign, resuming after the last checkpointed Guest_ID.
+
+    A page is checkpointed once all its messages are attempted, so an
+    interrupted run re-sends at most one page (at-least-once delivery). Failed
+    sends go to Campaign_Failure and are retried first when the campaign is run
+    again; it is only marked Completed once none are outstanding.
+
+    Raises CampaignRunning if another sender holds the campaign; pass
+    claimed=True when the caller already won claim_campaign().
+    """
+    if not claimed and not claim_campaign(name, min_points):
+        raise CampaignRunning(f"Campaign {name} is already running")
+    progress = _load_progress(name)
+    min_points = progress['Min_Points']
+    limiter = RateLimiter(rate)
+    senders = SMTPSenderPool()
+    totals = {"sent": progress['Sent']}
+    hotel = hotel_name()  # Sender threads do not see this context's property
+    start = time.perf_counter()
+    sent_this_run = 0
+
+    def deliver(guest):
+        fields = {"name": guest['Name'], "points": guest['Loyalty_Points'], "hotel": hotel}
+        limiter.acquire()
+        try:
+            senders.send(guest['Email'], subject.safe_substitute(fields), body.safe_substitute(fields))
+            return None
+        except Exception as e:
+            logger.warning(f"Campaign {name}: send to guest {guest['Guest_ID']} failed: {str(e)}")
+            return str(e) or type(e).__name__
+
+    def send_page(page, retry):
+        nonlocal sent_this_run
+        errors = list(pool.map(deliver, page))
+        failures = [(guest['Guest_ID'], error) for guest, error in zip(page, errors) if error is not None]
+        delivered = [guest['Guest_ID'] for guest, error in zip(page, errors) if error is None]
+        # Retried guests sit behind the checkpoint already; 0 leaves it where it is
+        _save_checkpoint(name, 0 if retry else page[-1]['Guest_ID'], len(delivered),
+                         failures, delivered if retry else ())
+        totals["sent"] += len(delivered)
+        sent_this_run += len(delivered)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Campaign {name}: {totals['sent']} sent, {len(failures)} failed in this page, "
+                    f"{sent_this_run / elapsed * 60:.0f} msgs/min")
+
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            # Earlier failures first, so a resumed campaign does not leave them behind
+            for page in iter_failed_guests(name, min_points, page_size):
+                send_page(page, retry=True)
+            for page in iter_eligible_guests(min_points, progress['Last_Guest_ID'], page_size):
+                send_page(page, retry=False)
+        totals["failed"] = _outstanding_failures(name)
+        if totals["failed"]:
+            logger.warning(f"Campaign {name}: {totals['failed']} failed sends outstanding; "
+                           f"run it again to retry them")
+        _set_status(name, "Paused" if totals["failed"] else "Completed")
+    except BaseException:
+        _set_status(name, "Paused")
+        raise
+    finally:
+        senders.close()
+
+    elapsed = time.perf_counter() - start
+    totals["msgs_per_min"] = round(sent_this_run / elapsed * 60, 1) if elapsed else 0.0
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a loyalty points campaign")
+    parser.add_argument("name", help="Campaign name; rerun with the same name to resume")
+    parser.add_argument("--min-points", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=50.0, help="Messages per second")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--property", choices=sorted(SHARDS), help="Property to mail (default: PROPERTY)")
+    args = parser.parse_args()
+
+    if args.property:
+        set_property(args.property)
+
+    try:
+        totals = run_campaign(args.name, args.min_points, args.rate, args.connections)
+    except CampaignRunning as e:
+        raise SystemExit(str(e))
+    print(f"Campaign {args.name}: {totals['sent']} sent, {totals['failed']} failed, "
+          f"{totals['msgs_per_min']} msgs/min")
+
+
+if __name__ == "__main__":
+    main()
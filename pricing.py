@@ -0,0 +1,165 @@
+"""Stay pricing from the Rate_Calendar.
+
+Prices match the stay_amount() SQL function used by the booking triggers and
+modify_booking (before any loyalty discount): each night uses the calendar rate for the room's type if one exists,
+otherwise the room's own Price.
+
+RateCalendar loads a window of the calendar once and keeps, per room type,
+prefix sums of the nightly rates and of how many nights have a rate, so any
+stay inside the window is priced with two lookups per array. The cached
+calendar is dropped as soon as Rate_Calendar changes (apply_changes, fed by
+the change feed), so a quote matches what the pricing trigger charges.
+"""
+from db_utils import current_shard, run_query, execute_transaction
+from datetime import date, timedelta
+from decimal import Decimal
+import numpy as np
+import threading
+import time
+
+ROOM_TYPES = ("Standard", "Deluxe", "Suite")
+
+_calendars = {}  # Property code -> (RateCalendar, monotonic time it was loaded)
+_calendar_lock = threading.Lock()
+
+
+def _paise(amount):
+    """Money as integer paise so prefix sums stay exact"""
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+class RateCalendar:
+    def __init__(self, start=None, days=400):
+        self.start = start or date.today() - timedelta(days=30)
+        self.days = days
+        self.end = self.start + timedelta(days=days)
+
+        rows = run_query(
+            """SELECT Room_Type, Rate_Date, Rate FROM Rate_Calendar
+            WHERE Rate_Date >= %s AND Rate_Date < %s""",
+            (self.start, self.end)
+        )
+        rates = {t: np.zeros(days, dtype=np.int64) for t in ROOM_TYPES}
+        covered = {t: np.zeros(days, dtype=np.int64) for t in ROOM_TYPES}
+        for row in rows:
+            i = (row['Rate_Date'] - self.start).days
+            rates[row['Room_Type']][i] = _paise(row['Rate'])
+            covered[row['Room_Type']][i] = 1
+
+        # Prefix sums with a leading 0: nights [a, b) sum to cum[b] - cum[a]
+        self._rate_cum = {t: np.concatenate(([0], np.cumsum(rates[t]))) for t in ROOM_TYPES}
+        self._covered_cum = {t: np.concatenate(([0], np.cumsum(covered[t]))) for t in ROOM_TYPES}
+
+    def covers(self, check_in, check_out):
+        return self.start <= check_in and check_out <= self.end
+
+    def quote(self, room_type, room_price, check_in, check_out):
+        """Total for one stay (O(1) inside the loaded window)"""
+        nights = (check_out - check_in).days
+        if nights <= 0:
+            raise ValueError("Check-out must be after check-in")
+        if not self.covers(check_in, check_out):
+            return quote_from_db(room_type, room_price, check_in, check_out)
+
+        a = (check_in - self.start).days
+        b = a + nights
+        rate_cum, covered_cum = self._rate_cum[room_type], self._covered_cum[room_type]
+        calendar_nights = covered_cum[b] - covered_cum[a]
+        total = rate_cum[b] - rate_cum[a] + _paise(room_price) * (nights - calendar_nights)
+        return Decimal(int(total)) / 100
+
+    def quote_many(self, room_types, room_prices, check_ins, check_outs):
+        """Vectorized quotes for many stays; returns a float64 array of totals in rupees"""
+        room_types = np.asarray(room_types)
+        prices = np.round(np.asarray(room_prices, dtype=np.float64) * 100).astype(np.int64)
+        a = (np.asarray(check_ins, dtype="datetime64[D]") - np.datetime64(self.start, "D")).astype(np.int64)
+        b = (np.asarray(check_outs, dtype="datetime64[D]") - np.datetime64(self.start, "D")).astype(np.int64)
+        if (a < 0).any() or (b > self.days).any() or (b <= a).any():
+            raise ValueError("All stays must be non-empty and inside the loaded calendar window")
+
+        totals = np.zeros(len(a), dtype=np.int64)
+        for room_type in ROOM_TYPES:
+            mask = room_types == room_type
+            if not mask.any():
+                continue
+            rate_cum, covered_cum = self._rate_cum[room_type], self._covered_cum[room_type]
+            ai, bi = a[mask], b[mask]
+            calendar_nights = covered_cum[bi] - covered_cum[ai]
+            totals[mask] = rate_cum[bi] - rate_cum[ai] + prices[mask] * ((bi - ai) - calendar_nights)
+        return totals / 100
+
+
+def get_rate_calendar(max_age=300):
+    """The current property's RateCalendar, rebuilt when older than max_age seconds or after midnight"""
+    property = current_shard().code
+    with _calendar_lock:
+        calendar, loaded = _calendars.get(property, (None, 0.0))
+        stale = (
+            calendar is None
+            or time.monotonic() - loaded > max_age
+            or calendar.start != date.today() - timedelta(days=30)
+        )
+        if stale:
+            calendar = RateCalendar()
+            _calendars[property] = (calendar, time.monotonic())
+        return calendar
+
+
+def invalidate_rate_calendar(property=None):
+    """Drop a property's cached calendar (default: the current one); the next quote reloads it"""
+    with _calendar_lock:
+        _calendars.pop(property or current_shard().code, None)
+
+
+def apply_changes(entries):
+    """ChangeFeed listener: drop the current property's calendar when a rate changed"""
+    if any(e['Table_Name'] == 'Rate_Calendar' for e in entries):
+        invalidate_rate_calendar()
+
+
+def quote_rooms(rooms, check_in, check_out, calendar=None):
+    """Add a 'Quote' (stay total before loyalty discount) to each room row from run_query"""
+    if not rooms:
+        return rooms
+    calendar = calendar or get_rate_calendar()
+    if calendar.covers(check_in, check_out) and check_out > check_in:
+        totals = calendar.quote_many(
+            [r['Room_Type'] for r in rooms], [float(r['Price']) for r in rooms],
+            [check_in] * len(rooms), [check_out] * len(rooms)
+        )
+        for room, total in zip(rooms, totals):
+            room['Quote'] = round(float(total), 2)
+    else:
+        for room in rooms:
+            room['Quote'] = float(calendar.quote(room['Room_Type'], room['Price'], check_in, check_out))
+    return rooms
+
+
+def quote_from_db(room_type, room_price, check_in, check_out):
+    """Same price computed in SQL, for stays outside a loaded window"""
+    row = run_query(
+        """SELECT COALESCE(SUM(Rate), 0) AS calendar_total, COUNT(*) AS calendar_nights
+        FROM Rate_Calendar
+        WHERE Room_Type = %s AND Rate_Date >= %s AND Rate_Date < %s""",
+        (room_type, check_in, check_out)
+    )[0]
+    nights = (check_out - check_in).days
+    return Decimal(row['calendar_total']) + Decimal(str(room_price)) * (nights - row['calendar_nights'])
+
+
+def set_rates(room_type, start, end, rate, weekdays=None):
+    """Upsert `rate` for each night in [start, end); `weekdays` (0=Mon) limits which nights"""
+    nights = []
+    day = start
+    while day < end:
+        if weekdays is None or day.weekday() in weekdays:
+            nights.append((room_type, day, rate))
+        day += timedelta(days=1)
+    if nights:
+        execute_transaction([
+            ("""INSERT INTO Rate_Calendar (Room_Type, Rate_Date, Rate) VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE Rate = VALUES(Rate)""", night)
+            for night in nights
+        ])
+        invalidate_rate_calendar()  # Don't wait for the change feed in this process
+    return len(nights)
@@ -0,0 +1,114 @@
+"""On-demand sampling profiler for a single Streamlit rerun.
+
+While active, a background thread samples the profiled thread's Python stack
+every PROFILE_INTERVAL seconds (wall clock, so time spent waiting on MySQL or
+SMTP shows up too). Stacks are written in the collapsed format
+("outer;inner;leaf count") read by flamegraph.pl, inferno and speedscope, and
+each sample is attributed to the first matching category in CATEGORIES.
+
+PROFILE_DIR (default profiles) sets the output directory; PROFILER=0 hides the
+toggle in the app.
+"""
+from collections import Counter
+from dotenv import load_dotenv
+import os
+import sys
+import threading
+import time
+
+load_dotenv("config.env")
+
+PROFILER_ENABLED = os.getenv("PROFILER", "1") != "0"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # seconds between samples
+
+
+def _in(*parts):
+    return lambda path, name: any(part in path for part in parts)
+
+
+# First match wins, so a query run while building a receipt counts as a query,
+# and pandas work done inside st.data_editor counts as building the editor
+CATEGORIES = (
+    ("Queries", _in("/db_utils.py", "/async_db_utils.py", "/change_feed.py",
+                    "/booking_queue.py", "/mysql/")),
+    ("PDF/email", _in("/receipts.py", "/receipt_batch.py", "/receipt_template.py",
+                      "/fpdf/", "/smtplib.py")),
+    ("Data editor", lambda path, name: name == "data_editor" and "/streamlit/" in path),
+    ("Tables", lambda path, name: name == "dataframe" and "/streamlit/" in path),
+    ("Pandas", _in("/pandas/")),
+)
+
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RerunProfiler:
+    """Sample the calling thread for the duration of a with-block.
+
+    After the block, `summary` holds the wall time, seconds per category, the
+    functions with the most self time and the path of the collapsed-stack file.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, directory=PROFILE_DIR):
+        self.interval = interval
+        self.directory = directory
+        self.stacks = Counter()
+        self.summary = None
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._root = sys._getframe(1)  # Stacks are cut at the frame that opened the profiler
+        self._sampler = threading.Thread(target=self._sample, name="rerun-profiler", daemon=True)
+        self._started = time.perf_counter()
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._sampler.join()
+        self.summary = self._summarize(time.perf_counter() - self._started, self._write())
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                if frame is self._root:
+                    break
+                frame = frame.f_back
+            if codes:
+                self.stacks[tuple(reversed(codes))] += 1
+
+    def _write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(2).hex()}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(";".join(_label(code) for code in stack) + f" {count}\n")
+        return path
+
+    def _summarize(self, seconds, path):
+        samples = sum(self.stacks.values())
+        categories = Counter()
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            frames = [(code.co_filename.replace("\\", "/"), code.co_name) for code in stack]
+            category = next((name for name, matches in CATEGORIES
+                             if any(matches(*frame) for frame in frames)), "Other")
+            categories[category] += count
+            leaves[_label(stack[-1])] += count
+
+        share = seconds / samples if samples else 0.0
+        return {
+            "file": path,
+            "seconds": round(seconds, 3),
+            "samples": samples,
+            "categories": {name: round(categories[name] * share, 3)
+                           for name in [name for name, _ in CATEGORIES] + ["Other"]},
+            "top": [(label, round(count * share, 3)) for label, count in leaves.most_common(10)],
+        }
@@ -0,0 +1,115 @@
+"""Batch receipt re-issue for a date range.
+
+Usage: python receipt_batch.py 2026-09-01 2026-09-30 --out september.zip [--workers 8]
+
+Output is always a ZIP of one PDF per booking: each receipt is written and
+dropped as soon as it is rendered, so memory stays bounded however long the
+range. (A single combined PDF would have to be held whole until it is written.)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from db_utils import get_db
+from receipts import RECEIPT_COLUMNS, hotel_name, render_receipt
+import argparse
+import logging
+import os
+import time
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+
+def iter_booking_pages(start_date, end_date, page_size=200):
+    """Stream receipt rows for stays checking in within the range, one page at a time.
+
+    Uses a single query on an unbuffered cursor, so only one page is held in memory.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = get_db(read_only=True, stream=True)  # Long scan: keep it off the primary when a replica is healthy
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(f"""
+            SELECT {RECEIPT_COLUMNS}
+            FROM Booking_History b
+            JOIN Guest g ON b.Guest_ID = g.Guest_ID
+            JOIN Room r ON b.Room_ID = r.Room_ID
+            WHERE b.Check_In_Date BETWEEN %s AND %s
+            ORDER BY b.Booking_ID
+        """, (start_date, end_date))
+
+        while True:
+            page = cursor.fetchmany(page_size)
+            if not page:
+                break
+            yield page
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def render_page(bookings, name):
+    """Process-pool task: render a page of one hotel's bookings to (file name, PDF bytes)"""
+    return [
+        (f"{name}_Booking_{booking['Booking_ID']}.pdf", render_receipt(booking, name))
+        for booking in bookings
+    ]
+
+
+def write_receipts_zip(start_date, end_date, out_path, workers=None, page_size=200):
+    """Render receipts across cores and stream them into a ZIP"""
+    workers = workers or os.cpu_count() or 1
+    name = hotel_name()  # Worker processes do not see this context's property
+    max_in_flight = workers * 2  # Bounds rendered-but-unwritten PDFs in memory
+    count = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        pending = deque()
+
+        def drain_one():
+            nonlocal count
+            for name, content in pending.popleft().result():
+                archive.writestr(name, content)
+                count += 1
+
+        for page in iter_booking_pages(start_date, end_date, page_size):
+            pending.append(pool.submit(render_page, page, name))
+            if len(pending) >= max_in_flight:
+                drain_one()
+        while pending:
+            drain_one()
+
+    return _report(count, time.perf_counter() - start, out_path)
+
+
+def _report(count, seconds, out_path):
+    stats = {
+        "receipts": count,
+        "seconds": round(seconds, 3),
+        "receipts_per_sec": round(count / seconds, 1) if seconds else 0.0,
+        "path": out_path
+    }
+    logger.info(f"Wrote {count} receipts to {out_path} in {stats['seconds']}s "
+                f"({stats['receipts_per_sec']} receipts/sec)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-issue receipts for a date range")
+    parser.add_argument("start_date")
+    parser.add_argument("end_date")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    stats = write_receipts_zip(args.start_date, args.end_date, args.out, args.workers)
+    print(f"{stats['receipts']} receipts in {stats['seconds']}s "
+          f"({stats['receipts_per_sec']} receipts/sec) -> {stats['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Precompiled receipt template.
+
+The PDF skeleton (catalog, page, fonts, cross-reference table) and the content
+stream for the static parts of the page (branding, title, labels) are built once.
+Rendering a receipt only formats the per-booking values and splices them in,
+so no FPDF document is created per booking.
+"""
+from fpdf import FPDF
+
+# Same page geometry as FPDF() defaults used by draw_receipt: A4 portrait, mm, 10mm margins
+PAGE_W, PAGE_H = 210.0, 297.0
+MARGIN = 10.0
+CELL_MARGIN = MARGIN / 10
+LINE_H = 10.0
+LABEL_W = 40.0
+K = 72 / 25.4  # points per mm
+
+RECEIPT_FIELDS = [
+    ("Booking ID:", lambda b: b['Booking_ID']),
+    ("Guest:", lambda b: b['Name']),
+    ("Room:", lambda b: b['Room_Type']),
+    ("Check-In:", lambda b: b['Check_In_Date']),
+    ("Check-Out:", lambda b: b['Check_Out_Date']),
+    ("Total:", lambda b: f"Rs.{b['Total_Amount']}"),
+]
+
+
+def _escape(text):
+    """PDF string literal for the WinAnsi core fonts"""
+    raw = str(text).encode('latin-1', 'replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'')
+
+
+def _text_op(font, size, x_mm, top_mm, text):
+    """Text placed the way FPDF.cell() places it inside a LINE_H-high cell at (x, top)"""
+    baseline = top_mm + 0.5 * LINE_H + 0.3 * size / K
+    return b"BT /%s %d Tf %.2f %.2f Td (%s) Tj ET\n" % (
+        font, size, x_mm * K, (PAGE_H - baseline) * K, _escape(text)
+    )
+
+
+class ReceiptTemplate:
+    """Receipt page laid out once, then stamped with per-booking fields"""
+
+    def __init__(self, hotel_name):
+        self.hotel_name = hotel_name
+
+        # Measure the centred headings once using FPDF's core font metrics
+        measure = FPDF()
+        measure.add_page()
+        usable = PAGE_W - 2 * MARGIN
+
+        measure.set_font("Arial", "B", 14)
+        brand_x = MARGIN + (usable - measure.get_string_width(hotel_name)) / 2
+        measure.set_font("Arial", size=12)
+        title_x = MARGIN + (usable - measure.get_string_width("Booking Receipt")) / 2
+
+        static_ops = [
+            _text_op(b"F2", 14, brand_x, MARGIN, hotel_name),
+            _text_op(b"F1", 12, title_x, MARGIN + LINE_H, "Booking Receipt"),
+        ]
+        self._value_slots = []
+        for row, (label, getter) in enumerate(RECEIPT_FIELDS):
+            top = MARGIN + (row + 2) * LINE_H
+            static_ops.append(_text_op(b"F1", 12, MARGIN + CELL_MARGIN, top, label))
+            # Everything but the value text is fixed per row
+            baseline = top + 0.5 * LINE_H + 0.3 * 12 / K
+            prefix = b"BT /F1 12 Tf %.2f %.2f Td (" % (
+                (MARGIN + LABEL_W + CELL_MARGIN) * K, (PAGE_H - baseline) * K
+            )
+            self._value_slots.append((prefix, getter))
+        self._static_stream = b"".join(static_ops)
+
+        # Objects 1-5 never change; the content stream is always object 6 and
+        # always starts at the same offset, so the xref table is fixed too
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>"
+            % (PAGE_W * K, PAGE_H * K),
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        ]
+        head = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(head))
+            head += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        offsets.append(len(head))
+        head += b"6 0 obj\n<< /Length "
+        self._head = bytes(head)
+
+        self._xref = b"xref\n0 7\n0000000000 65535 f \n" + b"".join(
+            b"%010d 00000 n \n" % offset for offset in offsets
+        ) + b"trailer\n<< /Size 7 /Root 1 0 R >>\nstartxref\n"
+
+    def render(self, booking):
+        """Receipt PDF bytes for one booking row"""
+        parts = [self._static_stream]
+        for prefix, getter in self._value_slots:
+            parts.append(prefix)
+            parts.append(_escape(getter(booking)))
+            parts.append(b") Tj ET\n")
+        stream = b"".join(parts)
+
+        body = b"%s%d >>\nstream\n%s\nendstream\nendobj\n" % (self._head, len(stream), stream)
+        return b"%s%s%d\n%%%%EOF\n" % (body, self._xref, len(body))
@@ -0,0 +1,176 @@
+from db_utils import SHARDS, DEFAULT_PROPERTY, current_shard, read_from_primary, run_query
+from fpdf import FPDF
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.application import MIMEApplication
+from email.mime.text import MIMEText
+import tempfile
+import os
+from dotenv import load_dotenv
+import time
+import logging
+from receipt_template import ReceiptTemplate
+from tracing import span, log_sampled
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+# --- Minimal Config ---
+load_dotenv("config.env")
+HOTEL_NAME = SHARDS[DEFAULT_PROPERTY].name  # Default property; use hotel_name() for the current one
+
+# Laid out once per process and hotel; render_receipt() only stamps booking fields into it
+_templates = {}
+
+
+def hotel_name():
+    """Name of the property the current context is working against"""
+    return current_shard().name
+
+
+def receipt_template(name=None):
+    name = name or hotel_name()
+    if name not in _templates:
+        _templates[name] = ReceiptTemplate(name)
+    return _templates[name]
+
+
+# Columns every receipt needs; batch re-issue selects the same set
+RECEIPT_COLUMNS = """
+    b.Booking_ID, g.Name, g.Email, r.Room_Type,
+    b.Check_In_Date, b.Check_Out_Date, b.Total_Amount
+"""
+
+# --- Minimal PDF/Email Functions ---
+def draw_receipt(pdf, booking, name=None):
+    """Lay out one booking as a new page of `pdf`"""
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, name or hotel_name(), 0, 1, 'C')
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, "Booking Receipt", 0, 1, 'C')
+    
+    # Add receipt content
+    for label, value in [
+        ("Booking ID:", booking['Booking_ID']),
+        ("Guest:", booking['Name']),
+        ("Room:", booking['Room_Type']),
+        ("Check-In:", str(booking['Check_In_Date'])),
+        ("Check-Out:", str(booking['Check_Out_Date'])),
+        ("Total:", f"Rs.{booking['Total_Amount']}")
+    ]:
+        pdf.cell(40, 10, label, 0, 0)
+        pdf.cell(0, 10, str(value), 0, 1)
+
+def pdf_bytes(pdf):
+    """PDF document as bytes (fpdf returns a latin-1 str, fpdf2 a bytearray)"""
+    out = pdf.output(dest='S')
+    return out.encode('latin-1') if isinstance(out, str) else bytes(out)
+
+def render_receipt(booking, name=None):
+    """Receipt PDF for one booking row, in memory"""
+    return receipt_template(name).render(booking)
+
+def generate_secure_receipt(booking_id, max_retries=3, delay=1):
+    """Enhanced with retry logic for database consistency"""
+    for attempt in range(max_retries):
+        try:
+            with span("receipt.query", booking_id=booking_id, attempt=attempt + 1) as attrs:
+                # A retry means a replica may be behind; the primary always has the row
+                with read_from_primary() if attempt else nullcontext():
+                    booking = run_query(f"""
+                        SELECT {RECEIPT_COLUMNS}
+                        FROM Booking_History b
+                        JOIN Guest g ON b.Guest_ID = g.Guest_ID
+                        JOIN Room r ON b.Room_ID = r.Room_ID
+                        WHERE b.Booking_ID = %s
+                    """, (booking_id,))
+                attrs["found"] = bool(booking)
+            
+            if not booking:
+                if attempt == max_retries - 1:
+                    raise ValueError(f"Booking {booking_id} not found after {max_retries} attempts")
+                with span("receipt.retry_wait", attempt=attempt + 1):
+                    time.sleep(delay)  # This is where we needed the time import
+                continue
+                
+            booking = booking[0]
+            
+            with span("receipt.render"):
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+                    temp_file.write(render_receipt(booking))
+            return temp_file.name, booking['Email']
+            
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise Exception(f"Receipt generation failed after {max_retries} attempts: {str(e)}") from e
+            with span("receipt.retry_wait", attempt=attempt + 1):
+                time.sleep(delay)  # Also needed here
+
+def send_secure_email(to_email, pdf_path):
+    """Final battle-tested version with every safeguard"""
+    try:
+        # Validate inputs
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF not found at {pdf_path}")
+        if not '@' in to_email:
+            raise ValueError(f"Invalid email: {to_email}")
+
+        # Create message
+        with span("email.build"):
+            msg = _build_confirmation(to_email, pdf_path)
+
+        # Headers only: msg.as_string() would serialize the whole base64 PDF
+        log_sampled(logger, "email.prepared", to=to_email,
+                    headers={k: v for k, v in msg.items() if k != 'Content-Type'})
+
+        # Send with timeout
+        with span("email.smtp") as attrs:
+            with smtplib.SMTP(os.getenv("SMTP_SERVER"), int(os.getenv("SMTP_PORT")), timeout=10) as server:
+                server.starttls()
+                server.login(os.getenv("EMAIL_ADDRESS"), os.getenv("EMAIL_PASSWORD"))
+                response = server.send_message(msg)
+                attrs["refused"] = len(response)
+        log_sampled(logger, "email.sent", to=to_email, refused=response)
+        return True
+
+    except Exception as e:
+        logger.error(f"Email to {to_email} failed: {type(e).__name__}: {str(e)}")
+        return False
+    finally:
+        # Guaranteed cleanup
+        try:
+            if os.path.exists(pdf_path):
+                os.remove(pdf_path)
+                log_sampled(logger, "email.cleanup", path=pdf_path)
+        except Exception as e:
+            logger.warning(f"Cleanup warning: {str(e)}")
+
+def _build_confirmation(to_email, pdf_path):
+    """Confirmation email with the receipt PDF attached"""
+    msg = MIMEMultipart()
+    msg['From'] = os.getenv("EMAIL_ADDRESS")
+    msg['To'] = to_email
+    msg['Subject'] = f"{hotel_name()} Booking Confirmation"
+    
+    # Simple text body
+    msg.attach(MIMEText(
+        "Please find your booking receipt attached.\n\n"
+        "Thank you for your reservation!",
+        'plain'
+    ))
+
+    # Attach PDF with explicit encoding
+    with open(pdf_path, 'rb') as f:
+        part = MIMEApplication(
+            f.read(),
+            _subtype='pdf',
+            Name="Receipt.pdf"
+        )
+    part.add_header(
+        'Content-Disposition',
+        'attachment',
+        filename="Booking_Receipt.pdf"
+    )
+    msg.attach(part)
+    return msg
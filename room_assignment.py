@@ -0,0 +1,101 @@
+"""Automatic room assignment that packs bookings to limit fragmentation.
+
+Each candidate room is scored by the free gaps a stay would leave before and
+after it. Gaps too short to sell (under MIN_SELLABLE_DAYS, i.e. no 1-night stay
+fits under the inclusive overlap rule) are heavily penalised; otherwise the
+tightest fit wins (best-fit), and ties go to the lowest Room_ID. Scoring is
+vectorized over all rooms of the type, so a batch is one pass over requests
+sorted by check-in.
+"""
+from booking_service import BookingConflict
+from booking_queue import submit
+import numpy as np
+
+MIN_SELLABLE_DAYS = 2   # A 1-night stay occupies its check-in and check-out day
+LOOKAHEAD_DAYS = 14     # Gaps at least this long count as open calendar
+UNSELLABLE_PENALTY = 100.0
+
+
+def _gap_lengths(occupied, a, b):
+    """Free days immediately before day a and after day b, per room (capped)"""
+    days = occupied.shape[1]
+    before_win = occupied[:, max(a - LOOKAHEAD_DAYS, 0):a][:, ::-1]
+    after_win = occupied[:, b + 1:min(b + 1 + LOOKAHEAD_DAYS, days)]
+
+    def first_busy(window):
+        # No booking in the window (including at today / the index end) counts as open calendar
+        if window.shape[1] == 0:
+            return np.full(occupied.shape[0], LOOKAHEAD_DAYS)
+        return np.where(window.any(axis=1), window.argmax(axis=1), LOOKAHEAD_DAYS)
+
+    return first_busy(before_win), first_busy(after_win)
+
+
+def _gap_cost(gap):
+    unsellable = (gap > 0) & (gap < MIN_SELLABLE_DAYS)
+    return np.where(unsellable, UNSELLABLE_PENALTY, gap / LOOKAHEAD_DAYS)
+
+
+def _pick(occupied, a, b):
+    """Row of the best room for inclusive days [a, b], or None"""
+    free = ~occupied[:, a:b + 1].any(axis=1)
+    if not free.any():
+        return None
+    before, after = _gap_lengths(occupied, a, b)
+    cost = _gap_cost(before) + _gap_cost(after)
+    cost[~free] = np.inf
+    return int(np.argmin(cost))  # argmin returns the first (lowest Room_ID) on ties
+
+
+def assign_batch(index, requests):
+    """Assign rooms to many requests at once.
+
+    `requests` is a list of dicts with Room_Type, Check_In_Date, Check_Out_Date.
+    Returns a Room_ID (or None when nothing fits) per request, in input order.
+    Nothing is written; each assignment is reserved in a working copy of the
+    calendar so later requests in the batch see it.
+    """
+    assignments = [None] * len(requests)
+    by_type = {}
+    for i, request in enumerate(requests):
+        by_type.setdefault(request['Room_Type'], []).append(i)
+
+    for room_type, indices in by_type.items():
+        room_ids, occupied = index.occupancy(room_type)
+        if len(room_ids) == 0:
+            continue
+        # Earliest check-in first, longer stays first on the same day
+        indices.sort(key=lambda i: (requests[i]['Check_In_Date'],
+                                    requests[i]['Check_In_Date'] - requests[i]['Check_Out_Date']))
+        for i in indices:
+            check_in, check_out = requests[i]['Check_In_Date'], requests[i]['Check_Out_Date']
+            if not index.covers(check_in, check_out) or check_out <= check_in:
+                continue
+            a = (check_in - index.start).days
+            b = (check_out - index.start).days
+            row = _pick(occupied, a, b)
+            if row is not None:
+                occupied[row, a:b + 1] = True
+                assignments[i] = int(room_ids[row])
+    return assignments
+
+
+def assign_room(index, room_type, check_in, check_out):
+    """Best room for one stay, or None"""
+    return assign_batch(index, [{
+        'Room_Type': room_type, 'Check_In_Date': check_in, 'Check_Out_Date': check_out
+    }])[0]
+
+
+def auto_book(index, guest_id, room_type, check_in, check_out, payment_method="Pending", attempts=3):
+    """Assign and book; if another clerk takes the room first, refresh and try the next best"""
+    for _ in range(attempts):
+        room_id = assign_room(index, room_type, check_in, check_out)
+        if room_id is None:
+            return None
+        try:
+            booking = submit(guest_id, room_id, check_in, check_out, payment_method)
+            return {**booking, "Room_ID": room_id}
+        except BookingConflict:
+            index.rebuild()
+    return None
@@ -0,0 +1,54 @@
+"""Rooms left per type and date, read from the Room_Inventory counters.
+
+Booking triggers keep the counters in step with every create, cancel and
+modify (take_room_inventory refuses a stay once a date is sold out), so these
+reads touch one row per date instead of joining Room and Booking.
+"""
+from db_utils import call_procedure, run_query
+from datetime import date, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_DAYS = 365  # Matches the window kept by room_inventory_roller
+
+MONTH_INVENTORY = """
+    SELECT Room_Type, Stay_Date, Total_Units, Units_Left
+    FROM Room_Inventory
+    WHERE Stay_Date BETWEEN %s AND %s
+    ORDER BY Room_Type, Stay_Date
+"""
+
+
+def month_bounds(month_start):
+    """First and last date of the month containing `month_start`"""
+    first = month_start.replace(day=1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+
+def month_inventory(month_start):
+    """Counter rows for every room type and date of a month"""
+    return run_query(MONTH_INVENTORY, month_bounds(month_start))
+
+
+def rooms_left(room_type, check_in, check_out):
+    """Units of a type still free on every date of the stay, or None outside the window"""
+    rows = run_query("""
+        SELECT MIN(Units_Left) AS Units_Left, COUNT(*) AS Dates
+        FROM Room_Inventory
+        WHERE Room_Type = %s AND Stay_Date BETWEEN %s AND %s
+    """, (room_type, check_in, check_out))
+    if not rows or rows[0]["Dates"] < (check_out - check_in).days + 1:
+        return None
+    return rows[0]["Units_Left"]
+
+
+def rebuild_inventory(days_ahead=INVENTORY_DAYS):
+    """Recount the counters from Room and Booking (after restoring data or changing the window)"""
+    call_procedure("rebuild_room_inventory", (days_ahead,))
+    logger.info(f"Room inventory rebuilt through {date.today() + timedelta(days=days_ahead)}")
+
+
+if __name__ == "__main__":
+    rebuild_inventory()
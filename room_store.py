@@ -0,0 +1,206 @@
+"""Compact in-process store for Room and active Booking rows.
+
+run_query() returns a dict per row, a few hundred bytes each once the keys,
+Decimals, dates and strings are counted. RoomStore keeps the same rows as
+NumPy structured arrays instead: ENUM columns become one-byte codes into the
+interned value tuples below, money is whole paise in an int64 and dates are
+datetime64[D], so a booking costs ~29 bytes. "Available rooms" and "active
+bookings" are vectorized masks over those arrays, and results go straight to
+DataFrames with categorical ENUM columns.
+
+Guest names for the active bookings are kept in a Guest_ID -> name dict (only
+guests with an active booking). Patched from the change feed; a failed patch or
+a new day triggers a full reload, so a lost entry never hides a booking.
+"""
+from db_utils import read_from_primary, run_query
+from booking_service import PAYMENT_METHODS, ROOM_TYPES
+from datetime import date
+from decimal import Decimal
+import logging
+import numpy as np
+import pandas as pd
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+ROOM_STATUSES = ("Available", "Booked", "Under Maintenance")
+
+ROOM_DTYPE = np.dtype([
+    ("Room_ID", "i4"), ("Room_Type", "u1"), ("Price", "i8"), ("Status", "u1"),
+])
+BOOKING_DTYPE = np.dtype([
+    ("Booking_ID", "i4"), ("Guest_ID", "i4"), ("Room_ID", "i4"),
+    ("Check_In_Date", "M8[D]"), ("Check_Out_Date", "M8[D]"),
+    ("Total_Amount", "i8"), ("Payment_Method", "u1"),
+])
+
+_ROOM_TYPE_CODES = {value: i for i, value in enumerate(ROOM_TYPES)}
+_STATUS_CODES = {value: i for i, value in enumerate(ROOM_STATUSES)}
+_PAYMENT_CODES = {value: i for i, value in enumerate(PAYMENT_METHODS)}
+
+ROOM_COLUMNS = "Room_ID, Room_Type, Price, Status"
+BOOKING_COLUMNS = """b.Booking_ID, b.Guest_ID, g.Name, b.Room_ID, b.Check_In_Date,
+    b.Check_Out_Date, b.Total_Amount, b.Payment_Method"""
+
+
+def paise(amount):
+    return int(Decimal(amount) * 100)
+
+
+def room_array(rows):
+    """Room rows (as run_query returns them) packed into a ROOM_DTYPE array"""
+    return np.array([
+        (r['Room_ID'], _ROOM_TYPE_CODES[r['Room_Type']], paise(r['Price']), _STATUS_CODES[r['Status']])
+        for r in rows
+    ], dtype=ROOM_DTYPE)
+
+
+def booking_array(rows):
+    """Booking rows packed into a BOOKING_DTYPE array"""
+    return np.array([
+        (r['Booking_ID'], r['Guest_ID'], r['Room_ID'], r['Check_In_Date'], r['Check_Out_Date'],
+         paise(r['Total_Amount']), _PAYMENT_CODES[r['Payment_Method']])
+        for r in rows
+    ], dtype=BOOKING_DTYPE)
+
+
+def _categorical(codes, values):
+    return pd.Categorical.from_codes(codes, categories=list(values))
+
+
+def _dates(column):
+    return column.astype(object)  # datetime.date, as run_query returns
+
+
+def _upsert(table, key, ids, fresh):
+    """`table` without the rows for `ids`, plus `fresh`, sorted by `key`"""
+    kept = table[~np.isin(table[key], ids)]
+    merged = np.concatenate([kept, fresh])
+    return merged[np.argsort(merged[key], kind="stable")]
+
+
+class RoomStore:
+    """Starts empty: subscribe apply_changes to the change feed, then rebuild(), so
+    no write lands between the initial load and the first patch"""
+
+    def __init__(self):
+        self._lock = threading.Lock()         # Guards the arrays readers take
+        self._build_lock = threading.Lock()   # Serializes rebuilds and patches
+        self.today = None                     # Day of the last full load; None = never loaded
+        self._stale = False                   # A patch was lost; reload before the next read
+        self._rooms = np.empty(0, dtype=ROOM_DTYPE)
+        self._bookings = np.empty(0, dtype=BOOKING_DTYPE)
+        self._names = {}
+
+    def rebuild(self):
+        """Load every room and the bookings that have not checked out yet"""
+        with self._build_lock:
+            with read_from_primary():
+                rooms = run_query(f"SELECT {ROOM_COLUMNS} FROM Room ORDER BY Room_ID")
+                bookings = run_query(f"""
+                    SELECT {BOOKING_COLUMNS}
+                    FROM Booking b JOIN Guest g ON b.Guest_ID = g.Guest_ID
+                    WHERE b.Check_Out_Date > CURDATE()
+                    ORDER BY b.Booking_ID
+                """)
+            self.load(rooms, bookings)
+        logger.info(f"Room store built: {len(rooms)} rooms, {len(bookings)} active bookings "
+                    f"({self.nbytes()} bytes)")
+
+    def load(self, rooms, bookings):
+        """Replace the contents with Room rows and Booking rows (with the guest's Name)"""
+        with self._lock:
+            self.today = date.today()
+            self._stale = False
+            self._rooms = np.sort(room_array(rooms), order='Room_ID')
+            self._bookings = np.sort(booking_array(bookings), order='Booking_ID')
+            self._names = {b['Guest_ID']: sys.intern(b['Name']) for b in bookings}
+
+    def nbytes(self):
+        return self._rooms.nbytes + self._bookings.nbytes
+
+    def _current(self):
+        """Arrays to read, reloaded first if never loaded, a patch was lost or the day rolled over"""
+        if self._stale or self.today != date.today():
+            self.rebuild()
+        with self._lock:
+            return self._rooms, self._bookings, self._names
+
+    def available_rooms(self):
+        """Rooms marked Available with no booking that has not checked out, by Room_ID"""
+        rooms, bookings, _ = self._current()
+        free = rooms[(rooms['Status'] == _STATUS_CODES['Available'])
+                     & ~np.isin(rooms['Room_ID'], bookings['Room_ID'])]
+        return pd.DataFrame({
+            "Room_ID": free['Room_ID'],
+            "Room_Type": _categorical(free['Room_Type'], ROOM_TYPES),
+            "Price": free['Price'] / 100,
+        })
+
+    def active_bookings(self):
+        """Bookings that have not checked out, with guest name and room type, by check-in"""
+        rooms, bookings, names = self._current()
+        bookings = bookings[np.argsort(bookings['Check_In_Date'], kind="stable")]
+        rows = np.searchsorted(rooms['Room_ID'], bookings['Room_ID'])
+        rows = np.minimum(rows, max(len(rooms) - 1, 0))  # Every booked room exists (fk_room)
+        return pd.DataFrame({
+            "Booking_ID": bookings['Booking_ID'],
+            "Name": list(map(names.get, bookings['Guest_ID'].tolist())),
+            "Room_ID": bookings['Room_ID'],
+            "Room_Type": _categorical(rooms['Room_Type'][rows], ROOM_TYPES),
+            "Check_In_Date": _dates(bookings['Check_In_Date']),
+            "Check_Out_Date": _dates(bookings['Check_Out_Date']),
+            "Payment_Method": _categorical(bookings['Payment_Method'], PAYMENT_METHODS),
+        })
+
+    def apply_changes(self, entries):
+        """ChangeFeed listener: patch changed rows, or reload everything if the patch fails"""
+        with self._build_lock:
+            if self.today is None:
+                return  # Not loaded yet; the initial rebuild reads these writes
+            try:
+                self._patch(entries)
+                return
+            except Exception as e:
+                logger.warning(f"Room store patch failed, rebuilding: {str(e)}")
+                self._stale = True
+        self.rebuild()  # If this fails too, the next read retries it
+
+    def _patch(self, entries):
+        """Re-read changed rooms, bookings and guest names (caller holds the build lock)"""
+        changed = {table: list({e['Row_ID'] for e in entries if e['Table_Name'] == table})
+                   for table in ("Room", "Booking", "Guest")}
+
+        rooms = bookings = guests = []
+        if changed["Room"]:
+            ids = changed["Room"]
+            rooms = run_query(
+                f"SELECT {ROOM_COLUMNS} FROM Room WHERE Room_ID IN ({', '.join(['%s'] * len(ids))})",
+                tuple(ids)
+            )
+        if changed["Booking"]:
+            ids = changed["Booking"]
+            bookings = run_query(
+                f"""SELECT {BOOKING_COLUMNS}
+                FROM Booking b JOIN Guest g ON b.Guest_ID = g.Guest_ID
+                WHERE b.Booking_ID IN ({', '.join(['%s'] * len(ids))})
+                AND b.Check_Out_Date > CURDATE()""",
+                tuple(ids)
+            )
+        with self._lock:
+            guest_ids = [guest_id for guest_id in changed["Guest"] if guest_id in self._names]
+        if guest_ids:
+            guests = run_query(
+                f"SELECT Guest_ID, Name FROM Guest WHERE Guest_ID IN ({', '.join(['%s'] * len(guest_ids))})",
+                tuple(guest_ids)
+            )
+
+        with self._lock:
+            if changed["Room"]:
+                self._rooms = _upsert(self._rooms, 'Room_ID', changed["Room"], room_array(rooms))
+            if changed["Booking"]:
+                self._bookings = _upsert(self._bookings, 'Booking_ID', changed["Booking"],
+                                         booking_array(bookings))
+            for row in list(bookings) + list(guests):
+                self._names[row['Guest_ID']] = sys.intern(row['Name'])
@@ -0,0 +1,52 @@
+from db_utils import call_procedure, run_query
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_expired_rooms(batch_size=500):
+    """Run one incremental sweep past the checkout watermark and the Change_Log watermark.
+
+    The second catches bookings inserted or modified after the checkout
+    watermark had already passed their checkout date.
+    """
+    rows = call_procedure("sweep_expired_rooms", (batch_size,))
+    stats = rows[0] if rows else {"Bookings_Scanned": 0, "Changes_Scanned": 0, "Rooms_Freed": 0}
+    logger.info(f"Room sweep: {stats['Rooms_Freed']} rooms freed, "
+                f"{stats['Bookings_Scanned']} bookings and {stats['Changes_Scanned']} changes scanned")
+    return stats
+
+
+def sweeper_status():
+    """Watermark, last run and lag (expired bookings not yet swept)"""
+    state = run_query("""
+        SELECT s.Last_Check_Out_Date, s.Last_Booking_ID, s.Last_Seq, s.Last_Run_At,
+               s.Last_Bookings_Scanned, s.Last_Rooms_Freed, s.Total_Rooms_Freed,
+               TIMESTAMPDIFF(SECOND, s.Last_Run_At, NOW()) AS Seconds_Since_Run,
+               (SELECT COUNT(*) FROM Booking b
+                WHERE (b.Check_Out_Date > s.Last_Check_Out_Date
+                       OR (b.Check_Out_Date = s.Last_Check_Out_Date
+                           AND b.Booking_ID > s.Last_Booking_ID))
+                AND b.Check_Out_Date <= CURDATE()) AS Pending_Bookings
+        FROM Room_Sweeper_State s
+        WHERE s.Sweeper_ID = 1
+    """)
+    return state[0] if state else None
+
+
+def run_sweeper(interval=60, batch_size=500):
+    """Sweep loop for servers without the MySQL event scheduler"""
+    while True:
+        try:
+            stats = sweep_expired_rooms(batch_size)
+            # A full batch means there is still backlog; go again without sleeping
+            if stats["Bookings_Scanned"] >= batch_size or stats["Changes_Scanned"] >= batch_size:
+                continue
+        except Exception:
+            pass  # Already logged; retry on the next tick
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    run_sweeper()
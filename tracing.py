@@ -0,0 +1,114 @@
+"""Lightweight tracing spans written as JSON lines to a local file.
+
+Spans nest through a context variable, so a span opened inside another one is
+recorded as its child. Records are handed to a background writer thread, so
+the traced code only pays for a clock read and a queue put.
+
+TRACE_FILE (default traces.jsonl) sets the output; TRACING=0 turns it off.
+LOG_SAMPLE_RATE (default 0.1) controls how many debug logs log_sampled() keeps.
+"""
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+load_dotenv("config.env")
+
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _TraceWriter:
+    """Drains finished spans to TRACE_FILE in batches on a daemon thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        self._queue.put(record)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(0.05)  # Let a burst of spans accumulate into one write
+            self._write(batch)
+
+    def _write(self, batch):
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, default=str) + "\n" for r in batch))
+
+    def flush(self):
+        try:
+            self._write([])
+        except Exception:
+            pass
+
+
+_writer = _TraceWriter(TRACE_FILE)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a span; yields a dict the block can add attributes to"""
+    if not TRACING_ENABLED:
+        yield attrs
+        return
+
+    parent = _current_span.get()
+    trace_id = parent[0] if parent else os.urandom(8).hex()
+    span_id = os.urandom(4).hex()
+    token = _current_span.set((trace_id, span_id))
+    started = time.time()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = f"error: {type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _writer.emit({
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_id": parent[1] if parent else None,
+            "name": name,
+            "start": started,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "status": status,
+            **attrs
+        })
+
+
+def log_sampled(logger, event, level=logging.DEBUG, rate=None, **fields):
+    """Structured log line kept for a sample of calls (always kept at WARNING and above)"""
+    if level < logging.WARNING and random.random() >= (LOG_SAMPLE_RATE if rate is None else rate):
+        return
+    current = _current_span.get()
+    if current:
+        fields["trace_id"] = current[0]
+    logger.log(level, json.dumps({"event": event, **fields}, default=str))